@@ -0,0 +1,364 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Performance benchmarks for KLM Editor, e.g. #
+#   python Benchmark.py                                    #
+#   python Benchmark.py --rows 10000000 --shapes narrow    #
+#   python Benchmark.py --save-baseline                    #
+# Synthetic .csv files and databases are generated once    #
+# per size and shape (the same seed always gives the same  #
+# files), then the editor window is driven without a       #
+# screen to open, filter, sort, query and save them. Wall  #
+# time, rows per second and peak memory of every step are  #
+# reported and compared to a saved baseline.               #
+#                                                          #
+############################################################
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCALES = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+DEFAULT_SCALES = SCALES[:3]
+
+# Number of columns of every shape, the first four are the same in both
+SHAPES = {"narrow": 4, "wide": 40}
+
+SEED = 2022
+WRITE_BATCH_ROWS = 10000
+
+NAMES = ["apple", "banana", "cherry", "grape", "lemon", "mango", "melon", "orange", "peach", "pear"]
+
+FILTER_EXPRESSION = "price > 500 AND name contains 'an'"
+SORT_COLUMN = 2
+QUERY = 'SELECT name, COUNT(*), AVG(price) FROM "%s" GROUP BY name'
+
+# Steps slower than the baseline by more than this fraction are reported as regressions,
+# steps faster than MIN_COMPARED_SECONDS are too noisy to compare
+DEFAULT_TOLERANCE = 0.25
+MIN_COMPARED_SECONDS = 0.05
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Seconds a single step may wait for background work before it counts as failed
+STEP_TIMEOUT = 3600
+
+
+################################################
+#                  TEST DATA                   #
+################################################
+
+def header(width):
+    return ["id", "name", "price", "note"] + ["c%d" % x for x in range(4, width)]
+
+
+def generate_rows(random_numbers, first, count, width):
+    rows = []
+
+    for row in range(first, first + count):
+        values = [str(row), random_numbers.choice(NAMES), "%.2f" % (random_numbers.random() * 1000),
+                  random_numbers.choice(["", "plain text", 'with "quotes"', "a, b and c", "two\nlines"])]
+
+        # Extra columns of wide tables cycle through integers, decimals, repeated and unique text
+        for x in range(4, width):
+            kind = x % 4
+            if kind == 0:
+                values.append(str(random_numbers.randrange(100000)))
+            elif kind == 1:
+                values.append("%.3f" % random_numbers.random())
+            elif kind == 2:
+                values.append(NAMES[(row + x) % len(NAMES)])
+            else:
+                values.append("value %d-%d" % (row, x))
+
+        rows.append(values)
+
+    return rows
+
+
+def data_files(data_dir, shape, row_count):
+    # Returns the .csv file and database of a case, generating them if they do not exist yet
+    import Convert
+
+    name = "%s_%d" % (shape, row_count)
+    csv_path = os.path.join(data_dir, name + ".csv")
+    db_path = os.path.join(data_dir, name + ".db")
+
+    if not os.path.exists(csv_path):
+        random_numbers = random.Random(SEED + row_count + SHAPES[shape])
+        partial = csv_path + ".part"
+
+        with open(partial, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header(SHAPES[shape]))
+
+            for first in range(0, row_count, WRITE_BATCH_ROWS):
+                writer.writerows(generate_rows(random_numbers, first, min(WRITE_BATCH_ROWS, row_count - first), SHAPES[shape]))
+
+        os.replace(partial, csv_path)
+
+    if not os.path.exists(db_path):
+        partial = os.path.join(data_dir, name + ".part.db")
+        if os.path.exists(partial):
+            os.remove(partial)
+
+        Convert.csv_to_db(csv_path, partial)
+
+        # The table is named after the .csv file, not the partial database
+        os.replace(partial, db_path)
+
+    return csv_path, db_path
+
+
+################################################
+#                 RUNNING CASES                #
+################################################
+
+def peak_rss():
+    # Peak resident memory of this process in MB, None where it cannot be measured
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Driver(object):
+    # Drives an editor window with its file and input dialogs answered in code
+    def __init__(self):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+        from PyQt5 import QtWidgets
+        import MainWindow
+
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+        self.window = QtWidgets.QMainWindow()
+        self.ui = MainWindow.Ui_MainWindow()
+        self.ui.setupUi(self.window)
+        self.window.show()
+
+        self.path = None
+        self.errors = []
+
+        MainWindow.QFileDialog.getOpenFileName = staticmethod(lambda *args, **kwargs: (self.path, ""))
+        MainWindow.QFileDialog.getSaveFileName = staticmethod(lambda *args, **kwargs: (self.path, ""))
+        MainWindow.QInputDialog.getText = staticmethod(lambda *args, **kwargs: ("", False))
+        MainWindow.QMessageBox.exec_ = lambda box: self.errors.append(box.text() + " " + box.informativeText())
+
+    def wait(self, busy):
+        # Lets background loaders and queries deliver their results until busy() is False
+        started = time.perf_counter()
+
+        while busy():
+            if time.perf_counter() - started > STEP_TIMEOUT:
+                raise RuntimeError("Timed out after %d s" % STEP_TIMEOUT)
+
+            self.app.processEvents()
+            time.sleep(0.001)
+
+        self.app.processEvents()
+
+    def step(self, name, function):
+        # Runs function and returns a result record, function returns the number of rows it handled
+        del self.errors[:]
+        started = time.perf_counter()
+
+        try:
+            rows = function()
+            error = "; ".join(self.errors) or None
+        except Exception as e:
+            rows = 0
+            error = str(e) or type(e).__name__
+
+        elapsed = time.perf_counter() - started
+
+        return {"step": name, "seconds": elapsed, "rows": rows,
+                "rows_per_second": rows / elapsed if rows and elapsed > 0 else None,
+                "peak_rss_mb": peak_rss(), "error": error}
+
+    def open(self, path):
+        self.path = path
+        self.ui.open_file_dialog()
+        self.wait(lambda: self.ui.loader is not None)
+
+        # The first page of a database is read when the table view asks for it
+        self.ui.tableView.model().index(0, 0).data()
+        return self.ui.model.rowCount()
+
+    def filter(self):
+        self.ui.inputLine.setText(FILTER_EXPRESSION)
+        self.ui.filter_table()
+        return self.ui.model.rowCount()
+
+    def sort(self):
+        self.ui.reset_table()
+        self.ui.sort_table(SORT_COLUMN)
+        self.ui.tableView.model().index(0, 0).data()
+        return self.ui.model.rowCount()
+
+    def query(self, table):
+        self.ui.reset_table()
+        self.ui.inputLine.setText(QUERY % table)
+        self.ui.execute_query_from_input_line()
+        self.wait(lambda: self.ui.query is not None)
+        return self.ui.model.rowCount()
+
+    def save(self, path):
+        self.path = path
+        base, extension = os.path.splitext(path)
+
+        if extension == ".csv":
+            self.ui.export_model_to_csv(base, extension)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            self.ui.export_model_to_db(base, extension)
+
+        return self.ui.model.rowCount()
+
+
+def run_case(data_dir, shape, row_count):
+    # Runs every step of one case in this process and returns the result records
+    csv_path, db_path = data_files(data_dir, shape, row_count)
+    table = os.path.splitext(os.path.basename(csv_path))[0]
+    output = tempfile.mkdtemp(prefix="klmeditor-bench-")
+
+    driver = Driver()
+    results = []
+
+    results.append(driver.step("csv open", lambda: driver.open(csv_path)))
+    results.append(driver.step("csv filter", driver.filter))
+    results.append(driver.step("csv sort", driver.sort))
+    results.append(driver.step("csv query", lambda: driver.query(table)))
+    results.append(driver.step("csv save csv", lambda: driver.save(os.path.join(output, "saved.csv"))))
+    results.append(driver.step("csv save db", lambda: driver.save(os.path.join(output, "saved.db"))))
+
+    results.append(driver.step("db open", lambda: driver.open(db_path)))
+    results.append(driver.step("db sort", driver.sort))
+    results.append(driver.step("db query", lambda: driver.query(table)))
+    results.append(driver.step("db save csv", lambda: driver.save(os.path.join(output, "saved.csv"))))
+    results.append(driver.step("db save db", lambda: driver.save(os.path.join(output, "copy.db"))))
+
+    for name in os.listdir(output):
+        os.remove(os.path.join(output, name))
+    os.rmdir(output)
+
+    for result in results:
+        result["case"] = "%s/%d" % (shape, row_count)
+
+    return results
+
+
+################################################
+#             REPORTS AND BASELINES            #
+################################################
+
+def result_key(result):
+    return result["case"] + " " + result["step"]
+
+
+def compare(result, baseline, tolerance):
+    # Returns the change against the baseline as text and whether it is a regression
+    before = baseline.get(result_key(result))
+
+    if before is None or result["error"] is not None:
+        return "", False
+
+    change = result["seconds"] / before - 1 if before > 0 else 0
+    regressed = change > tolerance and result["seconds"] >= MIN_COMPARED_SECONDS
+
+    return "%+.0f%%%s" % (100 * change, " REGRESSION" if regressed else ""), regressed
+
+
+def report(result, baseline, tolerance):
+    change, regressed = compare(result, baseline, tolerance)
+
+    if result["error"] is not None:
+        print("%-16s %-14s failed: %s" % (result["case"], result["step"], result["error"]))
+        return True
+
+    rate = format(int(result["rows_per_second"]), ",") if result["rows_per_second"] else "-"
+    memory = "%.0f" % result["peak_rss_mb"] if result["peak_rss_mb"] is not None else "-"
+
+    print("%-16s %-14s %9.3f s %14s rows/s %7s MB  %s" % (
+        result["case"], result["step"], result["seconds"], rate, memory, change))
+
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks opening, filtering, sorting, querying and saving files.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="table sizes to run (default: %s)" % " ".join(str(x) for x in DEFAULT_SCALES))
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES), default=sorted(SHAPES))
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "klmeditor-bench-data"),
+                        help="where generated files are kept between runs")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="save these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown that counts as a regression (default: %.2f)" % DEFAULT_TOLERANCE)
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--case", nargs=2, metavar=("SHAPE", "ROWS"), help=argparse.SUPPRESS)
+
+    arguments = parser.parse_args(argv)
+    os.makedirs(arguments.data_dir, exist_ok=True)
+
+    if arguments.case is not None:
+        # Every case runs in its own process so peak memory is measured per case
+        print(json.dumps(run_case(arguments.data_dir, arguments.case[0], int(arguments.case[1]))))
+        return 0
+
+    baseline = {}
+    if os.path.exists(arguments.baseline) and not arguments.save_baseline:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)
+
+    results = []
+    regressions = 0
+
+    for row_count in arguments.rows:
+        for shape in arguments.shapes:
+            # Files are generated before the case starts so that is not part of the timings
+            data_files(arguments.data_dir, shape, row_count)
+
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", shape, str(row_count),
+                                      "--data-dir", arguments.data_dir], stdout=subprocess.PIPE, universal_newlines=True)
+
+            if process.returncode != 0:
+                print("%s/%d: failed with exit status %d" % (shape, row_count, process.returncode), file=sys.stderr)
+                regressions += 1
+                continue
+
+            for result in json.loads(process.stdout.strip().splitlines()[-1]):
+                results.append(result)
+                regressions += report(result, baseline, arguments.tolerance)
+
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as f:
+            json.dump(dict((result_key(x), x["seconds"]) for x in results if x["error"] is None), f, indent=1, sort_keys=True)
+        print("Saved baseline to " + arguments.baseline)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
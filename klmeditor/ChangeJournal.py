@@ -0,0 +1,148 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Journal of the edits made to a table. Every #
+# cell edit, inserted and deleted row is recorded with the #
+# values it replaced, which is all undo and redo need. The #
+# journal also remembers how far it had got when the table #
+# was last saved to each file, so the next save to that    #
+# file only has to write the changes made since. This      #
+# module does not depend on Qt.                            #
+#                                                          #
+############################################################
+
+import os
+import itertools
+
+# Kinds of changes. row is the position of the row when the change was made (its rowid
+# for database tables), values are whole rows for INSERT and DELETE.
+SET = "set"
+INSERT = "insert"
+DELETE = "delete"
+
+# Changes kept for undo, the oldest are dropped first
+UNDO_LIMIT = 10000
+
+
+def file_stamp(path):
+    # Size and modification time of path, None if it does not exist
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def first_changed_row(changes):
+    # Rows before the returned row are where they were and hold the same values, a
+    # change at a row can only move or alter the rows from there on
+    return min(change.row for change in changes) if changes else None
+
+
+class Change(object):
+    def __init__(self, number, kind, row, column=None, old=None, new=None):
+        self.number = number
+        self.kind = kind
+        self.row = row
+        self.column = column
+        self.old = old
+        self.new = new
+
+    def inverse(self):
+        # The change that takes the table back to how it was before this one
+        kind = {SET: SET, INSERT: DELETE, DELETE: INSERT}[self.kind]
+        return Change(self.number, kind, self.row, self.column, self.new, self.old)
+
+
+class ChangeJournal(object):
+    def __init__(self):
+        # Changes in the order they were made, undone changes are moved to undone
+        self.done = []
+        self.undone = []
+        self.numbers = itertools.count(1)
+
+        # Number of the last change dropped from done, done starts from the table as it was
+        # after that change. 0 is the table as it was before the first change.
+        self.base = 0
+
+        # Saved file -> (number of the last change it contains, stamp of the file after the save)
+        self.saves = {}
+
+    ################################################
+    #                   RECORDING                  #
+    ################################################
+
+    def record(self, kind, row, column=None, old=None, new=None):
+        change = Change(next(self.numbers), kind, row, column, old, new)
+        self.done.append(change)
+        del self.undone[:]
+
+        # Files saved before the oldest change that is kept can no longer be caught up
+        if len(self.done) > UNDO_LIMIT:
+            self.base = self.done.pop(0).number
+            self.saves = dict((path, saved) for path, saved in self.saves.items() if saved[0] >= self.base)
+
+        return change
+
+    def can_undo(self):
+        return bool(self.done)
+
+    def can_redo(self):
+        return bool(self.undone)
+
+    def undo(self):
+        # Returns the change to apply to the table to undo the last change
+        change = self.done.pop()
+        self.undone.append(change)
+        return change.inverse()
+
+    def redo(self):
+        # Returns the change to apply to the table to redo the last undone change
+        change = self.undone.pop()
+        self.done.append(change)
+        return change
+
+    def last_number(self):
+        return self.done[-1].number if self.done else self.base
+
+    def is_modified(self, path):
+        saved = self.saves.get(path)
+        return saved is None or saved[0] != self.last_number()
+
+    ################################################
+    #                    SAVING                    #
+    ################################################
+
+    def mark_saved(self, path, stamp):
+        # The table as it is now has been written to path, stamp identifies that version
+        # of the file (e.g. its file_stamp) so a file changed by someone else is noticed
+        self.saves[path] = (self.last_number(), stamp)
+
+    def forget_saves(self):
+        self.saves.clear()
+
+    def changes_since_save(self, path, stamp):
+        # Returns the changes to apply to path to bring it up to date, or None if that is
+        # not possible: the table was never saved there, the file has changed since, or
+        # changes the file contains were undone and then replaced by new changes
+        saved = self.saves.get(path)
+
+        if saved is None or stamp is None or saved[1] != stamp:
+            return None
+
+        if saved[0] == self.base:
+            return list(self.done)
+
+        for x, change in enumerate(self.done):
+            if change.number == saved[0]:
+                return self.done[x + 1:]
+
+        # The file has changes that were undone since, the last one it has is undone first
+        for x, change in enumerate(self.undone):
+            if change.number == saved[0]:
+                return [undone.inverse() for undone in self.undone[x:]]
+
+        return None
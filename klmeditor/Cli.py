@@ -0,0 +1,168 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Command line interface for converting files #
+# without the editor window, e.g.                          #
+#   python -m klmeditor convert data/*.csv out/            #
+#   python -m klmeditor convert in.csv out.db -i name      #
+# Files are converted in a pool of worker processes and    #
+# the time and throughput of every file is reported. This  #
+# module does not depend on Qt.                            #
+#                                                          #
+############################################################
+
+import os
+import sys
+import glob
+import time
+import argparse
+import concurrent.futures
+import Convert
+
+EXTENSIONS = (".csv", ".db")
+
+
+def expand_sources(patterns):
+    # Patterns are expanded here too, shells on Windows and quoted arguments leave them as they are
+    sources = []
+
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+
+        if not matches:
+            raise ValueError("No files match " + pattern)
+
+        if not glob.has_magic(pattern) and not os.path.isfile(pattern):
+            raise ValueError("No such file: " + pattern)
+
+        for path in matches:
+            if path not in sources:
+                sources.append(path)
+
+    return sources
+
+
+def plan_conversions(sources, target, to):
+    # Returns (source, target) pairs. A single source is converted to target itself if it
+    # has a file extension, otherwise target is a directory the converted files are put in.
+    if len(sources) == 1 and os.path.splitext(target)[1].lower() in EXTENSIONS:
+        return [(sources[0], target)]
+
+    tasks = []
+
+    for source in sources:
+        extension = os.path.splitext(source)[1].lower()
+        if extension not in EXTENSIONS:
+            raise ValueError(source + " is not a .csv or .db file")
+
+        # Without --to, .csv files become databases and databases become .csv files
+        kind = to or ("db" if extension == ".csv" else "csv")
+        tasks.append((source, os.path.join(target, Convert.table_name(source) + "." + kind)))
+
+    targets = [x[1] for x in tasks]
+    for path in targets:
+        if targets.count(path) > 1:
+            raise ValueError("More than one file would be written to " + path)
+
+    return tasks
+
+
+def convert_file(source, target, indexes, jobs=1):
+    # Runs in a worker process, errors are returned rather than raised so one bad file
+    # does not stop the others
+    started = time.perf_counter()
+
+    try:
+        rows = Convert.convert(source, target, indexes, jobs)
+    except Exception as e:
+        return None, time.perf_counter() - started, str(e) or type(e).__name__
+
+    return rows, time.perf_counter() - started, None
+
+
+def report(source, target, rows, elapsed, error):
+    if error is not None:
+        print("%s: failed: %s" % (source, error), file=sys.stderr)
+        return
+
+    size = os.path.getsize(source) / (1024 * 1024)
+    rate = ("%s rows/s, " % format(int(rows / elapsed), ",")) if rows and elapsed > 0 else ""
+    counted = format(rows, ",") + " rows" if rows is not None else "copied"
+
+    print("%s -> %s: %s in %.2f s (%s%.1f MB/s)" % (
+        source, target, counted, elapsed, rate, size / elapsed if elapsed > 0 else 0))
+
+
+def convert_command(arguments):
+    try:
+        tasks = plan_conversions(expand_sources(arguments.sources), arguments.target, arguments.to)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    if len(tasks) > 1 or not os.path.splitext(arguments.target)[1]:
+        os.makedirs(arguments.target, exist_ok=True)
+
+    indexes = tuple(arguments.index)
+    jobs = max(1, min(arguments.jobs or os.cpu_count() or 1, len(tasks)))
+    started = time.perf_counter()
+    failed = 0
+    total_rows = 0
+
+    if len(tasks) == 1:
+        # The tables of a single database are written in parallel instead
+        table_jobs = max(1, arguments.jobs or os.cpu_count() or 1)
+        results = [(tasks[0], convert_file(tasks[0][0], tasks[0][1], indexes, table_jobs))]
+    elif jobs == 1:
+        results = ((task, convert_file(task[0], task[1], indexes)) for task in tasks)
+    else:
+        # Every file is converted in its own process, so large files use all cores
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        futures = dict((pool.submit(convert_file, task[0], task[1], indexes), task) for task in tasks)
+        results = ((futures[x], x.result()) for x in concurrent.futures.as_completed(futures))
+
+    try:
+        for (source, target), (rows, elapsed, error) in results:
+            report(source, target, rows, elapsed, error)
+
+            if error is not None:
+                failed += 1
+            else:
+                total_rows += rows or 0
+    finally:
+        if jobs > 1:
+            pool.shutdown()
+
+    print("Converted %d of %d files (%s rows) in %.2f s with %d worker%s." % (
+        len(tasks) - failed, len(tasks), format(total_rows, ","), time.perf_counter() - started,
+        jobs, "" if jobs == 1 else "s"))
+
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="klmeditor", description="Converts between .csv and .db files.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    convert = commands.add_parser("convert", help="convert .csv files to databases and databases to .csv files",
+                                  description="Converts every source to target. A .csv file becomes a table "
+                                              "named after the file, every table of a database is written to "
+                                              "its own .csv file named <target>_<table>.csv.")
+    convert.add_argument("sources", nargs="+", metavar="source", help=".csv or .db file, wildcards are allowed")
+    convert.add_argument("target", help="file to write for a single source, otherwise a directory")
+    convert.add_argument("--to", choices=["csv", "db"], help="format to convert to when target is a directory")
+    convert.add_argument("-i", "--index", action="append", default=[], metavar="COLUMN",
+                         help="column to index in created databases, may be repeated")
+    convert.add_argument("-j", "--jobs", type=int, default=0,
+                         help="number of files converted at the same time (default: number of cores)")
+    convert.set_defaults(run=convert_command)
+
+    arguments = parser.parse_args(argv)
+    return arguments.run(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
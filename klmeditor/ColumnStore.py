@@ -0,0 +1,420 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Compact column-oriented storage for .csv    #
+# data. Numeric columns are kept in typed arrays and low   #
+# cardinality text columns are dictionary encoded, so a    #
+# table costs a few bytes per cell instead of one Qt       #
+# object per cell. This module does not depend on Qt.      #
+#                                                          #
+############################################################
+
+import array
+
+# Storage kinds a column can be in. A column starts out as INT and is demoted
+# (INT -> DICT -> TEXT, FLOAT -> DICT -> TEXT) the first time a value does not fit.
+INT = "int"
+FLOAT = "float"
+DICT = "dict"
+TEXT = "text"
+
+# Order in which columns are demoted, INT and FLOAT columns both become DICT columns
+GENERALITY = {INT: 0, FLOAT: 0, DICT: 1, TEXT: 2}
+
+# Dictionary codes are stored as unsigned shorts, so a dictionary encoded column can
+# hold at most this many distinct values before it is converted to plain text
+MAX_DICTIONARY_SIZE = 65535
+
+# Number of rows read from a csv.reader at a time when filling a store
+BATCH_SIZE = 10000
+
+
+def _int_or_none(text):
+    # Values are only stored as numbers if they can be written back out exactly as they
+    # were read, otherwise "007" or "1.50" would silently change when the file is saved
+    try:
+        value = int(text)
+    except ValueError:
+        return None
+
+    if str(value) != text or not -(2 ** 63) <= value < 2 ** 63:
+        return None
+
+    return value
+
+
+def _float_or_none(text):
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+
+    if repr(value) != text:
+        return None
+
+    return value
+
+
+def _convert_batch(kind, texts):
+    try:
+        if kind == INT:
+            converted = array.array('q', map(int, texts))
+            if list(map(str, converted)) == texts:
+                return converted
+        else:
+            converted = array.array('d', map(float, texts))
+            if list(map(repr, converted)) == texts:
+                return converted
+    except (ValueError, OverflowError):
+        pass
+
+    return None
+
+
+class Column(object):
+    def __init__(self, kind=INT):
+        self.kind = kind
+        self.length = 0
+
+        # Empty cells in numeric columns are tracked in a lazily created null mask
+        self.nulls = None
+        self.dictionary = None
+        self.lookup = None
+
+        if kind == INT:
+            self.values = array.array('q')
+        elif kind == FLOAT:
+            self.values = array.array('d')
+        elif kind == DICT:
+            self.values = array.array('H')
+            self.dictionary = []
+            self.lookup = {}
+        else:
+            self.values = []
+
+    def __len__(self):
+        return self.length
+
+    def get(self, row):
+        if self.kind == TEXT:
+            return self.values[row]
+
+        if self.kind == DICT:
+            return self.dictionary[self.values[row]]
+
+        if self.nulls is not None and self.nulls[row]:
+            return ""
+
+        if self.kind == INT:
+            return str(self.values[row])
+
+        return repr(self.values[row])
+
+    def get_range(self, start, stop):
+        return [self.get(x) for x in range(start, stop)]
+
+    def append(self, text):
+        self.extend([text])
+
+    def extend(self, texts):
+        texts = list(texts)
+
+        if not self._fast_extend(texts):
+            for text in texts:
+                while not self._append_one(text):
+                    self.demote()
+
+    def set(self, row, text):
+        while not self._set_one(row, text):
+            self.demote()
+
+    def extend_column(self, other):
+        # Appends the values of another column, e.g. the same column of a later part of the
+        # file that was parsed separately. Columns of the same kind are joined storage to
+        # storage, anything else goes through the per-value path that demotes as needed.
+        if other.length == 0:
+            return
+
+        if self.kind == INT and other.kind == FLOAT and self._only_nulls():
+            self._convert_to_float()
+        elif self.kind == FLOAT and other.kind == INT and other._only_nulls():
+            other._convert_to_float()
+
+        # A part of the file with more general values demotes the column first, so the
+        # values of the other column can still be joined storage to storage
+        while GENERALITY[self.kind] < GENERALITY[other.kind]:
+            self.demote()
+
+        if self.kind != other.kind:
+            self.extend(other.get_range(0, other.length))
+            return
+
+        if self.kind == DICT:
+            codes = [self._encode(x) for x in other.dictionary]
+
+            if None in codes:
+                # The two dictionaries together have too many distinct values
+                self.extend(other.get_range(0, other.length))
+                return
+
+            if codes == list(range(0, len(codes))):
+                self.values.extend(other.values)
+            else:
+                self.values.extend(map(codes.__getitem__, other.values))
+
+        else:
+            self.values.extend(other.values)
+
+            if self.nulls is not None or other.nulls is not None:
+                if self.nulls is None:
+                    self.nulls = bytearray(self.length)
+                self.nulls.extend(other.nulls if other.nulls is not None else bytes(other.length))
+
+        self.length += other.length
+
+    def insert(self, row, text):
+        # The storage is shifted in place, so inserting into a large column is a memory move
+        while self.kind != TEXT:
+            encoded = self._encode(text)
+
+            if encoded is None:
+                self.demote()
+                continue
+
+            if encoded == "" and self.kind in (INT, FLOAT):
+                if self.nulls is None:
+                    self.nulls = bytearray(self.length)
+                self.nulls.insert(row, 1)
+                self.values.insert(row, 0)
+            else:
+                if self.nulls is not None:
+                    self.nulls.insert(row, 0)
+                self.values.insert(row, encoded)
+
+            self.length += 1
+            return
+
+        self.values.insert(row, text)
+        self.length += 1
+
+    def delete(self, row):
+        del self.values[row]
+
+        if self.nulls is not None:
+            del self.nulls[row]
+
+        self.length -= 1
+
+    def demote(self):
+        # Convert the column to the next more general storage kind, keeping its contents
+        values = self.get_range(0, self.length)
+
+        if self.kind in (INT, FLOAT):
+            kind = DICT
+        else:
+            kind = TEXT
+
+        self._reset(kind)
+
+        for text in values:
+            if not self._append_one(text):
+                # Too many distinct values for a dictionary, fall back to plain text
+                self._reset(TEXT)
+                self.values.extend(values)
+                self.length = len(values)
+                return
+
+    def _reset(self, kind):
+        self.__init__(kind)
+
+    def _fast_extend(self, texts):
+        # Whole-batch conversion for numeric columns without any empty cells.
+        # Falls through to the per-value path if anything in the batch does not fit.
+        if self.kind not in (INT, FLOAT) or "" in texts:
+            return False
+
+        converted = _convert_batch(self.kind, texts)
+
+        # A column that has only seen empty cells so far may still turn out to be FLOAT
+        if converted is None and self.kind == INT and self._only_nulls():
+            converted = _convert_batch(FLOAT, texts)
+            if converted is not None:
+                self._convert_to_float()
+
+        if converted is None:
+            return False
+
+        self.values.extend(converted)
+
+        if self.nulls is not None:
+            self.nulls.extend(bytes(len(texts)))
+
+        self.length += len(texts)
+        return True
+
+    def _encode(self, text):
+        # Returns the storage representation of text or None if it does not fit this column
+        if self.kind == TEXT:
+            return text
+
+        if self.kind == DICT:
+            code = self.lookup.get(text)
+            if code is None:
+                if len(self.dictionary) >= MAX_DICTIONARY_SIZE:
+                    return None
+                code = len(self.dictionary)
+                self.dictionary.append(text)
+                self.lookup[text] = code
+            return code
+
+        if text == "":
+            return ""
+
+        if self.kind == INT:
+            return _int_or_none(text)
+
+        return _float_or_none(text)
+
+    def _append_one(self, text):
+        encoded = self._encode(text)
+
+        if encoded is None:
+            # An INT column that has only seen empty cells may still turn out to be FLOAT
+            if self.kind == INT and self._only_nulls() and _float_or_none(text) is not None:
+                self._convert_to_float()
+                return self._append_one(text)
+            return False
+
+        if encoded == "" and self.kind in (INT, FLOAT):
+            if self.nulls is None:
+                self.nulls = bytearray(self.length)
+            self.nulls.append(1)
+            self.values.append(0)
+        else:
+            if self.nulls is not None:
+                self.nulls.append(0)
+            self.values.append(encoded)
+
+        self.length += 1
+        return True
+
+    def _set_one(self, row, text):
+        encoded = self._encode(text)
+
+        if encoded is None:
+            return False
+
+        if encoded == "" and self.kind in (INT, FLOAT):
+            if self.nulls is None:
+                self.nulls = bytearray(self.length)
+            self.nulls[row] = 1
+            self.values[row] = 0
+        else:
+            if self.nulls is not None:
+                self.nulls[row] = 0
+            self.values[row] = encoded
+
+        return True
+
+    def _only_nulls(self):
+        return self.length == 0 or (self.nulls is not None and self.nulls.count(0) == 0)
+
+    def _convert_to_float(self):
+        nulls = self.nulls
+        length = self.length
+        self._reset(FLOAT)
+        self.values.extend([0.0] * length)
+        self.nulls = nulls
+        self.length = length
+
+
+class ColumnStore(object):
+    def __init__(self, headers):
+        self.headers = list(headers)
+        self.columns = [Column() for _ in self.headers]
+        self.rows = 0
+
+    def row_count(self):
+        return self.rows
+
+    def column_count(self):
+        return len(self.columns)
+
+    def header(self, column):
+        return self.headers[column]
+
+    def value(self, row, column):
+        return self.columns[column].get(row)
+
+    def set_value(self, row, column, text):
+        self.columns[column].set(row, text)
+
+    def row(self, row):
+        return [column.get(row) for column in self.columns]
+
+    def column_values(self, column):
+        return self.columns[column].get_range(0, self.rows)
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+
+        self.ensure_columns(max(len(row) for row in rows))
+        width = len(self.columns)
+
+        # Short rows are padded so every column stays the same length
+        padded = [row if len(row) == width else list(row) + [""] * (width - len(row)) for row in rows]
+
+        for column, values in zip(self.columns, zip(*padded)):
+            column.extend(values)
+
+        self.rows += len(rows)
+
+    def extend_store(self, other):
+        # Appends the rows of another store, e.g. a part of the same file parsed separately
+        if other.rows == 0:
+            return
+
+        self.ensure_columns(other.column_count())
+
+        for x, column in enumerate(self.columns):
+            if x < other.column_count():
+                column.extend_column(other.columns[x])
+            else:
+                column.extend([""] * other.rows)
+
+        self.rows += other.rows
+
+    def ensure_columns(self, width):
+        # Rows wider than the header get extra columns, named like Qt's default headers.
+        # Their kind is inferred like any other column's, the rows they were missing from are empty.
+        while len(self.columns) < width:
+            self.headers.append(str(len(self.columns) + 1))
+            column = Column()
+            column.extend([""] * self.rows)
+            self.columns.append(column)
+
+    def insert_row(self, row, values=None):
+        values = values or [""] * len(self.columns)
+
+        for column, text in zip(self.columns, values):
+            column.insert(row, text)
+
+        self.rows += 1
+
+    def delete_row(self, row):
+        for column in self.columns:
+            column.delete(row)
+
+        self.rows -= 1
+
+    def iter_batches(self, batch_size=BATCH_SIZE, start=0, stop=None):
+        # Rows are materialised one batch at a time, column by column
+        stop = self.rows if stop is None else min(stop, self.rows)
+
+        for batch_start in range(start, stop, batch_size):
+            batch_stop = min(batch_start + batch_size, stop)
+            columns = [column.get_range(batch_start, batch_stop) for column in self.columns]
+            yield [list(row) for row in zip(*columns)]
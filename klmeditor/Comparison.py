@@ -0,0 +1,28 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: The comparison rule shared by single        #
+# filters (FilterEngine) and filter expressions            #
+# (FilterExpression). A column whose non-empty cells are   #
+# all numbers is compared as numbers with a value that is  #
+# a number and its empty cells never match, anything else  #
+# is compared as text. This module does not depend on Qt.  #
+#                                                          #
+############################################################
+
+
+def number(text):
+    # Cells and values that are numbers, "nan" is left as text
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+
+    return None if value != value else value
+
+
+def is_numeric(texts):
+    # texts are the cells a column holds now, empty cells do not count
+    return all(text == "" or number(text) is not None for text in texts)
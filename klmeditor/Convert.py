@@ -0,0 +1,153 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: File to file conversions between .csv and   #
+# .db files, built on the same streaming export and bulk   #
+# ingestion code the editor saves with. A .csv file        #
+# becomes a table named after the file, every table of a   #
+# database becomes its own .csv file, written by a pool of #
+# worker processes that each read through their own        #
+# read-only connection. This module does not depend on Qt. #
+#                                                          #
+############################################################
+
+import os
+import re
+import csv
+import time
+import sqlite3
+import itertools
+import multiprocessing
+import concurrent.futures
+import Export
+import Ingest
+import Tracing
+
+# Number of rows read from a .csv file at a time
+READ_BATCH_ROWS = 10000
+
+# Size of the buffer between the disk and the csv reader
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Characters that cannot be part of a file name on at least one platform
+UNSAFE_FILE_NAME = re.compile(r'[\\/:*?"<>|]')
+
+
+def table_name(path):
+    # Tables are named after the file they were read from, like when saving from the editor
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def table_csv_path(target, table):
+    # Every table of a database is written next to target with the table name appended,
+    # e.g. out.csv becomes out_customers.csv
+    base, extension = os.path.splitext(target)
+    return base + "_" + UNSAFE_FILE_NAME.sub("_", table) + (extension or ".csv")
+
+
+def iter_csv_batches(reader, size=READ_BATCH_ROWS):
+    while True:
+        batch = list(itertools.islice(reader, size))
+        if not batch:
+            break
+        yield batch
+
+
+def csv_to_db(source, target, indexes=()):
+    # Returns the number of rows loaded
+    with open(source, newline="", encoding=Export.ENCODING, errors="replace", buffering=READ_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        connection = sqlite3.connect(target)
+
+        try:
+            return Ingest.ingest(connection, table_name(source), header, iter_csv_batches(reader), indexes=indexes)
+        finally:
+            connection.close()
+
+
+def export_table(source, table, path):
+    # Runs in a worker process, every table is read through its own read-only connection
+    connection = Export.connect_read_only(source)
+
+    try:
+        return Export.export_table_to_csv(connection, table, path)
+    finally:
+        connection.close()
+
+
+def timed_export_table(source, table, path):
+    # Runs in a worker process, returns the number of rows and the seconds it took, the
+    # time is traced by the process that started the export
+    started = time.perf_counter()
+    row_count = export_table(source, table, path)
+    return row_count, time.perf_counter() - started
+
+
+def db_to_csv(source, target, jobs=1, progress=None):
+    # Writes up to jobs tables at the same time and returns the number of rows written to
+    # all tables' files together. progress is called with the number of tables written
+    # so far and the number of tables.
+    connection = Export.connect_read_only(source)
+
+    try:
+        tables = Export.list_tables(connection)
+    finally:
+        connection.close()
+
+    row_count = 0
+
+    if jobs <= 1 or len(tables) <= 1:
+        for done, table in enumerate(tables):
+            with Tracing.span("export table", table=table) as traced:
+                traced.add(export_table(source, table, table_csv_path(target, table)))
+
+            row_count += traced.rows
+
+            if progress is not None:
+                progress(done + 1, len(tables))
+
+        return row_count
+
+    # Worker processes are started fresh rather than forked, forking a process that runs
+    # threads (like the editor's) is not safe
+    context = multiprocessing.get_context("spawn")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(tables)), mp_context=context) as pool:
+        futures = dict((pool.submit(timed_export_table, source, table, table_csv_path(target, table)), table)
+                       for table in tables)
+
+        for done, future in enumerate(concurrent.futures.as_completed(futures)):
+            rows, seconds = future.result()
+            Tracing.tracer.record("export table", seconds, rows, table=futures[future], workers=jobs)
+            row_count += rows
+
+            if progress is not None:
+                progress(done + 1, len(tables))
+
+    return row_count
+
+
+def db_to_db(source, target):
+    # Databases are copied page by page, there is no row count to report
+    Export.copy_database(source, target)
+    return None
+
+
+def convert(source, target, indexes=(), jobs=1):
+    # Converts source into target, the file extensions decide the direction. Returns the
+    # number of rows converted (None for database copies), raises ValueError for
+    # combinations that cannot be converted. jobs is the number of tables of a database
+    # written at the same time.
+    kinds = (os.path.splitext(source)[1].lower(), os.path.splitext(target)[1].lower())
+
+    if kinds == (".csv", ".db"):
+        return csv_to_db(source, target, indexes)
+    if kinds == (".db", ".csv"):
+        return db_to_csv(source, target, jobs)
+    if kinds == (".db", ".db"):
+        return db_to_db(source, target)
+
+    raise ValueError("Cannot convert " + (kinds[0] or "files without extension") + " to " + (kinds[1] or "files without extension"))
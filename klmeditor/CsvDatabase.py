@@ -0,0 +1,112 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Runs SQL against an opened .csv table. The  #
+# table is bulk loaded into a temporary SQLite database    #
+# the first time it is queried, and columns used in WHERE, #
+# ORDER BY, GROUP BY, HAVING and ON clauses are indexed    #
+# before a query runs, on the query's worker thread. This  #
+# module does not depend on Qt.                            #
+#                                                          #
+############################################################
+
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import Ingest
+import Tracing
+
+# Clauses whose columns are worth an index, each runs until the next clause keyword
+CLAUSE = re.compile(r"\b(?:WHERE|ORDER\s+BY|GROUP\s+BY|HAVING|ON)\b(.*?)"
+                    r"(?=\b(?:WHERE|ORDER\s+BY|GROUP\s+BY|HAVING|ON|LIMIT|UNION|EXCEPT|INTERSECT|"
+                    r"JOIN|SELECT|FROM|WINDOW)\b|$)", re.IGNORECASE | re.DOTALL)
+STRING = re.compile(r"'(?:[^']|'')*'")
+IDENTIFIER = re.compile(r'"((?:[^"]|"")*)"|\[([^\]]*)\]|`([^`]*)`|([A-Za-z_][A-Za-z0-9_]*)')
+
+# Number of SQLite virtual machine instructions between checks of the interrupt handler
+PROGRESS_INSTRUCTIONS = 10000
+
+
+def referenced_columns(statement, columns):
+    # Returns the columns (from columns) named in the filtering and ordering clauses of statement
+    by_name = dict((x.lower(), x) for x in columns)
+    found = []
+
+    for clause in CLAUSE.findall(STRING.sub("''", statement)):
+        for match in IDENTIFIER.finditer(clause):
+            name = next(x for x in match.groups() if x is not None).replace('""', '"')
+            column = by_name.get(name.lower())
+
+            if column is not None and column not in found:
+                found.append(column)
+
+    return found
+
+
+class CsvDatabase(object):
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+        self.indexed = set()
+
+        # Edits bump the version, the table is loaded again once the loaded version is behind.
+        # Queries prepare the table on their worker threads, one at a time.
+        self.version = 0
+        self.loaded = None
+        self.lock = threading.Lock()
+
+        # A temporary file rather than :memory: so other connections (the table view's)
+        # can read it too
+        handle, self.path = tempfile.mkstemp(prefix="klmeditor-", suffix=".db")
+        os.close(handle)
+
+    def invalidate(self, *args):
+        # Connected to the model's change signals, the table is reloaded on the next query
+        self.version += 1
+
+    def is_stale(self):
+        return self.loaded != self.version
+
+    def prepare(self, statement, progress=None, interrupt=None):
+        # Loads the table if needed and indexes the columns statement filters or sorts on.
+        # progress is called with the number of rows loaded so far, interrupt is an SQLite
+        # progress handler that stops the load by returning a non-zero value.
+        with self.lock:
+            self._prepare(statement, progress, interrupt)
+
+    def _prepare(self, statement, progress, interrupt):
+        connection = sqlite3.connect(self.path)
+
+        if interrupt is not None:
+            connection.set_progress_handler(interrupt, PROGRESS_INSTRUCTIONS)
+
+        try:
+            if self.is_stale():
+                version = self.version
+
+                with Tracing.span("query table load", table=self.table) as traced:
+                    traced.add(Ingest.ingest(connection, self.table, self.store.headers, self.store.iter_batches(),
+                                             progress=progress))
+
+                self.indexed = set()
+                self.loaded = version
+
+            columns = Ingest.column_names(self.store.headers)
+            missing = [x for x in referenced_columns(statement, columns) if x not in self.indexed]
+
+            if missing:
+                Ingest.create_indexes(connection, self.table, missing)
+                connection.commit()
+                self.indexed.update(missing)
+        finally:
+            connection.close()
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,185 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Table model for .csv data. The model does   #
+# not hold any cells itself, it answers the table view     #
+# from a ColumnStore so only the visible cells are ever    #
+# turned into Qt values. Edits are recorded in a change    #
+# journal for undo, redo and incremental saves.            #
+#                                                          #
+############################################################
+
+from PyQt5 import QtCore
+from ChangeJournal import ChangeJournal, SET, INSERT, DELETE
+
+
+class CsvTableModel(QtCore.QAbstractTableModel):
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.journal = ChangeJournal()
+
+        # Set while a query reads the store on its worker thread
+        self.read_only = False
+
+    ################################################
+    #              QT MODEL INTERFACE              #
+    ################################################
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.store.row_count()
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.store.column_count()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role == QtCore.Qt.DisplayRole or role == QtCore.Qt.EditRole:
+            return self.store.value(index.row(), index.column())
+
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or role != QtCore.Qt.EditRole or self.read_only:
+            return False
+
+        old = self.store.value(index.row(), index.column())
+
+        if old != str(value):
+            self.journal.record(SET, index.row(), index.column(), old, str(value))
+            self.apply_set(index.row(), index.column(), str(value))
+
+        return True
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if orientation == QtCore.Qt.Horizontal:
+            if section < self.store.column_count():
+                return self.store.header(section)
+            return None
+
+        # Row numbers start at 1 like the default QStandardItemModel headers
+        return section + 1
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+
+        if self.read_only:
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEditable
+
+    ################################################
+    #                   EDITING                    #
+    ################################################
+
+    def can_change_rows(self):
+        # Memory mapped files only take cell edits
+        return hasattr(self.store, "insert_row")
+
+    def insert_row(self, row):
+        self.journal.record(INSERT, row, new=[""] * self.store.column_count())
+        self.apply_insert(row, [""] * self.store.column_count())
+
+    def delete_row(self, row):
+        self.journal.record(DELETE, row, old=self.store.row(row))
+        self.apply_delete(row)
+
+    def undo(self):
+        self.apply(self.journal.undo())
+
+    def redo(self):
+        self.apply(self.journal.redo())
+
+    def apply(self, change):
+        if change.kind == SET:
+            self.apply_set(change.row, change.column, change.new)
+        elif change.kind == INSERT:
+            self.apply_insert(change.row, change.new)
+        else:
+            self.apply_delete(change.row)
+
+    def apply_set(self, row, column, text):
+        self.store.set_value(row, column, text)
+        index = self.index(row, column)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole])
+
+    def apply_insert(self, row, values):
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.store.insert_row(row, values)
+        self.endInsertRows()
+
+    def apply_delete(self, row):
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        self.store.delete_row(row)
+        self.endRemoveRows()
+
+    ################################################
+    #                 DATA LOADING                 #
+    ################################################
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+
+        # Rows wider than the header add columns to the store
+        columns = self.store.column_count()
+        width = max(len(row) for row in rows)
+
+        if width > columns:
+            self.beginInsertColumns(QtCore.QModelIndex(), columns, width - 1)
+            self.store.ensure_columns(width)
+            self.endInsertColumns()
+
+        first = self.store.row_count()
+
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(rows) - 1)
+        self.store.append_rows(rows)
+        self.endInsertRows()
+
+    def append_store(self, store):
+        # Appends the rows of a ColumnStore parsed from a later part of the same file
+        if store.row_count() == 0:
+            return
+
+        columns = self.store.column_count()
+        width = store.column_count()
+
+        if width > columns:
+            self.beginInsertColumns(QtCore.QModelIndex(), columns, width - 1)
+            self.store.ensure_columns(width)
+            self.endInsertColumns()
+
+        first = self.store.row_count()
+
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + store.row_count() - 1)
+        self.store.extend_store(store)
+        self.endInsertRows()
+
+    def extend_index(self, offsets):
+        # Rows of a memory mapped file become visible as its offset index is built
+        first = self.store.row_count()
+        last = max(len(self.store.offsets) + len(offsets) - 2, 0) - 1
+
+        if last >= first:
+            self.beginInsertRows(QtCore.QModelIndex(), first, last)
+            self.store.extend_index(offsets)
+            self.endInsertRows()
+        else:
+            self.store.extend_index(offsets)
+
+    def header_labels(self):
+        return list(self.store.headers)
@@ -0,0 +1,200 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Streaming export of tables to .csv files.   #
+# Rows are pulled in batches, either from the columnar     #
+# storage of a .csv table or from a forward-only sqlite3   #
+# cursor, and written through a large write buffer so      #
+# memory use stays bounded no matter the table size. A     #
+# .csv file that is saved again is only rewritten from its #
+# first changed row, with the line breaks the file already #
+# has. Whole databases are copied with the SQLite backup   #
+# API.                                                     #
+# This module does not depend on Qt.                       #
+#                                                          #
+############################################################
+
+import io
+import os
+import csv
+import shutil
+import sqlite3
+
+# Size of the buffer between the csv writer and the disk
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Encoding .csv files are read, memory mapped and written in. Bytes that are not valid
+# in it are read as U+FFFD.
+ENCODING = "utf-8"
+
+# Line break of new .csv files (the csv module's), and how much of an existing file is
+# searched for the line break it uses
+LINE_TERMINATOR = "\r\n"
+LINE_SCAN_SIZE = 1024 * 1024
+
+# Number of rows fetched from a database cursor at a time
+FETCH_SIZE = 10000
+
+
+def quote_identifier(name):
+    # Table and column names can contain anything, so they are always quoted
+    return '"' + name.replace('"', '""') + '"'
+
+
+def rowid_alias(columns):
+    # SQLite has three names for the rowid, a column can shadow any of them
+    for alias in ("rowid", "_rowid_", "oid"):
+        if alias not in [x.lower() for x in columns]:
+            return alias
+
+    return None
+
+
+def connect_read_only(path):
+    # urllib.request pulls in the http and email packages, it is only imported when needed
+    from urllib.request import pathname2url
+    return sqlite3.connect("file:" + pathname2url(path) + "?mode=ro", uri=True)
+
+
+def list_tables(connection):
+    cursor = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                "AND name NOT LIKE 'sqlite_%' ORDER BY name")
+    return [row[0] for row in cursor]
+
+
+def iter_cursor_batches(cursor, size=FETCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
+
+def line_terminator(path):
+    # Line break the .csv file at path ends its first line with, LINE_TERMINATOR for files
+    # without one
+    with open(path, 'rb') as f:
+        head = f.read(LINE_SCAN_SIZE)
+
+    end = head.find(b"\n")
+
+    if end < 0:
+        return LINE_TERMINATOR
+
+    return "\r\n" if head[end - 1:end] == b"\r" else "\n"
+
+
+def write_rows(f, batches, progress=None, terminator=LINE_TERMINATOR):
+    # Writes every batch of rows to the open text file f, returns the number of rows written.
+    # progress is called with the running row count after each batch.
+    row_count = 0
+    wr = csv.writer(f, lineterminator=terminator)
+
+    for batch in batches:
+        wr.writerows(batch)
+        row_count += len(batch)
+
+        if progress is not None:
+            progress(row_count)
+
+    return row_count
+
+
+def write_csv(path, header, batches, progress=None, terminator=LINE_TERMINATOR):
+    with open(path, 'w', newline='', encoding=ENCODING, buffering=WRITE_BUFFER_SIZE) as f:
+        csv.writer(f, lineterminator=terminator).writerow(header)
+        return write_rows(f, batches, progress, terminator)
+
+
+def export_table_to_csv(connection, table, path, progress=None):
+    cursor = connection.execute("SELECT * FROM " + quote_identifier(table))
+    header = [column[0] for column in cursor.description]
+
+    try:
+        return write_csv(path, header, iter_cursor_batches(cursor), progress)
+    finally:
+        cursor.close()
+
+
+################################################
+#                 CSV PATCHING                 #
+################################################
+
+def _seek_record(raw, offset, terminator):
+    # Positions raw at offset for writing records, a file whose last line has no line
+    # break gets one first so appended rows do not run into it
+    raw.seek(0, os.SEEK_END)
+    size = raw.tell()
+
+    if offset >= size > 0:
+        raw.seek(size - 1)
+        if raw.read(1) != b"\n":
+            raw.write(terminator.encode(ENCODING))
+        return
+
+    raw.seek(offset)
+
+
+def patch_csv(path, offset, batches, progress=None):
+    # Rewrites the .csv file at path from byte offset on with batches of rows, everything
+    # before offset is left as it is. offset is the start of the first changed row, or the
+    # end of the file when rows were only appended. Returns the number of rows written.
+    terminator = line_terminator(path)
+
+    with open(path, 'r+b', buffering=WRITE_BUFFER_SIZE) as raw:
+        _seek_record(raw, offset, terminator)
+        f = io.TextIOWrapper(raw, encoding=ENCODING, newline='')
+
+        try:
+            row_count = write_rows(f, batches, progress, terminator)
+            f.flush()
+            raw.truncate()
+        finally:
+            f.detach()
+
+    return row_count
+
+
+def splice_file(path, offset, part):
+    # Replaces everything in path from byte offset on with the contents of the file part,
+    # which is removed. Used when the rows to write are read from path itself, part is
+    # written with line_terminator(path).
+    terminator = line_terminator(path)
+
+    with open(path, 'r+b') as raw, open(part, 'rb') as f:
+        _seek_record(raw, offset, terminator)
+        shutil.copyfileobj(f, raw, WRITE_BUFFER_SIZE)
+        raw.truncate()
+
+    os.remove(part)
+
+
+################################################
+#               DATABASE COPYING               #
+################################################
+
+# Number of database pages copied per backup step, progress is reported after each step
+BACKUP_STEP_PAGES = 1024
+
+
+def copy_database(source_path, target_path, progress=None):
+    # Copies a whole SQLite database page by page with the backup API, keeping column
+    # types, indexes, constraints, views and triggers exactly as they are.
+    # progress is called with the number of pages copied so far and the total.
+    if os.path.exists(target_path) and os.path.samefile(source_path, target_path):
+        return
+
+    source = connect_read_only(source_path)
+    target = sqlite3.connect(target_path)
+
+    def report(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+
+    try:
+        source.backup(target, pages=BACKUP_STEP_PAGES, progress=report)
+    finally:
+        target.close()
+        source.close()
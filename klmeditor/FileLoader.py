@@ -0,0 +1,179 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Background loading of .csv files. Files are #
+# parsed on a QThreadPool worker and handed to the GUI     #
+# thread in batches, so the first rows show up right away  #
+# and a load can be cancelled part way through. Large      #
+# files can be parsed by a pool of worker processes.       #
+#                                                          #
+############################################################
+
+import io
+import os
+import csv
+import mmap
+import array
+import time
+import itertools
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from PyQt5 import QtCore
+from WorkerSignals import WorkerSignals
+from MappedCsv import iter_index, save_index
+from Export import ENCODING
+import ParallelCsv
+import Tracing
+
+# The first batch is kept small so the first screenful of rows appears immediately
+FIRST_BATCH_ROWS = 500
+BATCH_ROWS = 20000
+
+
+class LoaderSignals(WorkerSignals):
+    header = QtCore.pyqtSignal(list)
+    batch = QtCore.pyqtSignal(object)
+    progress = QtCore.pyqtSignal("qint64", "qint64")
+    finished = QtCore.pyqtSignal(bool)
+    failed = QtCore.pyqtSignal(str)
+
+
+class CsvLoader(QtCore.QRunnable):
+    # Parses a .csv file into batches of rows
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.signals = LoaderSignals()
+        self.cancelled = False
+        self.started = time.perf_counter()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            total = os.path.getsize(self.path)
+
+            with open(self.path, "rb") as raw, Tracing.span("csv parse", file=os.path.basename(self.path), size=total) as traced:
+                reader = csv.reader(io.TextIOWrapper(raw, encoding=ENCODING, errors="replace", newline=""))
+                self.signals.header.emit(next(reader, []))
+
+                batch_rows = FIRST_BATCH_ROWS
+
+                while not self.cancelled:
+                    batch = list(itertools.islice(reader, batch_rows))
+                    if not batch:
+                        break
+
+                    traced.add(len(batch))
+                    Tracing.count("loader batches")
+
+                    self.signals.batch.emit(batch)
+                    self.signals.progress.emit(raw.tell(), total)
+                    batch_rows = BATCH_ROWS
+
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            self.signals.failed.emit(str(e))
+            return
+
+        self.signals.finished.emit(self.cancelled)
+
+
+class ParallelCsvLoader(QtCore.QRunnable):
+    # Parses a .csv file in a pool of worker processes, batches are ColumnStores holding
+    # consecutive parts of the file in file order
+    def __init__(self, path, workers):
+        super().__init__()
+        self.path = path
+        self.workers = workers
+        self.signals = LoaderSignals()
+        self.cancelled = False
+        self.started = time.perf_counter()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        # Worker processes are started fresh rather than forked, forking a process that
+        # runs threads (like the editor's) is not safe
+        context = multiprocessing.get_context("spawn")
+
+        try:
+            total = os.path.getsize(self.path)
+
+            with Tracing.span("csv parse", file=os.path.basename(self.path), size=total, workers=self.workers) as traced:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                    header_end, ranges = ParallelCsv.split_file(self.path, pool)
+                    self.signals.header.emit(ParallelCsv.parse_header(self.path, header_end, ENCODING))
+
+                    futures = [pool.submit(ParallelCsv.parse_range, self.path, start, end, ENCODING)
+                               for start, end in ranges]
+
+                    for (start, end), future in zip(ranges, futures):
+                        if self.cancelled:
+                            break
+
+                        store = future.result()
+                        traced.add(store.row_count())
+                        Tracing.count("loader batches")
+
+                        self.signals.batch.emit(store)
+                        self.signals.progress.emit(end, total)
+
+                    # Ranges that have not been started yet are dropped
+                    for future in futures:
+                        future.cancel()
+
+        except (OSError, UnicodeDecodeError, csv.Error, BrokenProcessPool) as e:
+            self.signals.failed.emit(str(e))
+            return
+
+        self.signals.finished.emit(self.cancelled)
+
+
+class IndexLoader(QtCore.QRunnable):
+    # Builds the row offset index of a memory mapped .csv file in batches of offsets
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.signals = LoaderSignals()
+        self.cancelled = False
+        self.started = time.perf_counter()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            with open(self.path, "rb") as f:
+                total = os.fstat(f.fileno()).st_size
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if total > 0 else b""
+
+            # The worker keeps its own copy of the index, batches handed to the GUI thread
+            # are never modified afterwards
+            offsets = array.array('Q')
+
+            with Tracing.span("csv index", file=os.path.basename(self.path), size=total) as traced:
+                for batch in iter_index(data):
+                    if self.cancelled:
+                        break
+
+                    offsets.extend(batch)
+                    traced.add(len(batch))
+                    Tracing.count("loader batches")
+
+                    self.signals.batch.emit(batch)
+                    self.signals.progress.emit(offsets[-1], total)
+
+            # Only a complete index is saved next to the file
+            if not self.cancelled:
+                save_index(self.path, offsets)
+
+        except (OSError, ValueError) as e:
+            self.signals.failed.emit(str(e))
+            return
+
+        self.signals.finished.emit(self.cancelled)
@@ -0,0 +1,244 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Indexed column filtering for .csv tables.   #
+# Per-column indexes are built the first time a column is  #
+# filtered (the rows sorted by value with the offset of    #
+# each distinct value), repeated filters are answered      #
+# from a small result cache and a filter that narrows the  #
+# previous one (e.g. while typing) only re-checks the rows #
+# that matched before. This module does not depend on Qt.  #
+#                                                          #
+############################################################
+
+import re
+import sys
+import array
+import bisect
+from collections import OrderedDict
+from Comparison import number, is_numeric
+
+# Supported operators, longest first so "<=" is not read as "<"
+OPERATORS = ["!=", "<=", ">=", "^=", "=", "<", ">", "~"]
+
+# Number of filter results kept for repeated filters
+CACHED_RESULTS = 16
+
+
+def parse_predicate(text):
+    # Splits "column<op>value" into (column, op, value), raises ValueError if there is no operator
+    for position in range(0, len(text)):
+        for op in OPERATORS:
+            if text.startswith(op, position):
+                return text[:position].strip(), op, text[position + len(op):].strip()
+
+    raise ValueError("No filter operator in " + repr(text))
+
+
+def _rows(values):
+    return array.array('q', values)
+
+
+# Comparisons follow the rule in Comparison.py, shared with filter expressions
+
+class ColumnIndex(object):
+    def __init__(self, values):
+        self.values = values
+
+        # Rows sorted by their text, the distinct texts in order and the position in
+        # text_rows where the rows of each distinct text start (one more at the end)
+        self.text_rows = None
+        self.text_keys = None
+        self.text_offsets = None
+        self.numeric_keys = None
+        self.numeric_rows = None
+
+    def is_numeric(self):
+        # Columns where every non-empty value is a number are compared as numbers
+        self._build_numeric()
+        return self.numeric_keys is not None
+
+    def equal(self, value):
+        if number(value) is not None and self.is_numeric():
+            first, last = self._numeric_range(number(value))
+            return _rows(sorted(self.numeric_rows[first:last]))
+
+        first, last = self._text_range(value)
+        return _rows(sorted(self.text_rows[first:last]))
+
+    def not_equal(self, value):
+        if number(value) is not None and self.is_numeric():
+            first, last = self._numeric_range(number(value))
+            return _rows(sorted(self.numeric_rows[:first] + self.numeric_rows[last:]))
+
+        excluded = set(self.equal(value))
+        return _rows(x for x in range(0, len(self.values)) if x not in excluded)
+
+    def range(self, op, value):
+        bound = number(value) if self.is_numeric() else None
+
+        if bound is not None:
+            rows = self.numeric_rows
+            first, last = self._numeric_range(bound)
+        else:
+            first, last = self._text_range(value)
+            rows = self.text_rows
+
+        if op == "<":
+            selected = rows[:first]
+        elif op == "<=":
+            selected = rows[:last]
+        elif op == ">":
+            selected = rows[last:]
+        else:
+            selected = rows[first:]
+
+        return _rows(sorted(selected))
+
+    def prefix(self, value):
+        self._build_text()
+        first = self.text_offsets[bisect.bisect_left(self.text_keys, value)]
+
+        # The end of the prefix range is found with a second search on the next possible
+        # string. The last character cannot be incremented past U+10FFFF, such characters
+        # are dropped and the one before is incremented instead.
+        end = value.rstrip(chr(sys.maxunicode))
+        if end:
+            last = self.text_offsets[bisect.bisect_left(self.text_keys, end[:-1] + chr(ord(end[-1]) + 1))]
+        else:
+            last = len(self.text_rows)
+
+        return _rows(sorted(self.text_rows[first:last]))
+
+    def _numeric_range(self, value):
+        return bisect.bisect_left(self.numeric_keys, value), bisect.bisect_right(self.numeric_keys, value)
+
+    def _text_range(self, value):
+        # Positions in text_rows of the rows whose text is value, an empty range where
+        # value would be if no row has it
+        self._build_text()
+        group = bisect.bisect_left(self.text_keys, value)
+
+        if group < len(self.text_keys) and self.text_keys[group] == value:
+            return self.text_offsets[group], self.text_offsets[group + 1]
+
+        return self.text_offsets[group], self.text_offsets[group]
+
+    def _build_text(self):
+        if self.text_rows is None:
+            values = self.values
+            order = sorted(range(0, len(values)), key=values.__getitem__)
+            keys = []
+            offsets = _rows([])
+
+            for position, row in enumerate(order):
+                if not keys or values[row] != keys[-1]:
+                    keys.append(values[row])
+                    offsets.append(position)
+
+            offsets.append(len(order))
+            self.text_rows = _rows(order)
+            self.text_keys = keys
+            self.text_offsets = offsets
+
+    def _build_numeric(self):
+        # Empty cells are left out of the numeric index so they never match a range
+        if self.numeric_keys is None and self.numeric_rows is None:
+            if not is_numeric(self.values):
+                self.numeric_rows = False
+                return
+
+            numbers = sorted((number(text), row) for row, text in enumerate(self.values) if text != "")
+            self.numeric_keys = [x[0] for x in numbers]
+            self.numeric_rows = _rows(x[1] for x in numbers)
+
+
+class FilterEngine(object):
+    def __init__(self, store):
+        self.store = store
+        self.indexes = {}
+        self.results = OrderedDict()
+        self.last = None
+
+    def invalidate(self, column=None):
+        # Called when cells change, None drops everything (rows added or removed)
+        if column is None:
+            self.indexes.clear()
+            self.results.clear()
+        else:
+            self.indexes.pop(column, None)
+            for key in [x for x in self.results if x[0] == column]:
+                del self.results[key]
+
+        self.last = None
+
+    def filter(self, column, op, value):
+        # Returns the ascending source rows matching "column op value"
+        key = (column, op, value)
+        rows = self.results.get(key)
+
+        if rows is not None:
+            self.results.move_to_end(key)
+        else:
+            rows = self._refine(column, op, value)
+            if rows is None:
+                rows = self._evaluate(column, op, value)
+
+            self.results[key] = rows
+            if len(self.results) > CACHED_RESULTS:
+                self.results.popitem(last=False)
+
+        self.last = key
+        return rows
+
+    def _index(self, column):
+        index = self.indexes.get(column)
+
+        if index is None:
+            index = self.indexes[column] = ColumnIndex(self.store.column_values(column))
+
+        return index
+
+    def _evaluate(self, column, op, value):
+        index = self._index(column)
+
+        if op == "=":
+            return index.equal(value)
+        if op == "!=":
+            return index.not_equal(value)
+        if op == "^=":
+            return index.prefix(value)
+        if op == "~":
+            return self._scan(index.values, range(0, len(index.values)), op, value)
+
+        return index.range(op, value)
+
+    def _refine(self, column, op, value):
+        # A prefix or literal search that extends the previous one can only match rows
+        # the previous one matched, so only those are checked again
+        if self.last is None or self.last[0] != column or self.last[1] != op:
+            return None
+
+        previous = self.results.get(self.last)
+        old = self.last[2]
+
+        if previous is None or old == value:
+            return None
+
+        if op == "^=" and value.startswith(old):
+            pass
+        elif op == "~" and re.escape(old) == old and re.escape(value) == value and old in value:
+            pass
+        else:
+            return None
+
+        return self._scan(self._index(column).values, previous, op, value)
+
+    def _scan(self, values, rows, op, value):
+        if op == "^=":
+            return _rows(x for x in rows if values[x].startswith(value))
+
+        pattern = re.compile(value)
+        return _rows(x for x in rows if pattern.search(values[x]))
@@ -0,0 +1,323 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Filter expressions for .csv tables, e.g.    #
+#   price > 10 AND (name contains 'app' OR id in (1, 2))   #
+# Expressions are parsed into a small tree and evaluated   #
+# as NumPy boolean masks directly over the columnar        #
+# storage, one vectorized pass per comparison. This module #
+# does not depend on Qt.                                   #
+#                                                          #
+############################################################
+
+import re
+import array
+import numpy as np
+from ColumnStore import INT, FLOAT, DICT
+from Comparison import number as _number, is_numeric as _is_numeric
+
+# Operators a column can be compared with, longest first so "<=" is not read as "<"
+COMPARISONS = ["!=", "<=", ">=", "^=", "=", "<", ">", "~"]
+KEYWORDS = ["AND", "OR", "NOT", "IN", "IS", "NULL", "CONTAINS"]
+
+TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^']|'')*')           |  # 'value', '' escapes a quote
+        (?P<identifier>"(?:[^"]|"")*")       |  # "column name", "" escapes a quote
+        (?P<symbol>!=|<=|>=|\^=|=|<|>|~|\(|\)|,) |
+        (?P<word>[^\s'"!=<>^~(),]+)
+    )""", re.VERBOSE)
+
+
+################################################
+#                   PARSING                    #
+################################################
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError("Unexpected character at position " + str(position))
+
+        kind = match.lastgroup
+        value = match.group(kind)
+
+        if kind == "string":
+            value = value[1:-1].replace("''", "'")
+        elif kind == "identifier":
+            value = value[1:-1].replace('""', '"')
+        elif kind == "word" and value.upper() in KEYWORDS:
+            kind, value = "keyword", value.upper()
+
+        tokens.append((kind, value))
+        position = match.end()
+
+    return tokens
+
+
+class Parser(object):
+    # Recursive descent parser, OR binds weaker than AND which binds weaker than NOT
+    def __init__(self, tokens, headers):
+        self.tokens = tokens
+        self.position = 0
+        self.headers = headers
+
+    def parse(self):
+        node = self.parse_or()
+
+        if self.position != len(self.tokens):
+            raise ValueError("Unexpected " + repr(self.tokens[self.position][1]))
+
+        return node
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+
+        if token[0] is None or (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+            raise ValueError("Expected " + (value or kind or "more input") + " but found " + repr(token[1]))
+
+        self.position += 1
+        return token[1]
+
+    def accept(self, kind, value):
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.accept("keyword", "OR"):
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.accept("keyword", "AND"):
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.accept("keyword", "NOT"):
+            return ("not", self.parse_not())
+
+        if self.accept("symbol", "("):
+            node = self.parse_or()
+            self.take("symbol", ")")
+            return node
+
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, name = self.peek()
+
+        if kind not in ("word", "identifier"):
+            raise ValueError("Expected a column name but found " + repr(name))
+
+        self.position += 1
+
+        if name not in self.headers:
+            raise ValueError("Unknown column " + repr(name))
+
+        column = self.headers.index(name)
+
+        if self.accept("keyword", "IS"):
+            negate = self.accept("keyword", "NOT")
+            self.take("keyword", "NULL")
+            return ("null", column, negate)
+
+        if self.accept("keyword", "CONTAINS"):
+            return ("compare", column, "contains", self.take_value())
+
+        negate = self.accept("keyword", "NOT")
+        if negate or self.peek() == ("keyword", "IN"):
+            self.take("keyword", "IN")
+            self.take("symbol", "(")
+            values = [self.take_value()]
+            while self.accept("symbol", ","):
+                values.append(self.take_value())
+            self.take("symbol", ")")
+            return ("in", column, values, negate)
+
+        op = self.take("symbol")
+        if op not in COMPARISONS:
+            raise ValueError("Unexpected " + repr(op))
+
+        return ("compare", column, op, self.take_value())
+
+    def take_value(self):
+        kind, value = self.peek()
+
+        if kind not in ("string", "word"):
+            raise ValueError("Expected a value but found " + repr(value))
+
+        self.position += 1
+        return value
+
+
+def parse(text, headers):
+    # Returns the expression tree of text, raises ValueError if it is not a valid expression
+    return Parser(tokenize(text), list(headers)).parse()
+
+
+################################################
+#                  EVALUATION                  #
+################################################
+
+def _text_matcher(op, value, numeric):
+    # Returns a function testing one cell of a text column, numeric is whether the column
+    # is compared as numbers (see Comparison.py)
+    number = _number(value) if numeric else None
+
+    if op == "contains":
+        return lambda text: value in text
+    if op == "^=":
+        return lambda text: text.startswith(value)
+    if op == "~":
+        return re.compile(value).search
+
+    compare = {
+        "=": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+    }[op]
+
+    if number is not None:
+        # Dictionary entries no row uses any more may still be text
+        def match(text):
+            cell = _number(text)
+            return cell is not None and compare(cell, number)
+
+        return match
+
+    return lambda text: compare(text, value)
+
+
+def _numeric_mask(values, op, value):
+    # values is a NumPy view over a typed column, the comparison is vectorized
+    number = _number(value)
+
+    if op in ("contains", "^=", "~") or number is None:
+        return None
+
+    if op == "=":
+        return values == number
+    if op == "!=":
+        return values != number
+    if op == "<":
+        return values < number
+    if op == "<=":
+        return values <= number
+    if op == ">":
+        return values > number
+    return values >= number
+
+
+class Evaluator(object):
+    def __init__(self, store):
+        self.store = store
+        self.row_count = store.row_count()
+
+    def rows(self, node):
+        # Returns the ascending rows where node is true
+        mask = self.mask(node)
+        return array.array('q', np.flatnonzero(mask).astype(np.int64).tobytes())
+
+    def mask(self, node):
+        kind = node[0]
+
+        if kind == "and":
+            return self.mask(node[1]) & self.mask(node[2])
+        if kind == "or":
+            return self.mask(node[1]) | self.mask(node[2])
+        if kind == "not":
+            return ~self.mask(node[1])
+        if kind == "null":
+            mask = self.null_mask(node[1])
+            return ~mask if node[2] else mask
+        if kind == "in":
+            mask = np.zeros(self.row_count, dtype=bool)
+            for value in node[2]:
+                mask |= self.compare_mask(node[1], "=", value)
+            return ~mask if node[3] else mask
+
+        return self.compare_mask(node[1], node[2], node[3])
+
+    def column(self, column):
+        # Columns of a ColumnStore are read in place, other stores fall back to text
+        columns = getattr(self.store, "columns", None)
+        return columns[column] if columns is not None else None
+
+    def null_mask(self, column):
+        stored = self.column(column)
+
+        if stored is not None and stored.kind in (INT, FLOAT):
+            if stored.nulls is None:
+                return np.zeros(self.row_count, dtype=bool)
+            return np.frombuffer(stored.nulls, dtype=np.uint8)[:self.row_count].astype(bool)
+
+        return self.text_mask(column, lambda text: text == "")
+
+    def compare_mask(self, column, op, value):
+        stored = self.column(column)
+
+        if stored is not None and stored.kind in (INT, FLOAT) and self.is_numeric_column(column):
+            dtype = np.int64 if stored.kind == INT else np.float64
+            values = np.frombuffer(stored.values, dtype=dtype)[:self.row_count]
+            mask = _numeric_mask(values, op, value)
+
+            if mask is not None:
+                # Empty cells never match a numeric comparison
+                if stored.nulls is not None:
+                    mask &= ~self.null_mask(column)
+                return mask
+
+        if stored is not None and stored.kind == DICT:
+            # The comparison is made once per distinct value and mapped onto the codes
+            match = _text_matcher(op, value, self.is_numeric_column(column))
+            lookup = np.fromiter((bool(match(x)) for x in stored.dictionary), dtype=bool,
+                                 count=len(stored.dictionary))
+            codes = np.frombuffer(stored.values, dtype=np.uint16)[:self.row_count]
+            return lookup[codes]
+
+        values = self.store.column_values(column)
+        return self.text_mask(column, _text_matcher(op, value, _is_numeric(values)), values)
+
+    def is_numeric_column(self, column):
+        # Decided from the cells the column holds now, like the column indexes
+        stored = self.column(column)
+
+        if stored.kind == INT:
+            return True
+
+        if stored.kind == FLOAT:
+            # "nan" is the one float that is not a number to Comparison.number
+            values = np.frombuffer(stored.values, dtype=np.float64)[:self.row_count]
+            if stored.nulls is not None:
+                values = values[~self.null_mask(column)]
+            return not np.isnan(values).any()
+
+        # Dictionary entries no row uses any more, e.g. after an edit, do not count
+        codes = np.frombuffer(stored.values, dtype=np.uint16)[:self.row_count]
+        used = np.bincount(codes, minlength=len(stored.dictionary)).nonzero()[0]
+        return _is_numeric(stored.dictionary[x] for x in used)
+
+    def text_mask(self, column, match, values=None):
+        values = self.store.column_values(column) if values is None else values
+        return np.fromiter((bool(match(x)) for x in values), dtype=bool, count=len(values))
+
+
+def evaluate(node, store):
+    return Evaluator(store).rows(node)
@@ -0,0 +1,306 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Bulk loading of .csv rows into SQLite.      #
+# Column types are inferred from a sample of the rows, a   #
+# typed table is created and rows are inserted with        #
+# executemany in large transactions under pragmas tuned    #
+# for bulk loading. Indexes are built once all rows are    #
+# in. Later saves of the same table only apply the edits   #
+# made since. This module does not depend on Qt.           #
+#                                                          #
+############################################################
+
+import array
+import itertools
+from Export import quote_identifier, rowid_alias
+from ChangeJournal import SET, INSERT, DELETE
+
+# Number of rows used to infer the type of each column
+SAMPLE_ROWS = 1000
+
+# Number of rows inserted per transaction
+TRANSACTION_ROWS = 500000
+
+# Connection settings used while loading, the connection's own settings are restored
+# afterwards. There is no point journaling a table that is being created from scratch,
+# unless the database holds other tables a crash could corrupt. A large page cache keeps
+# index building in memory.
+BULK_PRAGMAS = [
+    ("journal_mode", "MEMORY"),
+    ("synchronous", "OFF"),
+    ("cache_size", "-262144"),
+    ("temp_store", "MEMORY"),
+]
+UNSAFE_PRAGMAS = ["journal_mode", "synchronous"]
+
+INTEGER = "INTEGER"
+REAL = "REAL"
+TEXT = "TEXT"
+
+
+def _is_integer(text):
+    # Leading zeros, spaces and signs that would not survive the conversion keep a column as
+    # TEXT, so do numbers outside SQLite's 64 bit integers which would be stored as REAL
+    try:
+        value = int(text)
+    except ValueError:
+        return False
+
+    return str(value) == text and -(2 ** 63) <= value < 2 ** 63
+
+
+def _is_real(text):
+    # Digit strings that are not valid integers ("007", "+5") are identifiers, not numbers
+    if text != text.strip() or text.lstrip("+-").isdigit():
+        return False
+
+    try:
+        value = float(text)
+    except ValueError:
+        return False
+
+    # "nan", "inf" and friends are left as text
+    return value == value and value not in (float("inf"), float("-inf"))
+
+
+def infer_types(header, rows):
+    # A column is INTEGER or REAL if every non-empty value in the sample is one,
+    # columns without any values in the sample are TEXT
+    types = []
+
+    for column in range(0, len(header)):
+        values = [row[column] for row in rows if column < len(row) and row[column] != ""]
+
+        if values and all(_is_integer(x) for x in values):
+            types.append(INTEGER)
+        elif values and all(_is_real(x) for x in values):
+            types.append(REAL)
+        else:
+            types.append(TEXT)
+
+    return types
+
+
+def column_names(header):
+    # SQLite needs unique, non-empty column names
+    names = []
+    seen = set()
+
+    for x, name in enumerate(header):
+        name = name if name != "" else "column_" + str(x + 1)
+        unique = name
+        suffix = 2
+
+        while unique.lower() in seen:
+            unique = name + "_" + str(suffix)
+            suffix += 1
+
+        seen.add(unique.lower())
+        names.append(unique)
+
+    return names
+
+
+def create_table(connection, table, names, types):
+    columns = ", ".join(quote_identifier(name) + " " + kind for name, kind in zip(names, types))
+    connection.execute("DROP TABLE IF EXISTS " + quote_identifier(table))
+    connection.execute("CREATE TABLE " + quote_identifier(table) + " (" + columns + ")")
+
+
+def create_indexes(connection, table, columns):
+    for column in columns:
+        index = quote_identifier("idx_" + table + "_" + column)
+        connection.execute("CREATE INDEX IF NOT EXISTS " + index + " ON " + quote_identifier(table) +
+                           " (" + quote_identifier(column) + ")")
+
+
+def _prepare(rows, width, typed):
+    # Rows are padded or cut to the table width and empty cells in typed columns become
+    # NULL, SQLite's column affinity takes care of converting the rest of the text
+    for row in rows:
+        if len(row) != width:
+            row = list(row[:width]) + [""] * (width - len(row))
+
+        if typed:
+            row = list(row)
+            for x in typed:
+                if row[x] == "":
+                    row[x] = None
+
+        yield row
+
+
+def ingest(connection, table, header, batches, indexes=(), types=None, progress=None):
+    # Creates table from header and loads every batch of rows into it. indexes are column
+    # names to index once the rows are loaded. Returns the number of rows inserted.
+    batches = iter(batches)
+    first = next(batches, [])
+    names = column_names(header)
+
+    if types is None:
+        types = infer_types(names, first[:SAMPLE_ROWS])
+
+    typed = [x for x, kind in enumerate(types) if kind != TEXT]
+    insert = ("INSERT INTO " + quote_identifier(table) + " VALUES (" +
+              ", ".join(["?"] * len(names)) + ")")
+
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None
+
+    others = connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+                                "AND lower(name) != lower(?)", (table,)).fetchone()[0]
+    pragmas = [(name, value) for name, value in BULK_PRAGMAS if not (others and name in UNSAFE_PRAGMAS)]
+    restored = [(name, connection.execute("PRAGMA " + name).fetchone()[0]) for name, value in pragmas]
+
+    for name, value in pragmas:
+        connection.execute("PRAGMA " + name + " = " + value)
+
+    row_count = 0
+    uncommitted = 0
+
+    try:
+        connection.execute("BEGIN")
+        create_table(connection, table, names, types)
+
+        for batch in itertools.chain([first], batches):
+            if not batch:
+                continue
+
+            connection.executemany(insert, _prepare(batch, len(names), typed))
+            row_count += len(batch)
+            uncommitted += len(batch)
+
+            if uncommitted >= TRANSACTION_ROWS:
+                connection.execute("COMMIT")
+                connection.execute("BEGIN")
+                uncommitted = 0
+
+            if progress is not None:
+                progress(row_count)
+
+        # Indexes are cheaper to build over the loaded table than to maintain while inserting
+        create_indexes(connection, table, [names[header.index(x)] for x in indexes if x in header])
+        connection.execute("COMMIT")
+
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+
+    finally:
+        for name, value in restored:
+            connection.execute("PRAGMA " + name + " = " + str(value))
+
+        connection.isolation_level = isolation_level
+
+    return row_count
+
+
+def indexed_columns(connection, table):
+    # Columns of the table's single column indexes, so a table that is loaded again keeps them
+    columns = []
+
+    for index in connection.execute("PRAGMA index_list(" + quote_identifier(table) + ")").fetchall():
+        info = connection.execute("PRAGMA index_info(" + quote_identifier(index[1]) + ")").fetchall()
+
+        if len(info) == 1:
+            columns.append(info[0][2])
+
+    return columns
+
+
+def _free_rowid(rowids, position):
+    # A rowid for a row inserted at position that keeps the rows in rowid order, None if
+    # the rows around it have consecutive rowids
+    before = rowids[position - 1] if position > 0 else 0
+    after = rowids[position] if position < len(rowids) else None
+
+    if after is None:
+        return before + 1
+
+    if after - before > 1:
+        return (before + after) // 2
+
+    return None
+
+
+def apply_changes(connection, table, changes, positional=True):
+    # Writes journal changes to a table in one transaction. The rows of a positional table
+    # are the rows of a .csv file in rowid order, rowids are looked up by position and rows
+    # are deleted and inserted by rowid without renumbering the others. Otherwise the rows
+    # of the changes are rowids and only cell edits can be applied.
+    # Returns the number of changes applied, or None without changing anything if a row
+    # has to be inserted between two consecutive rowids and the table has to be loaded again.
+    columns = connection.execute("PRAGMA table_info(" + quote_identifier(table) + ")").fetchall()
+    names = [column[1] for column in columns]
+    typed = [x for x, column in enumerate(columns) if column[2].upper() in (INTEGER, REAL)]
+    key = rowid_alias(names)
+
+    if key is None:
+        raise ValueError("Table " + table + " has no rowid, its rows cannot be changed.")
+
+    quoted = quote_identifier(table)
+    insert = ("INSERT INTO " + quoted + " (" + key + ", " + ", ".join(quote_identifier(x) for x in names) +
+              ") VALUES (?, " + ", ".join(["?"] * len(names)) + ")")
+
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None
+
+    try:
+        connection.execute("BEGIN")
+
+        # A table nothing was deleted from has rowids 1 to its row count, others are read
+        if positional:
+            count, last = connection.execute("SELECT COUNT(*), MAX(" + key + ") FROM " + quoted).fetchone()
+
+            if count == (last or 0):
+                rowids = array.array('q', range(1, count + 1))
+            else:
+                rowids = array.array('q', [row[0] for row in connection.execute(
+                    "SELECT " + key + " FROM " + quoted + " ORDER BY " + key)])
+
+        for change in changes:
+            if not positional:
+                rowid = change.row
+            elif change.kind == INSERT:
+                rowid = _free_rowid(rowids, change.row)
+
+                if rowid is None:
+                    connection.execute("ROLLBACK")
+                    return None
+
+                rowids.insert(change.row, rowid)
+            elif change.kind == DELETE:
+                rowid = rowids.pop(change.row)
+            else:
+                rowid = rowids[change.row]
+
+            if change.kind == SET:
+                if change.column >= len(names):
+                    continue
+
+                value = None if change.new == "" and change.column in typed else change.new
+                connection.execute("UPDATE " + quoted + " SET " + quote_identifier(names[change.column]) +
+                                   " = ? WHERE " + key + " = ?", (value, rowid))
+
+            elif change.kind == INSERT:
+                row = next(_prepare([change.new], len(names), typed))
+                connection.execute(insert, [rowid] + list(row))
+
+            else:
+                connection.execute("DELETE FROM " + quoted + " WHERE " + key + " = ?", (rowid,))
+
+        connection.execute("COMMIT")
+
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+
+    finally:
+        connection.isolation_level = isolation_level
+
+    return len(changes)
@@ -11,12 +11,65 @@
 ############################################################
 
 import os
-import csv
+import re
+import time
+import array
+import functools
+import importlib
+import itertools
 import sqlite3
-import pandas as pd
+import tempfile
+from collections import OrderedDict
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import *
-from PyQt5.QtSql import QSqlDatabase, QSqlQuery, QSqlTableModel
+from ColumnStore import ColumnStore
+from CsvTableModel import CsvTableModel
+from MappedCsv import MappedCsv, load_index, record_offset
+from TableProxyModel import TableProxyModel
+from FilterEngine import parse_predicate
+from CsvDatabase import CsvDatabase
+from PagedTableModel import PagedTableModel
+from QueryRunner import QueryWorker, QueryResultModel
+from QueryCache import QueryCache, database_version
+from ChangeJournal import file_stamp, first_changed_row
+from FileLoader import CsvLoader, IndexLoader, ParallelCsvLoader
+import Export
+import Ingest
+import Convert
+import Tracing
+
+# .csv files at least this large are memory mapped instead of being loaded into memory
+LARGE_CSV_SIZE = 1024 * 1024 * 1024
+
+# Smaller .csv files at least this large are parsed by a pool of worker processes
+PARALLEL_CSV_SIZE = 64 * 1024 * 1024
+
+# Seconds a query may run before it is stopped, 0 lets queries run until they are cancelled
+DEFAULT_QUERY_TIMEOUT = 30
+
+# Number of database tables whose models are kept when switching to another table
+CACHED_TABLE_MODELS = 8
+
+# File type the operation trace is written as, one JSON object per line
+TRACE_FILE_FILTER = "Trace File (*.jsonl)"
+
+# Hints shown in the empty input line, see "Filtering" in README.md. = is an exact (or
+# numeric) match, ~ searches for a regular expression the way = used to.
+CSV_INPUT_PLACEHOLDER = "Filter: price >= 10 AND name = 'apple' (= exact, ~ regex, ^= starts with), or Query: SQL"
+DB_INPUT_PLACEHOLDER = "Query: SELECT * FROM table WHERE ..."
+
+# Modules that are only needed once a file is filtered or sorted
+DEFERRED_MODULES = ["numpy", "FilterExpression", "SortEngine"]
+
+
+def preload_modules():
+    # Called on a background thread once the window is shown, so the first filter or sort
+    # does not have to wait for the imports
+    for name in DEFERRED_MODULES:
+        importlib.import_module(name)
+
+class MetricsSignals(QtCore.QObject):
+    span = QtCore.pyqtSignal(object)
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
@@ -109,6 +162,10 @@ class Ui_MainWindow(object):
         self.tableView.setGeometry(QtCore.QRect(10, 150, 781, 391))
         self.tableView.setObjectName("tableView")
 
+        # Clicking a column header sorts the table by that column, Shift-click adds it as a further sort key
+        self.tableView.horizontalHeader().setSectionsClickable(True)
+        self.tableView.horizontalHeader().sectionClicked.connect(self.sort_table)
+
         ###################################
         #            MENU BAR             #
         ###################################
@@ -120,11 +177,33 @@ class Ui_MainWindow(object):
         self.menu = QtWidgets.QMenu(self.menubar)
         self.menu.setObjectName("menu")
 
+        self.editMenu = QtWidgets.QMenu(self.menubar)
+        self.editMenu.setObjectName("editMenu")
+
         MainWindow.setMenuBar(self.menubar)
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
         MainWindow.setStatusBar(self.statusbar)
 
+        # Duration, rows and memory of the last finished operation, the tooltip has the counters
+        self.metricsLabel = QtWidgets.QLabel(self.statusbar)
+        self.metricsLabel.setObjectName("metricsLabel")
+        self.statusbar.addPermanentWidget(self.metricsLabel)
+
+        # Progress of background file loading and queries is shown on the right side of the status bar
+        self.progressBar = QtWidgets.QProgressBar(self.statusbar)
+        self.progressBar.setObjectName("progressBar")
+        self.progressBar.setMaximumWidth(160)
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setVisible(False)
+        self.statusbar.addPermanentWidget(self.progressBar)
+
+        self.cancelButton = QtWidgets.QPushButton(self.statusbar)
+        self.cancelButton.setObjectName("cancelButton")
+        self.cancelButton.setVisible(False)
+        self.cancelButton.clicked.connect(self.cancel_task)
+        self.statusbar.addPermanentWidget(self.cancelButton)
+
         self.importAction = QtWidgets.QAction(MainWindow)
         self.importAction.setObjectName("importAction")
         self.importAction.triggered.connect(self.open_file_dialog)
@@ -133,16 +212,62 @@ class Ui_MainWindow(object):
         self.saveMenuAction.setObjectName("saveMenuAction")
         self.saveMenuAction.triggered.connect(self.save_file_dialog)
 
+        self.mmapAction = QtWidgets.QAction(MainWindow)
+        self.mmapAction.setObjectName("mmapAction")
+        self.mmapAction.setCheckable(True)
+
+        self.queryTimeoutAction = QtWidgets.QAction(MainWindow)
+        self.queryTimeoutAction.setObjectName("queryTimeoutAction")
+        self.queryTimeoutAction.triggered.connect(self.set_query_timeout)
+
+        self.exportWorkersAction = QtWidgets.QAction(MainWindow)
+        self.exportWorkersAction.setObjectName("exportWorkersAction")
+        self.exportWorkersAction.triggered.connect(self.set_export_workers)
+
+        self.traceAction = QtWidgets.QAction(MainWindow)
+        self.traceAction.setObjectName("traceAction")
+        self.traceAction.setCheckable(True)
+        self.traceAction.toggled.connect(self.toggle_tracing)
+
         self.exitMenuAction = QtWidgets.QAction(MainWindow)
         self.exitMenuAction.setObjectName("exitMenuAction")
         self.exitMenuAction.triggered.connect(MainWindow.close)
+
+        self.undoAction = QtWidgets.QAction(MainWindow)
+        self.undoAction.setObjectName("undoAction")
+        self.undoAction.setShortcut(QtGui.QKeySequence.Undo)
+        self.undoAction.triggered.connect(self.undo)
+
+        self.redoAction = QtWidgets.QAction(MainWindow)
+        self.redoAction.setObjectName("redoAction")
+        self.redoAction.setShortcut(QtGui.QKeySequence.Redo)
+        self.redoAction.triggered.connect(self.redo)
+
+        self.insertRowAction = QtWidgets.QAction(MainWindow)
+        self.insertRowAction.setObjectName("insertRowAction")
+        self.insertRowAction.triggered.connect(self.insert_row)
+
+        self.deleteRowAction = QtWidgets.QAction(MainWindow)
+        self.deleteRowAction.setObjectName("deleteRowAction")
+        self.deleteRowAction.triggered.connect(self.delete_row)
         
         self.menu.addAction(self.importAction)
+        self.menu.addAction(self.mmapAction)
+        self.menu.addAction(self.queryTimeoutAction)
+        self.menu.addAction(self.exportWorkersAction)
+        self.menu.addAction(self.traceAction)
         self.menu.addSeparator()
         self.menu.addAction(self.saveMenuAction)
         self.menu.addAction(self.exitMenuAction)
         self.menubar.addAction(self.menu.menuAction())
 
+        self.editMenu.addAction(self.undoAction)
+        self.editMenu.addAction(self.redoAction)
+        self.editMenu.addSeparator()
+        self.editMenu.addAction(self.insertRowAction)
+        self.editMenu.addAction(self.deleteRowAction)
+        self.menubar.addAction(self.editMenu.menuAction())
+
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
@@ -150,7 +275,42 @@ class Ui_MainWindow(object):
         #            DATABASE             #
         ###################################
 
-        self.db = None
+        # Path of the open .db file, its tables are read through their own SQLite connections
+        self.db_path = None
+
+        # Table lists and query results are reused until the database file changes
+        self.query_cache = QueryCache()
+
+        # Number of tables written at the same time when a database is saved as .csv files
+        self.export_workers = os.cpu_count() or 1
+
+        # SQL queries against a .csv table run on a temporary SQLite copy of it
+        self.csv_table_name = None
+        self.csv_database = None
+        self.csv_database_model = None
+
+        # Queries run on a worker with its own SQLite connection, the running query can be
+        # cancelled from the status bar and is stopped once it has run for query_timeout seconds
+        self.query = None
+        self.query_timeout = DEFAULT_QUERY_TIMEOUT
+
+        # Queries get their own thread so they never wait behind file loading or row counting
+        self.queryThreadPool = QtCore.QThreadPool()
+
+        self.queryTimer = QtCore.QTimer()
+        self.queryTimer.setInterval(200)
+        self.queryTimer.timeout.connect(self.on_query_tick)
+
+        ###################################
+        #       BACKGROUND LOADING        #
+        ###################################
+
+        # Files are parsed by a worker from the global thread pool, only the loader
+        # that is currently running is allowed to modify the model
+        self.loader = None
+
+        # File whose loading was cancelled or failed, the table only has some of its rows
+        self.partial_path = None
 
         ###################################
         #             MODELS              #
@@ -159,13 +319,36 @@ class Ui_MainWindow(object):
         # Models are used to manage the data and the data is displayed using the TableView widget
         #
         # model is default set to None since there are two models that
-        # can be used in the program. (QStandardItemModel and QSqlTableModel)
+        # can be used in the program. (CsvTableModel and PagedTableModel)
 
-        # QSortFilterProxyModel allows for filtered data to be edited while maintaining the original model using a proxy model
+        # TableProxyModel allows for filtered data to be edited while maintaining the original model using a proxy model
         # The proxy model can be filtered and the data edited in the filtered table is reflected on the original model without
-        # having to rewrite the whole model.
+        # having to rewrite the whole model. Filters are answered from column indexes that are built on first use.
         self.model = None
-        self.filter_proxy_model = QtCore.QSortFilterProxyModel()
+        self.filter_proxy_model = TableProxyModel()
+
+        # Results of queries are shown without replacing the table's model
+        self.query_model = None
+
+        # Models of tables shown recently keep their pages, row count and page directory,
+        # so switching back to a table does not read it again
+        self.table_models = OrderedDict()
+
+        # Filters are applied as the user types once the input has paused briefly
+        self.liveFilterTimer = QtCore.QTimer()
+        self.liveFilterTimer.setSingleShot(True)
+        self.liveFilterTimer.setInterval(250)
+        self.liveFilterTimer.timeout.connect(self.live_filter_table)
+        self.inputLine.textEdited.connect(lambda text: self.liveFilterTimer.start())
+
+        ###################################
+        #            METRICS              #
+        ###################################
+
+        # Spans finish on whichever thread ran the operation, the signal hands them to the GUI thread
+        self.metricsSignals = MetricsSignals()
+        self.metricsSignals.span.connect(self.show_metrics)
+        Tracing.tracer.add_listener(self.metricsSignals.span.emit)
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -176,11 +359,21 @@ class Ui_MainWindow(object):
         self.exitButton.setText(_translate("MainWindow", "Exit"))
         self.queryButton.setText(_translate("MainWindow", "Query"))
         self.resetButton.setText(_translate("MainWindow", "Reset"))
+        self.cancelButton.setText(_translate("MainWindow", "Cancel"))
         self.nameLabel.setText(_translate("MainWindow", "KLM Editor"))
         self.menu.setTitle(_translate("MainWindow", "File"))
         self.importAction.setText(_translate("MainWindow", "Import"))
         self.saveMenuAction.setText(_translate("MainWindow", "Save"))
+        self.mmapAction.setText(_translate("MainWindow", "Memory-Map CSV Files"))
+        self.queryTimeoutAction.setText(_translate("MainWindow", "Query Timeout..."))
+        self.exportWorkersAction.setText(_translate("MainWindow", "Export Workers..."))
+        self.traceAction.setText(_translate("MainWindow", "Trace Operations to File..."))
         self.exitMenuAction.setText(_translate("MainWindow", "Quit"))
+        self.editMenu.setTitle(_translate("MainWindow", "Edit"))
+        self.undoAction.setText(_translate("MainWindow", "Undo"))
+        self.redoAction.setText(_translate("MainWindow", "Redo"))
+        self.insertRowAction.setText(_translate("MainWindow", "Insert Row"))
+        self.deleteRowAction.setText(_translate("MainWindow", "Delete Row"))
     
     ################################################
     #                 FILE DIALOGS                 #
@@ -195,61 +388,82 @@ class Ui_MainWindow(object):
 
         if filename:
             if file_extension == ".csv":
-                with open(file_name + file_extension, newline='') as f:
-                    # Disable database query related UI elements
-                    self.filterButton.setVisible(True)
-                    self.queryButton.setVisible(False)
-                    self.databaseTableComboBox.setVisible(False)
-                    self.inputLine.setGeometry(10, 100, 581, 41)
-                    self.inputLine.clear()
-
-                    # Close old connection and reset UI if connection exists
-                    if self.db != None:
-                        self.db.close()
-                        self.reset_combobox()
-
-                    # Load data from csv file into a list to be added to the model
-                    reader = csv.reader(f)
-                    data = list(reader)
-                    data_header = list(data[0]) # for the header row
-                    data.pop(0)
-                    
-                    # Creation of the base model and proxy model
-                    self.model = QtGui.QStandardItemModel(len(data) - 1, len(data[0]))
-                    self.model.setHorizontalHeaderLabels(data_header)
-                    self.fill_model_from_data(data)
-                    self.filter_proxy_model.setSourceModel(self.model)
-
-                    # Model is displayed using the proxy model
-                    self.tableView.setModel(self.filter_proxy_model)
-                    self.reset_table()
+                # Disable database table related UI elements, queries run against the csv table itself
+                self.filterButton.setVisible(True)
+                self.queryButton.setVisible(True)
+                self.queryButton.setGeometry(500, 100, 91, 41)
+                self.databaseTableComboBox.setVisible(False)
+                self.inputLine.setGeometry(10, 100, 481, 41)
+                self.inputLine.clear()
+                self.inputLine.setPlaceholderText(CSV_INPUT_PLACEHOLDER)
+
+                # Close old database and reset UI if a database is open
+                if self.db_path != None:
+                    self.close_table_model()
+                    self.reset_combobox()
+                    self.db_path = None
+
+                self.cancel_loading()
+                self.cancel_query()
+                self.close_csv_database()
+                self.model = None
+                self.partial_path = None
+                self.csv_table_name = QtCore.QFileInfo(file_name).fileName()
+
+                path = file_name + file_extension
+
+                if self.mmapAction.isChecked() or os.path.getsize(path) >= LARGE_CSV_SIZE:
+                    # The file is memory mapped and rows are only parsed when the table view
+                    # scrolls to them, the row offset index is saved next to the file
+                    offsets = load_index(path)
+
+                    if offsets is not None:
+                        self.open_csv_model(MappedCsv(path, offsets), path)
+                    else:
+                        self.start_loading(IndexLoader(path))
+                elif (os.cpu_count() or 1) > 1 and os.path.getsize(path) >= PARALLEL_CSV_SIZE:
+                    # Parts of the file are parsed on every core and joined in file order
+                    self.start_loading(ParallelCsvLoader(path, os.cpu_count()))
+                else:
+                    # Rows are parsed in the background straight into columnar storage
+                    self.start_loading(CsvLoader(path))
             
             elif file_extension == ".db":
                 # Disable csv related UI elements
                 self.filterButton.setVisible(False)
                 self.queryButton.setVisible(True)
+                self.queryButton.setGeometry(600, 100, 91, 41)
                 self.databaseTableComboBox.setVisible(True)
                 self.inputLine.setGeometry(150, 100, 441, 41)
                 self.inputLine.clear()
+                self.inputLine.setPlaceholderText(DB_INPUT_PLACEHOLDER)
 
-                # Close old connection and reset UI if connection exists
-                if self.db != None:
-                    self.db.close()
+                # Close old database and reset UI if a database is open
+                if self.db_path != None:
+                    self.close_table_model()
                     self.reset_combobox()
+                    self.db_path = None
+
+                self.cancel_loading()
+                self.cancel_query()
+                self.close_csv_database()
+                self.partial_path = None
 
-                self.db = QSqlDatabase.addDatabase("QSQLITE")
-                self.db.setDatabaseName(file_name + file_extension)
+                path = file_name + file_extension
 
-                if self.db.open():
-                    self.model = QSqlTableModel()
+                try:
+                    tables = self.query_cache.tables(path)
+                except sqlite3.Error:
+                    tables = None
 
+                if tables != None:
                     # First table in database is open and displayed by default
-                    statement = "SELECT * FROM " + self.db.tables()[0]
-                    query = QSqlQuery(statement)
-                    self.populate_combobox(self.db)
-                    self.model.setQuery(query)
+                    # Rows are read page by page as the table view scrolls
+                    self.db_path = path
+                    self.model = PagedTableModel(self.db_path, tables[0])
+                    self.populate_combobox()
 
-                    self.tableView.setModel(self.model)
+                    self.show_model(self.model)
 
                 else:
                     msg = QMessageBox()
@@ -260,17 +474,52 @@ class Ui_MainWindow(object):
                     msg.exec_()
 
     def save_file_dialog(self):
-        if self.model != None:
+        # Saving a partially loaded file would silently drop the rest of its rows
+        if self.loader != None:
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText("Cannot save while a file is still loading.")
+            msg.setInformativeText("Please wait for the file to finish loading or cancel it and try again.")
+            msg.setWindowTitle("Error")
+            msg.exec_()
+
+        elif self.model != None:
+            # A query that is still reading would hold a read lock on the file being saved
+            self.cancel_query()
+
             filename = QFileDialog.getSaveFileName(filter="CSV File (*.csv);;Database File (*.db)")
             split_filename = os.path.splitext(filename[0])
 
             file_name = split_filename[0]
             file_extension = split_filename[1]
 
-            if file_extension == ".csv":
-                self.export_model_to_csv(file_name, file_extension)
-            elif file_extension == ".db":
-                self.export_model_to_db(file_name, file_extension)
+            if self.is_partial(file_name + file_extension):
+                msg = QMessageBox()
+                msg.setIcon(QMessageBox.Critical)
+                msg.setText("Cannot save over a file that was only partly loaded.")
+                msg.setInformativeText("Only the first " + format(self.loaded_row_count(), ",") + " rows of " +
+                                       os.path.basename(file_name + file_extension) + " were loaded, the rest of the file would be lost. " +
+                                       "Please save to another file or open the file again.")
+                msg.setWindowTitle("Error")
+                msg.exec_()
+                return
+
+            # A failed save leaves the journal as it was, so the edits can still be saved
+            try:
+                if file_extension == ".csv":
+                    self.export_model_to_csv(file_name, file_extension)
+                elif file_extension == ".db":
+                    self.export_model_to_db(file_name, file_extension)
+
+            except (sqlite3.Error, OSError) as error:
+                self.statusbar.clearMessage()
+
+                msg = QMessageBox()
+                msg.setIcon(QMessageBox.Critical)
+                msg.setText("Saving file failed.")
+                msg.setInformativeText(str(error))
+                msg.setWindowTitle("Error")
+                msg.exec_()
         
         # Prevent user from saving if no data is loaded
         else:
@@ -282,180 +531,640 @@ class Ui_MainWindow(object):
             msg.exec_()
 
     def fill_model_from_data(self, data):
-        for x in range(0, len(data)):
-            for y in range(0, len(data[x])):
-                item = QtGui.QStandardItem(data[x][y])
-                self.model.setItem(x, y, item)
+        # data can be any iterable of rows, it is consumed one batch at a time
+        data = iter(data)
+
+        with Tracing.span("fill model") as traced:
+            while True:
+                batch = list(itertools.islice(data, 10000))
+                if not batch:
+                    break
+                self.model.append_rows(batch)
+                traced.add(len(batch))
+
+    ################################################
+    #              BACKGROUND LOADING              #
+    ################################################
+
+    def start_loading(self, loader):
+        self.loader = loader
+
+        signals = loader.signals
+        signals.header.connect(functools.partial(self.on_loader_header, loader))
+        signals.batch.connect(functools.partial(self.on_loader_batch, loader))
+        signals.progress.connect(functools.partial(self.on_loader_progress, loader))
+        signals.finished.connect(functools.partial(self.on_loader_finished, loader))
+        signals.failed.connect(functools.partial(self.on_loader_failed, loader))
+
+        self.progressBar.setValue(0)
+        self.progressBar.setVisible(True)
+        self.cancelButton.setVisible(True)
+        self.statusbar.showMessage("Loading " + os.path.basename(loader.path) + "...")
+
+        QtCore.QThreadPool.globalInstance().start(loader)
+
+    def open_csv_model(self, store, path):
+        # The journal starts out in step with the file, so saving back to it only writes the
+        # edits. A file that does not finish loading is written in full.
+        self.model = CsvTableModel(store)
+        self.model.journal.mark_saved(path, file_stamp(path))
+        self.show_csv_model()
+        self.reset_table()
+
+    def cancel_task(self):
+        # The status bar's Cancel button stops whatever runs in the background
+        self.cancel_loading()
+
+        if self.query != None:
+            self.cancel_query()
+            self.statusbar.showMessage("Query cancelled.")
+
+    def cancel_loading(self):
+        # Rows that were already loaded stay in the table
+        if self.loader != None:
+            self.loader.cancel()
+            self.mark_partial(self.loader)
+            self.stop_loading("Loading cancelled after " + format(self.loaded_row_count(), ",") + " rows.")
+
+    def stop_loading(self, message):
+        self.loader = None
+        self.progressBar.setVisible(False)
+        self.cancelButton.setVisible(False)
+        self.statusbar.showMessage(message)
+
+    def mark_partial(self, loader):
+        # Only a file that was loaded completely is in step with the model, the rows of a
+        # partly loaded file must not be saved over it
+        self.partial_path = loader.path
+
+        if isinstance(self.model, CsvTableModel):
+            self.model.journal.forget_saves()
+
+    def is_partial(self, path):
+        return self.partial_path != None and os.path.exists(path) and os.path.samefile(path, self.partial_path)
+
+    def loaded_row_count(self):
+        if self.model != None:
+            return self.model.rowCount()
+
+        return 0
+
+    # Signals of loaders that have been cancelled or replaced may still be queued,
+    # so every handler first checks that its loader is the current one
+
+    def on_loader_header(self, loader, header):
+        if loader is self.loader:
+            self.open_csv_model(ColumnStore(header), loader.path)
+
+    def on_loader_batch(self, loader, batch):
+        if loader is not self.loader:
+            return
+
+        if isinstance(loader, IndexLoader):
+            if self.model == None:
+                self.open_csv_model(MappedCsv(loader.path, array.array('Q', batch)), loader.path)
+            else:
+                self.model.extend_index(batch)
+        elif isinstance(loader, ParallelCsvLoader):
+            self.model.append_store(batch)
+        else:
+            self.fill_model_from_data(batch)
+
+    def on_loader_progress(self, loader, done, total):
+        if loader is self.loader:
+            elapsed = time.perf_counter() - loader.started
+            percent = 100 * done // total if total > 0 else 100
+            throughput = done / elapsed / (1024 * 1024) if elapsed > 0 else 0
+
+            self.progressBar.setValue(percent)
+            self.statusbar.showMessage("Loading %s: %d%% (%s rows, %.1f MB/s)" % (
+                os.path.basename(loader.path), percent, format(self.loaded_row_count(), ","), throughput))
+
+    def on_loader_finished(self, loader, cancelled):
+        if loader is self.loader:
+            elapsed = time.perf_counter() - loader.started
+            self.stop_loading("Loaded %s rows from %s in %.2f s." % (
+                format(self.loaded_row_count(), ","), os.path.basename(loader.path), elapsed))
+
+    def on_loader_failed(self, loader, message):
+        if loader is self.loader:
+            self.mark_partial(loader)
+            self.stop_loading("")
+
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText("Loading file failed.")
+            msg.setInformativeText(message)
+            msg.setWindowTitle("Error")
+            msg.exec_()
 
     ################################################
     #                    EXPORT                    #
     ################################################
 
     def export_model_to_csv(self, file_name, file_extension):
-        if type(self.model) == type(QtGui.QStandardItemModel(0,0)):
-            data = []
-            row = []
+        # Rows are streamed to disk in batches instead of being collected into a nested list first
+        if isinstance(self.model, CsvTableModel):
+            path = file_name + file_extension
+            changes = self.model.journal.changes_since_save(path, file_stamp(path))
+
+            # A file that is in step with the journal only gets the rows from the first change on
+            if changes is not None:
+                self.patch_csv(path, changes)
+            else:
+                with Tracing.span("save csv", file=os.path.basename(path)) as traced:
+                    self.write_csv(path)
+                    traced.add(self.model.rowCount())
+
+                self.statusbar.showMessage("Saved " + os.path.basename(path) + ".")
+
+            self.model.journal.mark_saved(path, file_stamp(path))
+
+        elif isinstance(self.model, PagedTableModel):
+            # Each table is exported to its own csv file by a worker process with its own
+            # read-only connection, the model shown in the Table View is left untouched
+            target = os.path.basename(file_name + file_extension)
+            source = self.db_path
+            edited = [model for model in self.paged_models() if model.journal.is_modified(model.path)]
+
+            def report(done, total):
+                self.statusbar.showMessage("Saving %s: %d of %d tables written" % (target, done, total))
+                self.statusbar.repaint()
+
+            started = time.perf_counter()
+
+            # Edits that are not in the database yet are applied to a copy of it first
+            if edited:
+                handle, source = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(file_name + file_extension) or None)
+                os.close(handle)
+
+            try:
+                if edited:
+                    Export.copy_database(self.db_path, source)
+                    self.save_table_edits(source, edited, mark=False)
+
+                row_count = Convert.db_to_csv(source, file_name + file_extension, self.export_workers, report)
+            finally:
+                if edited:
+                    os.remove(source)
+
+            self.statusbar.showMessage("Saved %s rows in %.2f s." % (format(row_count, ","), time.perf_counter() - started))
+
+    def write_csv(self, path):
+        store = self.model.store
+
+        # A file that is saved over keeps its line breaks
+        terminator = Export.line_terminator(path) if os.path.exists(path) else Export.LINE_TERMINATOR
+
+        # A memory mapped file that is saved over itself is still being read from, it is
+        # written next to it and replaced once all rows are written
+        if isinstance(store, MappedCsv) and os.path.exists(path) and os.path.samefile(store.path, path):
+            part = path + ".part"
+            Export.write_csv(part, self.model.header_labels(), store.iter_batches(), terminator=terminator)
+            store.close()
+
+            try:
+                os.replace(part, path)
+            except OSError:
+                store.open()
+                raise
+
+            store.reopen()
+        else:
+            Export.write_csv(path, self.model.header_labels(), store.iter_batches(), terminator=terminator)
 
-            row_count = self.model.rowCount()
-            column_count = self.model.columnCount()
+    def patch_csv(self, path, changes):
+        # Rows before the first changed row are already in the file, the rest of the file is
+        # written again. Rows that were only appended are appended.
+        target = os.path.basename(path)
+        first = first_changed_row(changes)
+        store = self.model.store
 
-            # Appending header row of the table
-            for x in range(0, column_count):
-                row.append(self.model.horizontalHeaderItem(x).text())
-            
-            data.append(row)
-            row = []
-
-            # Appending rest of the data rows in the table
-            for x in range(0, row_count):
-                for y in range(0, column_count):
-                    row.append(self.model.item(x,y).text())
-                
-                data.append(row)
-                row = []
-
-            # Writing the nested list of data to a .csv spreadsheet
-            with open(file_name + file_extension, 'w', newline='', encoding='utf-8') as f:
-                wr = csv.writer(f)
-                wr.writerows(data)
-        
-        elif type(self.model) == type(QSqlTableModel()):
-            # The query shown in the Table View will be lost during the process of saving
-            # Saving the original query will allow for the table to keep its original state after saving
-            original_query = self.model.query()
+        if first is None:
+            self.statusbar.showMessage(target + " is already up to date.")
+            return
 
-            # Each table will be exported to its own csv file
-            for table_num in range(0, len(self.db.tables())):
-                data = []
-                row = []
+        with Tracing.span("save csv (patched)", file=target, first_row=first) as traced:
+            batches = store.iter_batches(start=first)
 
-                row_count = self.model.rowCount()
-                column_count = self.model.columnCount()
+            if isinstance(store, MappedCsv) and os.path.samefile(store.path, path):
+                # The rows are read from the mapped file itself, so they are written out
+                # before the mapping is closed and the file is changed
+                part = path + ".part"
+                with open(part, "w", newline="", encoding=Export.ENCODING, buffering=Export.WRITE_BUFFER_SIZE) as f:
+                    traced.add(Export.write_rows(f, batches, terminator=Export.line_terminator(path)))
 
-                table_name = self.db.tables()[table_num]
+                offset = store.offsets[first + 1]
+                store.close()
 
-                query = QSqlQuery("SELECT * FROM " + self.db.tables()[table_num])
-                self.model.setQuery(query)
+                try:
+                    Export.splice_file(path, offset, part)
+                except OSError:
+                    store.open()
+                    raise
 
-                # Header
-                for x in range(0, column_count):
-                    row.append(self.model.headerData(x, QtCore.Qt.Horizontal))
+                store.reopen(first)
+            else:
+                traced.add(Export.patch_csv(path, record_offset(path, first + 1), batches))
 
-                data.append(row)
-                row = []
+        self.statusbar.showMessage("Saved %s, %s rows written from row %s on." % (
+            target, format(traced.rows, ","), format(first + 1, ",")))
 
-                # Data
-                for x in range(0, row_count):
-                    for y in range(0, column_count):
-                        row.append(self.model.record(x).value(y))
+    def export_model_to_db(self, file_name, file_extension):
+        if isinstance(self.model, CsvTableModel):
+            path = file_name + file_extension
+            target = os.path.basename(path)
+            table = QtCore.QFileInfo(file_name).fileName()
+            headers = self.model.header_labels()
+            changes = self.model.journal.changes_since_save(path, database_version(path))
+            indexes = None
+
+            # The table was saved to this database before, only the changes since are applied
+            if changes is not None:
+                connection = sqlite3.connect(path)
+
+                try:
+                    with Tracing.span("save db (changes)", file=target) as traced:
+                        applied = Ingest.apply_changes(connection, table, changes)
+                        traced.add(applied or 0)
+
+                    # Rows were inserted between consecutive rowids, the table is loaded again with its indexes
+                    if applied is None:
+                        indexes = Ingest.indexed_columns(connection, table)
+                finally:
+                    connection.close()
+
+                if applied is not None:
+                    self.model.journal.mark_saved(path, database_version(path))
+                    self.statusbar.showMessage("Saved %s, %s changes applied." % (target, format(applied, ",")))
+                    return
+
+            # Rows are bulk loaded into a typed table named after the file, column types
+            # are inferred from the first rows and the chosen columns are indexed afterwards
+            if indexes is None:
+                index_columns, ok = QInputDialog.getText(None, "Indexes", "Columns to index (comma separated, optional):")
+                indexes = [x.strip() for x in index_columns.split(',') if x.strip() in headers] if ok else []
+
+            def report(row_count):
+                self.statusbar.showMessage("Saving %s: %s rows written" % (target, format(row_count, ",")))
+                self.statusbar.repaint()
+
+            connection = sqlite3.connect(path)
+
+            try:
+                with Tracing.span("save db", file=target) as traced:
+                    traced.add(Ingest.ingest(connection, table, headers, self.model.store.iter_batches(),
+                                             indexes=indexes, progress=report))
+            finally:
+                connection.close()
+
+            self.model.journal.mark_saved(path, database_version(path))
+            self.statusbar.showMessage("Saved " + target + ".")
+
+        elif isinstance(self.model, PagedTableModel):
+            # The database is copied page by page with the SQLite backup API, which keeps
+            # column types, indexes and constraints instead of re-inserting every value
+            target = os.path.basename(file_name + file_extension)
+
+            def report(copied, total):
+                self.statusbar.showMessage("Saving %s: %d of %d pages copied" % (target, copied, total))
+                self.statusbar.repaint()
+
+            path = file_name + file_extension
+            source = self.db_path
+
+            # Saving over the open database only writes the edits
+            if os.path.exists(path) and os.path.samefile(source, path):
+                path = source
+            else:
+                with Tracing.span("copy database", file=target):
+                    Export.copy_database(source, path, report)
+
+            changes = self.save_table_edits(path, self.paged_models())
+            self.statusbar.showMessage("Saved %s, %s edits written." % (target, format(changes, ",")))
+
+    def paged_models(self):
+        # The table shown and the tables kept for switching back to, all may have edits
+        return [self.model] + list(self.table_models.values())
+
+    def save_table_edits(self, path, models, mark=True):
+        # Writes the edited cells of every table to the database at path, one transaction per
+        # table. Only the edits made since the last save to path are written if the file has
+        # not changed since, otherwise every edited cell is. Returns the number of edits written.
+        version = database_version(path)
+        tables = [(model, model.journal.changes_since_save(path, version)) for model in models]
+        tables = [(model, model.edited_cells() if changes is None else changes) for model, changes in tables]
+
+        with Tracing.span("save db (changes)", file=os.path.basename(path)) as traced:
+            connection = sqlite3.connect(path)
+
+            try:
+                for model, changes in tables:
+                    if changes:
+                        traced.add(Ingest.apply_changes(connection, model.table, changes, positional=False))
+            finally:
+                connection.close()
+
+        if mark:
+            for model, changes in tables:
+                model.saved(path)
+
+        return traced.rows
 
-                    data.append(row)
-                    row = []
+    ################################################
+    #                   EDITING                    #
+    ################################################
 
-                # Saving current table to .csv
-                with open(file_name + "_" + table_name + file_extension, 'w', newline='', encoding='utf-8') as f:
-                    wr = csv.writer(f)
-                    wr.writerows(data) 
+    def is_read_only(self):
+        # Edits wait while a query reads the table on its worker thread
+        if isinstance(self.model, CsvTableModel) and self.model.read_only:
+            self.statusbar.showMessage("The table cannot be changed while it is prepared for a query.")
+            return True
 
-            # Display the query that was shown before saving
-            self.model.setQuery(original_query)
+        return False
 
-    def export_model_to_db(self, file_name, file_extension):
-        # Similar to export_model_to_csv in retrieving information
-        # Used both sqlite3 and pandas modules to export because sqlite3 makes it easier 
-        # to write to a database file
-        connection = sqlite3.connect(file_name + file_extension)
-
-        if type(self.model) == type(QtGui.QStandardItemModel(0,0)):
-            headers = []
-
-            for x in range(0, self.model.columnCount()):
-                headers.append(self.model.horizontalHeaderItem(x).text())
-
-            data = []
-            row = []
-
-            for x in range(0, self.model.rowCount()):
-                for y in range(0, self.model.columnCount()):
-                    row.append(self.model.item(x,y).text())
-                
-                data.append(row)
-                row = []
-            
-            df = pd.DataFrame(data, columns = headers)
-            df.to_sql(QtCore.QFileInfo(file_name).fileName(), connection, if_exists='replace', index=False)
+    def undo(self):
+        if self.is_read_only():
+            return
+
+        if self.model != None and self.model.journal.can_undo():
+            self.model.undo()
+        else:
+            self.statusbar.showMessage("Nothing to undo.")
 
-        elif type(self.model) == type(QSqlTableModel()):
-            for t in range(0, len(self.db.tables())):
-                headers = []
-                data = []
-                row = []
+    def redo(self):
+        if self.is_read_only():
+            return
 
-                query = QSqlQuery("SELECT * FROM " + self.db.tables()[t])
-                self.model.setQuery(query)
+        if self.model != None and self.model.journal.can_redo():
+            self.model.redo()
+        else:
+            self.statusbar.showMessage("Nothing to redo.")
+
+    def current_source_row(self):
+        # Row of the model under the table view's current cell, None if there is none
+        index = self.tableView.currentIndex()
+
+        if not index.isValid() or self.tableView.model() is not self.filter_proxy_model:
+            return None
+
+        return self.filter_proxy_model.mapToSource(index).row()
+
+    def can_change_rows(self):
+        if self.loader != None:
+            self.statusbar.showMessage("Rows cannot be inserted or deleted while a file is still loading.")
+            return False
 
-                for x in range(0, self.model.columnCount()):
-                    headers.append(self.model.headerData(x, QtCore.Qt.Horizontal))
+        if self.is_read_only():
+            return False
 
-                for x in range(0, self.model.rowCount()):
-                    for y in range(0, self.model.columnCount()):
-                        row.append(self.model.record(x).value(y))
+        # Database tables and memory mapped files only take cell edits
+        if not isinstance(self.model, CsvTableModel) or not self.model.can_change_rows():
+            self.statusbar.showMessage("Rows can only be inserted or deleted in .csv files loaded into memory.")
+            return False
 
-                    data.append(row)
-                    row = []
-                
-                df = pd.DataFrame(data, columns = headers)
-                df.to_sql(self.db.tables()[t], connection, if_exists='replace', index=False)
+        return True
 
-        connection.close()
+    def insert_row(self):
+        if self.can_change_rows():
+            # The new row goes above the current row, or at the end if there is none
+            row = self.current_source_row()
+            self.model.insert_row(self.model.rowCount() if row is None else row)
+
+    def delete_row(self):
+        if self.can_change_rows():
+            row = self.current_source_row()
+
+            if row is None:
+                self.statusbar.showMessage("Select a row to delete.")
+            else:
+                self.model.delete_row(row)
 
     ################################################
     #               UI MANIPULATION                #
     ################################################
     
-    def populate_combobox(self, db):
-        if type(self.model) == type(QSqlTableModel()):
-            for x in range(0, len(db.tables())):
-                self.databaseTableComboBox.addItem(db.tables()[x])
+    def populate_combobox(self):
+        if isinstance(self.model, PagedTableModel):
+            for table in self.query_cache.tables(self.db_path):
+                self.databaseTableComboBox.addItem(table)
 
     def reset_combobox(self):
         self.databaseTableComboBox.clear()
 
     def select_table(self):
-        current_index = self.databaseTableComboBox.currentIndex()
-
-        if type(self.model) == type(QSqlTableModel()):
+        if isinstance(self.model, PagedTableModel):
             # Default index of a QComboBox widget is -1
             # Set conditional so that it's not automatically called when filled
             if self.databaseTableComboBox.currentIndex() != -1:
-                statement = "SELECT * FROM " + self.db.tables()[current_index]
-                self.model.setTable(self.db.tables()[current_index])
-                self.execute_query_from_statement(statement)
+                table = self.databaseTableComboBox.currentText()
+                self.cancel_query()
+
+                if self.model.table != table:
+                    self.model = self.table_model(table)
+                else:
+                    self.model.refresh_if_changed()
+
+                self.show_model(self.model)
+
+    def table_model(self, table):
+        # The model that is shown now is kept for later, least recently shown tables are closed
+        self.table_models[self.model.table] = self.model
+
+        model = self.table_models.pop(table, None)
+
+        if model != None:
+            model.refresh_if_changed()
+        else:
+            model = PagedTableModel(self.db_path, table)
+
+        # Tables with unsaved edits are kept until they are saved
+        while len(self.table_models) > CACHED_TABLE_MODELS:
+            unedited = [x for x, kept in self.table_models.items() if not kept.journal.is_modified(kept.path)]
+            if not unedited:
+                break
+            self.table_models.pop(unedited[0]).close()
+
+        return model
+
+    def update_combobox(self):
+        # Statements may have created or dropped tables, the table shown stays selected
+        tables = self.query_cache.tables(self.db_path)
+        items = [self.databaseTableComboBox.itemText(x) for x in range(self.databaseTableComboBox.count())]
+
+        if tables == items:
+            return
+
+        # The first table is shown if the table that was shown has been dropped, and no
+        # table once the last one has been dropped
+        if self.model == None or self.model.table not in tables:
+            if self.model != None:
+                self.model.close()
+
+            self.model = PagedTableModel(self.db_path, tables[0]) if tables else None
+
+        self.databaseTableComboBox.blockSignals(True)
+        self.reset_combobox()
+        self.databaseTableComboBox.addItems(tables)
+        if self.model != None:
+            self.databaseTableComboBox.setCurrentIndex(tables.index(self.model.table))
+        self.databaseTableComboBox.blockSignals(False)
+
+    def close_table_model(self):
+        # Stops the background row count of the table that is shown and releases the
+        # query results still using the database connection
+        if isinstance(self.model, PagedTableModel):
+            self.model.close()
+            self.model = None
+
+        for model in self.table_models.values():
+            model.close()
+
+        self.table_models.clear()
+        self.cancel_query()
+        self.query_model = None
 
     def reset_table(self):
+        # A query that waits for its results to be scrolled keeps its read transaction open
+        self.cancel_query()
         self.inputLine.clear()
         
-        if type(self.model) == type(QtGui.QStandardItemModel(0,0)):
-            self.filter_proxy_model.setFilterKeyColumn(-1) # -1 selects all columns
-            self.filter_proxy_model.setFilterRegExp("")    # Empty reg expression resets model
+        if isinstance(self.model, CsvTableModel):
+            self.filter_proxy_model.clear_filter()
+            self.show_csv_model()
+
+            if self.filter_proxy_model.sort_keys:
+                self.filter_proxy_model.sort_by([])
 
-        elif type(self.model) == type(QSqlTableModel()):
+        elif isinstance(self.model, PagedTableModel):
             self.select_table()
 
+            if self.model.sort_keys:
+                self.model.sort_by([])
+
+        elif self.db_path != None:
+            # Every table of the database has been dropped
+            self.show_model(None)
+
+        self.show_sort_indicator([])
+
+    def show_csv_model(self):
+        # Model is displayed using the proxy model
+        if self.filter_proxy_model.sourceModel() is not self.model:
+            self.filter_proxy_model.setSourceModel(self.model)
+
+        if self.tableView.model() is not self.filter_proxy_model:
+            self.show_model(self.filter_proxy_model)
+
+    def show_model(self, model):
+        self.tableView.setModel(model)
+        self.show_sort_indicator(getattr(model, "sort_keys", []))
+
+    def show_sort_indicator(self, keys):
+        # The header shows the direction of the first sort key
+        header = self.tableView.horizontalHeader()
+        header.setSortIndicatorShown(bool(keys))
+
+        if keys:
+            header.setSortIndicator(keys[0][0], QtCore.Qt.DescendingOrder if keys[0][1] else QtCore.Qt.AscendingOrder)
+
+    def sort_table(self, column):
+        # Query results keep the order of their ORDER BY clause
+        if self.tableView.model() is self.filter_proxy_model:
+            model = self.filter_proxy_model
+        elif isinstance(self.model, PagedTableModel) and self.tableView.model() is self.model:
+            model = self.model
+        else:
+            return
+
+        keys = list(model.sort_keys)
+        sort_columns = [x[0] for x in keys]
+
+        if QApplication.keyboardModifiers() & QtCore.Qt.ShiftModifier:
+            # Shift-click adds a sort key or reverses one that is already used
+            if column in sort_columns:
+                position = sort_columns.index(column)
+                keys[position] = (column, not keys[position][1])
+            else:
+                keys.append((column, False))
+
+        elif sort_columns == [column]:
+            keys = [(column, not keys[0][1])]
+        else:
+            keys = [(column, False)]
+
+        # .csv tables are sorted on cached sort ranks, database tables with ORDER BY
+        started = time.perf_counter()
+        model.sort_by(keys)
+        self.show_sort_indicator(keys)
+
+        names = [str(model.headerData(x, QtCore.Qt.Horizontal)) + (" descending" if descending else "")
+                 for x, descending in keys]
+        self.statusbar.showMessage("Sorted by %s in %.2f s." % (", ".join(names), time.perf_counter() - started))
+
     def filter_table(self):
-        if type(self.model) == type(QtGui.QStandardItemModel(0,0)):
-            # Split into: column name and filter value
-            split_filter = self.inputLine.text().split('=')
-            header_column = self.get_header_column(split_filter[0])
+        if isinstance(self.model, CsvTableModel):
+            # Filters are expressions such as: price > 10 AND (name contains 'app' OR id in (1, 2))
+            # Comparisons are =, !=, <, <=, >, >=, ^= for "starts with", ~ for a regular expression,
+            # contains, in (...) and is [not] null, combined with AND, OR, NOT and parentheses
+            import FilterExpression
+
+            try:
+                node = FilterExpression.parse(self.inputLine.text(), self.model.header_labels())
+            except ValueError:
+                node = None
+
+            # Filtering goes back to the table if query results are being shown
+            self.show_csv_model()
+
+            with Tracing.span("filter", expression=self.inputLine.text()) as traced:
+                # Every row of the table is answered for, from a column index or a mask
+                traced.add(self.model.rowCount())
+
+                try:
+                    if node != None and node[0] == "compare" and node[2] != "contains":
+                        # A single comparison is answered from the column's index
+                        row_count = self.filter_proxy_model.filter_rows(node[1], node[2], node[3])
+
+                    elif node != None:
+                        # Compound expressions are evaluated as vectorized masks over the whole table
+                        row_count = self.filter_proxy_model.show_rows(FilterExpression.evaluate(node, self.model.store))
 
-            if header_column != None:
-                self.filter_proxy_model.setFilterKeyColumn(header_column)
-                self.filter_proxy_model.setFilterRegExp(split_filter[1])
+                    else:
+                        # Plain column<op>value filters may have unquoted values with spaces in them
+                        try:
+                            header_label, op, value = parse_predicate(self.inputLine.text())
+                        except ValueError:
+                            return
+
+                        header_column = self.get_header_column(header_label)
+
+                        if header_column == None:
+                            return
+
+                        row_count = self.filter_proxy_model.filter_rows(header_column, op, value)
+
+                except re.error as e:
+                    self.statusbar.showMessage("Invalid regular expression: " + str(e))
+                    return
+
+                traced.fields["matches"] = row_count
+
+            self.statusbar.showMessage(format(row_count, ",") + " matching rows.")
+
+    def live_filter_table(self):
+        # Only tables held in memory are filtered while typing, building an index over a
+        # memory mapped file means reading all of it
+        if isinstance(self.model, CsvTableModel) and not isinstance(self.model.store, MappedCsv):
+            if self.inputLine.text() == "":
+                self.filter_proxy_model.clear_filter()
+            else:
+                self.filter_table()
 
     def get_header_column(self, header_label):
         # Returns index of column specified in the filter
         for x in range(0, self.model.columnCount()):
-            if header_label == self.model.horizontalHeaderItem(x).text():
+            if header_label == self.model.headerData(x, QtCore.Qt.Horizontal):
                 return x
         
         # User may input a column name that doesn't exist
@@ -466,12 +1175,262 @@ class Ui_MainWindow(object):
     ################################################
 
     def execute_query_from_input_line(self):
-        if type(self.model) == type(QSqlTableModel()):
-            # Executes query from input line
-            query = QSqlQuery(self.inputLine.text())
-            self.model.setQuery(query)
+        if isinstance(self.model, CsvTableModel):
+            self.execute_csv_query(self.inputLine.text())
+
+        elif self.db_path != None:
+            # Executes query from input line, also on a database whose tables were all dropped
+            self.execute_query_from_statement(self.inputLine.text())
 
     def execute_query_from_statement(self, statement):
-        if type(self.model) == type(QSqlTableModel()):
-            query = QSqlQuery(statement)
-            self.model.setQuery(query)
\ No newline at end of file
+        if self.db_path != None:
+            self.run_query(self.db_path, statement)
+
+    def execute_csv_query(self, statement):
+        # The csv table is loaded into a temporary SQLite database named after the file on
+        # the first query and reloaded after it has been edited. The results are shown
+        # read-only, Reset goes back to the editable table.
+        if self.loader != None:
+            self.statusbar.showMessage("Queries can be run once the file has finished loading.")
+            return
+
+        if self.csv_database == None or self.csv_database.store is not self.model.store:
+            self.close_csv_database()
+            self.csv_database = CsvDatabase(self.model.store, self.csv_table_name)
+            self.csv_database_model = self.model
+            self.model.dataChanged.connect(self.csv_database.invalidate)
+            self.model.rowsInserted.connect(self.csv_database.invalidate)
+            self.model.rowsRemoved.connect(self.csv_database.invalidate)
+
+        # The table is loaded again on the query's worker thread, results cached before
+        # the last edit are out of date
+        if self.csv_database.is_stale():
+            self.query_cache.invalidate(self.csv_database.path)
+
+        self.run_query(self.csv_database.path, statement, self.csv_database.prepare)
+
+        # The worker reads the table while preparing it, it cannot be edited until then
+        if self.query != None:
+            self.model.read_only = True
+
+    def close_csv_database(self):
+        self.cancel_query()
+
+        if self.csv_database != None:
+            # The model's signals would keep the closed database alive
+            self.csv_database_model.dataChanged.disconnect(self.csv_database.invalidate)
+            self.csv_database_model.rowsInserted.disconnect(self.csv_database.invalidate)
+            self.csv_database_model.rowsRemoved.disconnect(self.csv_database.invalidate)
+            self.csv_database_model = None
+
+            self.csv_database.close()
+            self.csv_database = None
+
+    def set_export_workers(self):
+        workers, ok = QInputDialog.getInt(None, "Export Workers", "Tables written at the same time when saving a database as .csv files:",
+                                          self.export_workers, 1, 64)
+        if ok:
+            self.export_workers = workers
+
+    def set_query_timeout(self):
+        timeout, ok = QInputDialog.getInt(None, "Query Timeout", "Seconds a query may run (0 for no limit):",
+                                          self.query_timeout, 0, 24 * 60 * 60)
+        if ok:
+            self.query_timeout = timeout
+
+    ################################################
+    #                   METRICS                    #
+    ################################################
+
+    def show_metrics(self, event):
+        text = "%s: %.2f s" % (event["name"], event["seconds"])
+
+        if event["rows"]:
+            text += ", %s rows" % format(event["rows"], ",")
+        if event["rows_per_second"]:
+            text += " (%s rows/s)" % format(int(event["rows_per_second"]), ",")
+        if event["memory_delta"] is not None:
+            text += ", %+.1f MB" % (event["memory_delta"] / (1024 * 1024))
+
+        self.metricsLabel.setText(text)
+        self.metricsLabel.setToolTip("\n".join("%s: %s" % (name, format(value, ","))
+                                               for name, value in sorted(Tracing.tracer.counters.items())))
+
+    def toggle_tracing(self, checked):
+        # Finished operations are appended to the chosen file as JSON lines until unchecked
+        if not checked:
+            Tracing.tracer.stop()
+            self.statusbar.showMessage("Tracing stopped.")
+            return
+
+        path = QFileDialog.getSaveFileName(filter=TRACE_FILE_FILTER)[0]
+        error = None
+
+        if path:
+            try:
+                Tracing.tracer.start(path)
+                self.statusbar.showMessage("Tracing operations to " + os.path.basename(path) + ".")
+                return
+            except OSError as e:
+                error = e.strerror or str(e)
+
+        # Unchecked again without calling toggle_tracing a second time
+        self.traceAction.blockSignals(True)
+        self.traceAction.setChecked(False)
+        self.traceAction.blockSignals(False)
+
+        if error is not None:
+            self.statusbar.showMessage("Tracing not started: " + error)
+
+    ################################################
+    #              BACKGROUND QUERIES              #
+    ################################################
+
+    def run_query(self, path, statement, prepare=None):
+        # prepare is run by the worker before the statement, see QueryWorker
+        self.cancel_query()
+
+        # Results of a query that ran before are shown right away if nothing was written since
+        cached = self.query_cache.query_result(path, statement)
+
+        if cached != None:
+            self.query_model = QueryResultModel(None)
+            self.query_model.add_columns(cached[0])
+            self.query_model.add_rows(cached[1])
+            self.query_model.finish()
+            self.show_model(self.query_model)
+            self.statusbar.showMessage("Query returned " + format(len(cached[1]), ",") + " rows (cached).")
+            return
+
+        worker = QueryWorker(path, statement, self.query_timeout, functools.partial(prepare, statement) if prepare else None)
+        self.query = worker
+        self.query_model = QueryResultModel(worker)
+
+        signals = worker.signals
+        signals.preparing.connect(functools.partial(self.on_query_preparing, worker))
+        signals.prepared.connect(functools.partial(self.on_query_prepared, worker))
+        signals.columns.connect(functools.partial(self.on_query_columns, worker))
+        signals.batch.connect(functools.partial(self.on_query_batch, worker))
+        signals.finished.connect(functools.partial(self.on_query_finished, worker))
+        signals.failed.connect(functools.partial(self.on_query_failed, worker))
+
+        # The progress bar is a busy indicator, the number of result rows is not known up front
+        self.progressBar.setRange(0, 0)
+        self.progressBar.setVisible(True)
+        self.cancelButton.setVisible(True)
+        if prepare:
+            self.statusbar.showMessage("Preparing table " + self.csv_table_name + " for queries...")
+        else:
+            self.statusbar.showMessage("Running query...")
+        self.queryTimer.start()
+
+        self.queryThreadPool.start(worker)
+
+    def cancel_query(self):
+        # Results that were already shown stay in the table, no more rows are read for them
+        if self.query != None:
+            self.query.cancel()
+
+            # A cancelled worker stops reading the table within a batch of rows, the
+            # table is not changed or closed before then
+            if self.query.preparing and self.csv_database != None:
+                with self.csv_database.lock:
+                    pass
+
+            self.query = None
+            self.query_model.finish()
+            self.stop_query_progress()
+            self.end_csv_read_only()
+
+    def end_csv_read_only(self):
+        if isinstance(self.model, CsvTableModel):
+            self.model.read_only = False
+
+    def stop_query_progress(self):
+        self.queryTimer.stop()
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setVisible(False)
+        self.cancelButton.setVisible(False)
+
+    def query_rate(self, worker, row_count):
+        elapsed = worker.elapsed()
+        rate = row_count / elapsed if elapsed > 0 else 0
+        return "%s rows in %.2f s (%s rows/s)" % (format(row_count, ","), elapsed, format(int(rate), ","))
+
+    # Signals of queries that have been cancelled or replaced may still be queued,
+    # so every handler first checks that its query is the current one
+
+    def on_query_tick(self):
+        if self.query != None and self.query_model.rowCount() == 0 and not self.query.preparing:
+            self.statusbar.showMessage("Running query... %.1f s" % self.query.elapsed())
+
+    def on_query_preparing(self, worker, row_count):
+        if worker is self.query:
+            self.statusbar.showMessage("Preparing table " + self.csv_table_name + " for queries, " +
+                                       format(row_count, ",") + " rows loaded...")
+
+    def on_query_prepared(self, worker):
+        if worker is self.query:
+            self.end_csv_read_only()
+
+    def on_query_columns(self, worker, columns):
+        if worker is self.query:
+            self.query_model.add_columns(columns)
+            self.show_model(self.query_model)
+
+    def on_query_batch(self, worker, rows):
+        if worker is not self.query:
+            return
+
+        self.query_model.add_rows(rows)
+        row_count = self.query_model.rowCount()
+
+        # The worker waits once it is ahead of the table view, more rows are read as it scrolls.
+        # It can still be cancelled to release its read transaction.
+        if row_count >= worker.wanted:
+            self.queryTimer.stop()
+            self.progressBar.setVisible(False)
+            self.statusbar.showMessage("Query returned " + self.query_rate(worker, row_count) + ", scroll for more.")
+        else:
+            self.statusbar.showMessage("Query running, " + self.query_rate(worker, row_count) + "...")
+
+    def on_query_finished(self, worker, row_count, is_select):
+        if worker is not self.query:
+            return
+
+        self.query = None
+        self.query_model.finish()
+        self.stop_query_progress()
+
+        if is_select:
+            self.query_cache.add_query_result(worker.path, worker.statement, self.query_model.columns, self.query_model.rows)
+            self.statusbar.showMessage("Query returned " + self.query_rate(worker, row_count) + ".")
+            return
+
+        self.statusbar.showMessage("Statement changed %s rows in %.2f s." % (format(row_count, ","), worker.elapsed()))
+
+        # Cached results are dropped even if the write left the file's version as it was,
+        # e.g. a WAL mode commit within the file system's time resolution
+        self.query_cache.invalidate(worker.path)
+
+        # Statements that change data leave the pages read so far out of date
+        if self.db_path != None:
+            self.update_combobox()
+
+            if self.model != None:
+                try:
+                    self.model.refresh()
+                except sqlite3.Error as e:
+                    self.statusbar.showMessage("Table " + self.model.table + " could not be read: " + str(e))
+
+            self.show_model(self.model)
+
+    def on_query_failed(self, worker, message):
+        if worker is not self.query:
+            return
+
+        self.query = None
+        self.query_model.finish()
+        self.stop_query_progress()
+        self.end_csv_read_only()
+        self.statusbar.showMessage("Query failed: " + message)
\ No newline at end of file
@@ -0,0 +1,327 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Out-of-core access to large .csv files.     #
+# The file is memory mapped and a row-start offset index   #
+# is built in a single pass (and saved next to the file    #
+# as <file>.idx), rows are then only parsed when they are  #
+# asked for. This module does not depend on Qt.            #
+#                                                          #
+############################################################
+
+import io
+import os
+import csv
+import mmap
+import array
+import struct
+from collections import OrderedDict
+from Export import ENCODING
+
+# Sidecar index file layout: magic, size and mtime of the indexed .csv file,
+# number of offsets, followed by the offsets as little endian unsigned 64 bit integers
+INDEX_EXTENSION = ".idx"
+INDEX_MAGIC = b"KLMIDX01"
+INDEX_HEADER = struct.Struct("<8sQQQ")
+
+# Rows are parsed and cached in blocks, the cache is bounded so resident memory
+# does not grow as the user scrolls through the file
+BLOCK_ROWS = 256
+CACHED_BLOCKS = 64
+
+# Number of offsets handed out at a time while the index is being built and
+# the size of the pieces the file is read in to build it
+INDEX_BATCH_SIZE = 65536
+INDEX_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def iter_index(data, start=0, batch_size=INDEX_BATCH_SIZE):
+    # Yields the start offset of every record in data (a bytes-like object or mmap)
+    # in batches, followed by the end offset of the last record. Newlines inside
+    # quoted fields do not start a new record, quotes are balanced per line so the
+    # quote state only needs to flip when a line contains an odd number of quotes.
+    size = len(data)
+    offsets = array.array('Q', [start])
+    chunk_start = start
+    in_quotes = False
+
+    # The mapped file is scanned one chunk of whole lines at a time
+    while chunk_start < size:
+        chunk_end = min(chunk_start + INDEX_CHUNK_SIZE, size)
+
+        if chunk_end < size:
+            newline = data.find(b"\n", chunk_end - 1)
+            chunk_end = size if newline == -1 else newline + 1
+
+        chunk = data[chunk_start:chunk_end]
+        position = 0
+
+        while position < len(chunk):
+            newline = chunk.find(b"\n", position)
+            end = len(chunk) if newline == -1 else newline + 1
+
+            if chunk.count(b'"', position, end) % 2:
+                in_quotes = not in_quotes
+
+            position = end
+
+            if not in_quotes:
+                offsets.append(chunk_start + position)
+
+                if len(offsets) >= batch_size:
+                    yield offsets
+                    offsets = array.array('Q')
+
+        chunk_start = chunk_end
+
+    # An unterminated quoted field runs to the end of the file
+    if in_quotes:
+        offsets.append(size)
+
+    if offsets:
+        yield offsets
+
+
+def build_index(data):
+    offsets = array.array('Q')
+
+    for batch in iter_index(data):
+        offsets.extend(batch)
+
+    return offsets
+
+
+def index_path(path):
+    return path + INDEX_EXTENSION
+
+
+def load_index(path):
+    # Returns the saved index for path or None if there is none or it is out of date
+    try:
+        stat = os.stat(path)
+        with open(index_path(path), "rb") as f:
+            magic, size, mtime, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+
+            if magic != INDEX_MAGIC or size != stat.st_size or mtime != stat.st_mtime_ns:
+                return None
+
+            offsets = array.array('Q')
+            offsets.frombytes(f.read(count * offsets.itemsize))
+    except (OSError, struct.error, ValueError):
+        return None
+
+    if len(offsets) != count:
+        return None
+
+    if struct.pack("=H", 1) != struct.pack("<H", 1):
+        offsets.byteswap()
+
+    return offsets
+
+
+def save_index(path, offsets):
+    # Saving the index is only an optimisation, a read-only folder is not an error
+    try:
+        stat = os.stat(path)
+        data = array.array('Q', offsets)
+
+        if struct.pack("=H", 1) != struct.pack("<H", 1):
+            data.byteswap()
+
+        with open(index_path(path), "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(data)))
+            data.tofile(f)
+    except OSError:
+        pass
+
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        # Empty files cannot be memory mapped
+        if os.fstat(f.fileno()).st_size > 0:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return b""
+
+
+def record_offset(path, record):
+    # Byte offset at which record starts in the .csv file at path (record 0 being the
+    # header), or the end of the file if it has fewer records
+    offsets = load_index(path)
+    if offsets is not None:
+        return offsets[min(record, len(offsets) - 1)]
+
+    data = _map_file(path)
+    end = 0
+
+    try:
+        count = 0
+        for batch in iter_index(data):
+            if record < count + len(batch):
+                return batch[record - count]
+
+            count += len(batch)
+            end = batch[-1]
+    finally:
+        if data:
+            data.close()
+
+    return end
+
+
+class MappedCsv(object):
+    def __init__(self, path, offsets=None, encoding=ENCODING):
+        self.path = path
+        self.encoding = encoding
+        self.open()
+
+        if offsets is None:
+            offsets = load_index(path)
+
+        if offsets is None:
+            offsets = build_index(self.map)
+            save_index(path, offsets)
+
+        # offsets holds the start of the header row, the start of every data row
+        # and the end of the file
+        self.offsets = offsets
+        self.blocks = OrderedDict()
+
+        # Edited cells are kept in memory on top of the mapped file
+        self.edits = {}
+
+        header = self._parse(0, 1)
+        self.headers = header[0] if header else []
+
+    def row_count(self):
+        return max(len(self.offsets) - 2, 0)
+
+    def column_count(self):
+        return len(self.headers)
+
+    def header(self, column):
+        return self.headers[column]
+
+    def value(self, row, column):
+        edited = self.edits.get((row, column))
+        if edited is not None:
+            return edited
+
+        cells = self._block(row // BLOCK_ROWS)[row % BLOCK_ROWS]
+        return cells[column] if column < len(cells) else ""
+
+    def set_value(self, row, column, text):
+        self.edits[(row, column)] = text
+
+    def extend_index(self, offsets):
+        # Used while the index is still being built in the background, the last cached
+        # block may have been parsed before all of its rows were indexed
+        self.blocks.pop(self.row_count() // BLOCK_ROWS, None)
+        self.offsets.extend(offsets)
+
+        if not self.headers:
+            header = self._parse(0, 1)
+            self.headers = header[0] if header else []
+
+    def close(self):
+        # The file can only be rewritten once it is no longer mapped
+        if self.map:
+            self.map.close()
+        self.map = b""
+
+    def open(self):
+        self.map = _map_file(self.path)
+
+    def reopen(self, row=None):
+        # Maps the file again after it was rewritten from data row row on, or as a whole if
+        # row is None. Rows before it are where they were, so only the rest of the file is
+        # indexed again, and the edits are now in the file.
+        keep = 0 if row is None else min(row + 1, len(self.offsets) - 1)
+        start = self.offsets[keep] if keep else 0
+        self.close()
+        self.open()
+
+        offsets = array.array('Q', self.offsets[:keep])
+        for batch in iter_index(self.map, start):
+            offsets.extend(batch)
+
+        self.offsets = offsets
+        self.blocks.clear()
+        self.edits.clear()
+        save_index(self.path, offsets)
+
+        if row is None:
+            header = self._parse(0, 1)
+            self.headers = header[0] if header else []
+
+    def row(self, row):
+        cells = list(self._block(row // BLOCK_ROWS)[row % BLOCK_ROWS])
+        return self._apply_edits(row, cells)
+
+    def column_values(self, column):
+        return [self.value(x, column) for x in range(0, self.row_count())]
+
+    def iter_batches(self, batch_size=BLOCK_ROWS * 16, start=0, stop=None):
+        # Sequential reads bypass the block cache so a full scan does not evict the
+        # rows that are on screen
+        stop = self.row_count() if stop is None else min(stop, self.row_count())
+
+        for batch_start in range(start, stop, batch_size):
+            batch_stop = min(batch_start + batch_size, stop)
+            rows = self._parse(batch_start + 1, batch_stop + 1)
+
+            if self.edits:
+                rows = [self._apply_edits(batch_start + x, list(row)) for x, row in enumerate(rows)]
+
+            yield rows
+
+    def _apply_edits(self, row, cells):
+        if self.edits:
+            for column in range(0, len(self.headers)):
+                edited = self.edits.get((row, column))
+                if edited is not None:
+                    while len(cells) <= column:
+                        cells.append("")
+                    cells[column] = edited
+
+        return cells
+
+    def _block(self, block):
+        rows = self.blocks.get(block)
+
+        if rows is None:
+            first = block * BLOCK_ROWS
+            rows = self._parse(first + 1, min(first + BLOCK_ROWS, self.row_count()) + 1)
+            self.blocks[block] = rows
+
+            if len(self.blocks) > CACHED_BLOCKS:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(block)
+
+        return rows
+
+    def _parse(self, first, last):
+        # Parses records first..last-1 of the file (record 0 being the header)
+        if first >= last or last >= len(self.offsets):
+            return []
+
+        text = self.map[self.offsets[first]:self.offsets[last]].decode(self.encoding, errors="replace")
+        rows = list(csv.reader(io.StringIO(text, newline="")))
+
+        # Blank lines are still rows in the index
+        if len(rows) < last - first:
+            rows = self._parse_each(first, last)
+
+        return rows
+
+    def _parse_each(self, first, last):
+        rows = []
+
+        for x in range(first, last):
+            text = self.map[self.offsets[x]:self.offsets[x + 1]].decode(self.encoding, errors="replace")
+            rows.append(next(csv.reader(io.StringIO(text, newline="")), []))
+
+        return rows
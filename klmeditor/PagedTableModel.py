@@ -0,0 +1,518 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Table model for database tables. Rows are   #
+# read in pages using keyset pagination on the rowid and   #
+# only a bounded number of pages is kept in memory. The    #
+# exact row count, and for tables with gaps in their       #
+# rowids a directory of page start keys, are worked out in #
+# the background so jumping to any row is a single seek.   #
+# Sorting is pushed down to SQLite as ORDER BY, the pages  #
+# of a sorted table are located by their sort key values   #
+# the same way so sorted tables page as fast as unsorted   #
+# ones and sorts can use the table's indexes. Edited cells #
+# are kept by rowid on top of the pages until they are     #
+# saved, tables without a rowid cannot be edited.          #
+#                                                          #
+############################################################
+
+import array
+import functools
+from collections import OrderedDict
+from PyQt5 import QtCore
+from WorkerSignals import WorkerSignals
+from Export import connect_read_only, quote_identifier, rowid_alias
+from QueryCache import database_version
+from ChangeJournal import ChangeJournal, Change, SET
+import Tracing
+
+# Rows per page and number of pages kept in memory
+PAGE_ROWS = 256
+CACHED_PAGES = 64
+
+# Number of page start keys handed to the model at a time while the directory is built
+DIRECTORY_BATCH_PAGES = 4096
+
+
+class PageIndexSignals(WorkerSignals):
+    LAST_SIGNALS = ("finished",)
+
+    counted = QtCore.pyqtSignal("qint64", bool, "qint64")
+    directory = QtCore.pyqtSignal(object)
+    finished = QtCore.pyqtSignal()
+
+
+class PageIndexWorker(QtCore.QRunnable):
+    # Counts the rows of a table and, if its rowids are not contiguous, collects the
+    # rowid every page starts at. Sorted tables collect the sort key values and rowid of
+    # the first row of every page from sort_query instead. Runs on its own read-only connection.
+    def __init__(self, path, table, key, sort_query=None):
+        super().__init__()
+        self.path = path
+        self.table = table
+        self.key = key
+        self.sort_query = sort_query
+        self.signals = PageIndexSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        connection = connect_read_only(self.path)
+
+        # The count is interrupted as soon as the model is closed
+        connection.set_progress_handler(lambda: 1 if self.cancelled else 0, 10000)
+
+        try:
+            table = quote_identifier(self.table)
+            count = connection.execute("SELECT COUNT(*) FROM " + table).fetchone()[0]
+
+            if self.key is None:
+                self.signals.counted.emit(count, False, 0)
+                return
+
+            if self.sort_query is not None:
+                self.signals.counted.emit(count, False, 0)
+                cursor = connection.execute(self.sort_query)
+                keys = []
+            else:
+                first, last = connection.execute("SELECT MIN(" + self.key + "), MAX(" + self.key + ") FROM " + table).fetchone()
+                dense = count == 0 or (last - first + 1 == count)
+                self.signals.counted.emit(count, dense, first or 0)
+
+                if dense:
+                    return
+
+                # Only the key column is read, which walks the table's b-tree without its rows
+                cursor = connection.execute("SELECT " + self.key + " FROM " + table + " ORDER BY " + self.key)
+                keys = array.array('q')
+
+            position = 0
+
+            while not self.cancelled:
+                rows = cursor.fetchmany(PAGE_ROWS * 64)
+                if not rows:
+                    break
+
+                for x in range(-position % PAGE_ROWS, len(rows), PAGE_ROWS):
+                    keys.append(rows[x] if self.sort_query is not None else rows[x][0])
+
+                position += len(rows)
+
+                if len(keys) >= DIRECTORY_BATCH_PAGES:
+                    self.signals.directory.emit(keys)
+                    keys = [] if self.sort_query is not None else array.array('q')
+
+            if keys and not self.cancelled:
+                self.signals.directory.emit(keys)
+
+        except Exception:
+            # A cancelled count raises an interrupted error, nothing is reported in that case
+            pass
+
+        finally:
+            connection.close()
+            self.signals.finished.emit()
+
+
+class PagedTableModel(QtCore.QAbstractTableModel):
+    def __init__(self, path, table, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.table = table
+        self.connection = connect_read_only(path)
+        self.columns = []
+        self.key = None
+
+        # (column, descending) pairs the rows are sorted by, the first one sorts first
+        self.sort_keys = []
+
+        # (rowid, column) -> value of every edited cell, the journal rows are rowids
+        self.edits = {}
+        self.journal = ChangeJournal()
+
+        self.worker = None
+        self.load()
+
+        # The table as it is in the file, edits are written to it when it is saved
+        self.journal.mark_saved(path, self.version)
+
+    def read_columns(self):
+        cursor = self.connection.execute("SELECT * FROM " + quote_identifier(self.table) + " LIMIT 0")
+        columns = [column[0] for column in cursor.description]
+
+        # Tables without a rowid (WITHOUT ROWID tables and views) are paged with OFFSET
+        key = rowid_alias(columns)
+        if key is not None:
+            try:
+                self.connection.execute("SELECT " + key + " FROM " + quote_identifier(self.table) + " LIMIT 0")
+            except Exception:
+                key = None
+
+        return columns, key
+
+    def load(self):
+        self.version = database_version(self.path)
+        self.pages = OrderedDict()
+
+        # The table may have been altered since it was last read. Columns added at the end
+        # (ALTER TABLE ADD COLUMN) leave the others where they were, otherwise the sort
+        # keys may point at other columns than the ones the table was sorted by.
+        columns, self.key = self.read_columns()
+        if columns[:len(self.columns)] != self.columns:
+            self.sort_keys = []
+        self.columns = columns
+        self.dense = False
+        self.first_key = 0
+
+        # Page start rowids, or (sort key values..., rowid) tuples for sorted tables
+        self.directory = [] if self.sort_keys else array.array('q')
+
+        # The first page is read right away, a table that fits on it needs no counting
+        first_page = self.fetch_page(0)
+        self.pages[0] = first_page
+        self.row_count = len(first_page)
+
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+        if len(first_page) == PAGE_ROWS:
+            sort_query = None
+            if self.sort_keys and self.key is not None:
+                sort_query = ("SELECT " + ", ".join(self.sort_columns() + [self.key]) + " FROM " +
+                              quote_identifier(self.table) + self.order_clause())
+
+            self.worker = PageIndexWorker(self.path, self.table, self.key, sort_query)
+            self.worker.signals.counted.connect(functools.partial(self.on_counted, self.worker))
+            self.worker.signals.directory.connect(functools.partial(self.on_directory, self.worker))
+            QtCore.QThreadPool.globalInstance().start(self.worker)
+
+    def sort_by(self, keys):
+        # keys is a list of (column, descending) pairs, an empty list restores rowid order
+        self.sort_keys = list(keys)
+        self.refresh()
+
+    def refresh(self):
+        # Called after the table may have been changed through another connection. A table
+        # that cannot be read any more is shown without rows and the error is raised.
+        self.beginResetModel()
+
+        try:
+            self.load()
+        except Exception:
+            self.pages = OrderedDict()
+            self.row_count = 0
+            raise
+        finally:
+            self.endResetModel()
+
+    def refresh_if_changed(self):
+        # Pages, row count and directory are kept while the database file is unchanged
+        if database_version(self.path) != self.version:
+            self.refresh()
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+        self.connection.close()
+
+    ################################################
+    #              QT MODEL INTERFACE              #
+    ################################################
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.row_count
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.columns)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role == QtCore.Qt.DisplayRole or role == QtCore.Qt.EditRole:
+            rows = self.page(index.row() // PAGE_ROWS)
+            offset = index.row() % PAGE_ROWS
+
+            if offset >= len(rows):
+                return None
+
+            # The first value of every fetched row is its key
+            if self.edits and (rows[offset][0], index.column()) in self.edits:
+                return self.edits[(rows[offset][0], index.column())]
+
+            value = rows[offset][index.column() + (1 if self.key is not None else 0)]
+
+            if isinstance(value, bytes):
+                return "<" + str(len(value)) + " bytes>"
+
+            return value
+
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or role != QtCore.Qt.EditRole or self.key is None:
+            return False
+
+        rows = self.page(index.row() // PAGE_ROWS)
+        offset = index.row() % PAGE_ROWS
+
+        if offset >= len(rows):
+            return False
+
+        rowid = rows[offset][0]
+        old = self.edits.get((rowid, index.column()), rows[offset][index.column() + 1])
+
+        # Blobs are shown as their size and cannot be edited as text
+        if isinstance(old, bytes):
+            return False
+
+        if value != ("" if old is None else str(old)):
+            self.journal.record(SET, rowid, index.column(), old, value)
+            self.apply_set(rowid, index.column(), value)
+
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+
+        if self.key is None:
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if orientation == QtCore.Qt.Horizontal:
+            return self.columns[section] if section < len(self.columns) else None
+
+        return section + 1
+
+    def header_labels(self):
+        return list(self.columns)
+
+    ################################################
+    #                   EDITING                    #
+    ################################################
+
+    def can_change_rows(self):
+        # Rows of database tables are only edited cell by cell
+        return False
+
+    def undo(self):
+        change = self.journal.undo()
+        self.apply_set(change.row, change.column, change.new)
+
+    def redo(self):
+        change = self.journal.redo()
+        self.apply_set(change.row, change.column, change.new)
+
+    def apply_set(self, rowid, column, value):
+        self.edits[(rowid, column)] = value
+
+        # The row is only on screen if its page is still cached
+        for number, rows in self.pages.items():
+            for offset, row in enumerate(rows):
+                if row[0] == rowid:
+                    index = self.index(number * PAGE_ROWS + offset, column)
+                    self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole])
+                    return
+
+    def edited_cells(self):
+        # Every edited cell as a change, for files that have none of the edits yet
+        return [Change(0, SET, rowid, column, None, value) for (rowid, column), value in self.edits.items()]
+
+    def saved(self, path):
+        # Called once the edits have been written to the database file at path
+        if path == self.path:
+            # The file has the edited values now, later writes to it (e.g. an UPDATE from the
+            # query line) must not be hidden behind them. Pages are read again as needed.
+            self.edits.clear()
+            self.pages = OrderedDict()
+            self.version = database_version(self.path)
+
+            if self.row_count:
+                self.dataChanged.emit(self.index(0, 0), self.index(self.row_count - 1, len(self.columns) - 1))
+
+        self.journal.mark_saved(path, database_version(path))
+
+    ################################################
+    #                    PAGING                    #
+    ################################################
+
+    def page(self, number):
+        rows = self.pages.get(number)
+
+        if rows is None:
+            rows = self.fetch_page(number)
+            self.pages[number] = rows
+            Tracing.count("pages read")
+
+            if len(self.pages) > CACHED_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(number)
+
+        return rows
+
+    def fetch_page(self, number):
+        table = quote_identifier(self.table)
+
+        if self.key is None:
+            return self.connection.execute("SELECT * FROM " + table + self.order_clause() + " LIMIT ? OFFSET ?",
+                                           (PAGE_ROWS, number * PAGE_ROWS)).fetchall()
+
+        if self.sort_keys:
+            return self.fetch_sorted_page(number)
+
+        select = "SELECT " + self.key + ", * FROM " + table
+        order = " ORDER BY " + self.key + " LIMIT " + str(PAGE_ROWS)
+        start = self.page_start_key(number)
+
+        # A known start key or the last key of the page before are a single index seek,
+        # only pages that cannot be located yet fall back to OFFSET
+        if start is not None:
+            return self.connection.execute(select + " WHERE " + self.key + " >= ?" + order, (start,)).fetchall()
+
+        previous = self.pages.get(number - 1)
+        if previous:
+            return self.connection.execute(select + " WHERE " + self.key + " > ?" + order, (previous[-1][0],)).fetchall()
+
+        return self.connection.execute(select + order + " OFFSET ?", (number * PAGE_ROWS,)).fetchall()
+
+    def page_start_key(self, number):
+        if number == 0:
+            return None
+
+        if self.dense:
+            return self.first_key + number * PAGE_ROWS
+
+        if number < len(self.directory):
+            return self.directory[number]
+
+        return None
+
+    ################################################
+    #                SORTED PAGING                 #
+    ################################################
+
+    def sort_columns(self):
+        return [quote_identifier(self.columns[x]) for x, descending in self.sort_keys]
+
+    def order_clause(self):
+        terms = [x + (" DESC" if descending else "") for x, (y, descending) in zip(self.sort_columns(), self.sort_keys)]
+
+        # The rowid breaks ties in the direction of the first column, so an index on that
+        # column alone already delivers rows in the right order
+        if self.key is not None:
+            terms.append(self.key + (" DESC" if self.sort_keys and self.sort_keys[0][1] else ""))
+
+        return " ORDER BY " + ", ".join(terms) if terms else ""
+
+    def sort_key(self, row):
+        # Sort key values and rowid of a fetched row, the first value of the row is its rowid
+        return tuple(row[x + 1] for x, descending in self.sort_keys) + (row[0],)
+
+    def fetch_sorted_page(self, number):
+        start = self.page_start_key(number)
+        inclusive = True
+
+        if start is None and number > 0:
+            previous = self.pages.get(number - 1)
+
+            if not previous:
+                return self.connection.execute("SELECT " + self.key + ", * FROM " + quote_identifier(self.table) +
+                                               self.order_clause() + " LIMIT ? OFFSET ?",
+                                               (PAGE_ROWS, number * PAGE_ROWS)).fetchall()
+
+            start = self.sort_key(previous[-1])
+            inclusive = False
+
+        if start is None:
+            return self.connection.execute("SELECT " + self.key + ", * FROM " + quote_identifier(self.table) +
+                                           self.order_clause() + " LIMIT " + str(PAGE_ROWS)).fetchall()
+
+        # The rows from start on are read as up to three ranges of the first sort column, each
+        # one an index seek: rows equal to start's value, rows after it and, in a descending
+        # sort, the NULLs that SQLite puts last
+        column = self.sort_columns()[0]
+        value = start[0]
+        descending = self.sort_keys[0][1]
+        rest, parameters = self.after_clause(start, 1, inclusive)
+
+        ranges = [(column + " IS ? AND " + rest, [value] + parameters)]
+
+        if value is None:
+            if not descending:
+                ranges.append((column + " IS NOT NULL", []))
+        else:
+            ranges.append((column + (" < ?" if descending else " > ?"), [value]))
+            if descending:
+                ranges.append((column + " IS NULL", []))
+
+        rows = []
+
+        for where, parameters in ranges:
+            rows.extend(self.connection.execute("SELECT " + self.key + ", * FROM " + quote_identifier(self.table) +
+                                                " WHERE " + where + self.order_clause() + " LIMIT " +
+                                                str(PAGE_ROWS - len(rows)), parameters).fetchall())
+            if len(rows) >= PAGE_ROWS:
+                break
+
+        return rows
+
+    def after_clause(self, start, position, inclusive):
+        # Condition for rows that sort after start on the sort columns from position on,
+        # written out column by column since the columns may sort in different directions
+        if position == len(self.sort_keys):
+            op = "<" if self.sort_keys[0][1] else ">"
+            return self.key + " " + op + ("=" if inclusive else "") + " ?", [start[-1]]
+
+        column = self.sort_columns()[position]
+        value = start[position]
+        descending = self.sort_keys[position][1]
+        rest, parameters = self.after_clause(start, position + 1, inclusive)
+        same = column + " IS ? AND (" + rest + ")"
+
+        # Ascending sorts put NULLs first and descending sorts put them last
+        if value is None:
+            if descending:
+                return same, [value] + parameters
+            return "(" + column + " IS NOT NULL OR (" + same + "))", [value] + parameters
+
+        if descending:
+            return "(" + column + " < ? OR " + column + " IS NULL OR (" + same + "))", [value, value] + parameters
+
+        return "(" + column + " > ? OR (" + same + "))", [value, value] + parameters
+
+    # Results of a worker that was replaced by refresh() are ignored
+
+    def on_counted(self, worker, count, dense, first_key):
+        if worker is not self.worker:
+            return
+
+        self.dense = dense
+        self.first_key = first_key
+
+        if count > self.row_count:
+            self.beginInsertRows(QtCore.QModelIndex(), self.row_count, count - 1)
+            self.row_count = count
+            self.endInsertRows()
+
+    def on_directory(self, worker, keys):
+        if worker is self.worker:
+            self.directory.extend(keys)
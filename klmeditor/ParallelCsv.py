@@ -0,0 +1,144 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Parses a .csv file on several cores. The    #
+# file is split into byte ranges that start and end on     #
+# record boundaries (newlines inside quoted fields are     #
+# skipped), every range is parsed by a worker process into #
+# its own ColumnStore and the stores are joined back in    #
+# file order. This module does not depend on Qt.           #
+#                                                          #
+############################################################
+
+import io
+import os
+import csv
+from ColumnStore import ColumnStore
+
+# The first range is kept small so the first rows show up before the other ranges are
+# parsed, the other ranges are large enough that starting a task costs little
+FIRST_RANGE_SIZE = 1024 * 1024
+RANGE_SIZE = 32 * 1024 * 1024
+
+# Size of the pieces the file is read in while looking for record boundaries
+SCAN_BLOCK_SIZE = 64 * 1024
+
+# Rows handed to a ColumnStore at a time while a range is parsed
+PARSE_BATCH_ROWS = 20000
+
+
+def count_quotes(path, start, end):
+    # Runs in a worker process, returns the number of quote characters in start:end
+    count = 0
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+
+        while remaining > 0:
+            block = f.read(min(SCAN_BLOCK_SIZE, remaining))
+            if not block:
+                break
+
+            count += block.count(b'"')
+            remaining -= len(block)
+
+    return count
+
+
+def record_boundary(f, position, in_quotes):
+    # Returns the offset just after the first newline at or after position that is not
+    # inside a quoted field, in_quotes is the quote state at position. Like the row index
+    # of MappedCsv this relies on quotes only appearing around and doubled inside quoted
+    # fields, so the quote state flips with every quote character.
+    f.seek(position)
+
+    while True:
+        block = f.read(SCAN_BLOCK_SIZE)
+        if not block:
+            return position
+
+        start = 0
+
+        while True:
+            newline = block.find(b"\n", start)
+            end = newline if newline >= 0 else len(block)
+
+            if block.count(b'"', start, end) % 2 == 1:
+                in_quotes = not in_quotes
+
+            if newline < 0:
+                break
+
+            if not in_quotes:
+                return position + newline + 1
+
+            start = newline + 1
+
+        position += len(block)
+
+
+def split_file(path, pool):
+    # Returns the end of the header record and the (start, end) byte ranges of the rows.
+    # The quote state at the nominal split points is found by counting quotes in pool,
+    # each split point is then moved forward to the next record boundary.
+    size = os.path.getsize(path)
+
+    with open(path, "rb") as f:
+        header_end = record_boundary(f, 0, False)
+
+        points = []
+        point = header_end + FIRST_RANGE_SIZE
+
+        while point < size:
+            points.append(point)
+            point += RANGE_SIZE
+
+        counts = pool.map(count_quotes, [path] * len(points), [0] + points[:-1], points)
+
+        boundaries = [header_end]
+        quotes = 0
+
+        for point, count in zip(points, counts):
+            quotes += count
+
+            if point > boundaries[-1]:
+                boundaries.append(record_boundary(f, point, quotes % 2 == 1))
+
+    boundaries.append(size)
+
+    ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+    return header_end, ranges
+
+
+def parse_header(path, end, encoding):
+    with open(path, "rb") as f:
+        data = f.read(end)
+
+    return next(csv.reader(io.StringIO(data.decode(encoding, errors="replace"), newline="")), [])
+
+
+def parse_range(path, start, end, encoding):
+    # Runs in a worker process, returns the rows of start:end as a ColumnStore without
+    # headers. Only the compact columnar storage is sent back to the caller.
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    reader = csv.reader(io.StringIO(data.decode(encoding, errors="replace"), newline=""))
+    store = ColumnStore([])
+    batch = []
+
+    for row in reader:
+        batch.append(row)
+
+        if len(batch) >= PARSE_BATCH_ROWS:
+            store.append_rows(batch)
+            batch = []
+
+    store.append_rows(batch)
+
+    return store
@@ -0,0 +1,141 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Caches the table list of a database and the #
+# results of recent queries. Entries are tagged with the   #
+# version of the database file they were read from and are #
+# dropped as soon as the file has been written to, the     #
+# least recently used entries are evicted once the cache   #
+# grows past its memory budget. This module does not       #
+# depend on Qt.                                            #
+#                                                          #
+############################################################
+
+import os
+import sys
+import struct
+from collections import OrderedDict
+from Export import connect_read_only, list_tables
+import Tracing
+
+# Memory the cached query results may use, a single result may use a quarter of it
+CACHE_BUDGET = 256 * 1024 * 1024
+
+# Number of result rows measured to estimate the size of a whole result
+SIZE_SAMPLE_ROWS = 100
+
+# Offset of the file change counter in the SQLite database header
+CHANGE_COUNTER_OFFSET = 24
+
+
+def database_version(path):
+    # The change counter in the header is incremented by every commit in rollback journal
+    # mode, commits in WAL mode only touch the -wal file so its size and time are part of
+    # the version too. PRAGMA data_version cannot be used, it ignores the connection's own
+    # writes and every query runs on a new connection.
+    version = []
+
+    try:
+        with open(path, "rb") as f:
+            f.seek(CHANGE_COUNTER_OFFSET)
+            header = f.read(4)
+        version.append(struct.unpack(">I", header)[0] if len(header) == 4 else 0)
+    except OSError:
+        return None
+
+    for name in (path, path + "-wal"):
+        try:
+            stat = os.stat(name)
+            version.extend((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.extend((0, 0))
+
+    return tuple(version)
+
+
+def result_size(columns, rows):
+    # Estimated from the first rows, measuring every value of a large result would take
+    # longer than running the query again
+    if not rows:
+        return sys.getsizeof(rows)
+
+    sample = rows[:SIZE_SAMPLE_ROWS]
+    sample_size = sum(sys.getsizeof(row) + sum(sys.getsizeof(x) for x in row) for row in sample)
+
+    return sys.getsizeof(rows) + sample_size * len(rows) // len(sample) + sum(sys.getsizeof(x) for x in columns)
+
+
+class QueryCache(object):
+    def __init__(self, budget=CACHE_BUDGET):
+        self.budget = budget
+        self.size = 0
+
+        # (path, key) -> (version, value, size), least recently used first
+        self.entries = OrderedDict()
+
+    def get(self, path, key):
+        entry = self.entries.get((path, key))
+
+        if entry is None:
+            Tracing.count("cache misses")
+            return None
+
+        if entry[0] != database_version(path):
+            self.remove((path, key))
+            Tracing.count("cache misses")
+            return None
+
+        self.entries.move_to_end((path, key))
+        Tracing.count("cache hits")
+        return entry[1]
+
+    def put(self, path, key, value, size=0):
+        if size > self.budget // 4:
+            return
+
+        self.remove((path, key))
+        self.entries[(path, key)] = (database_version(path), value, size)
+        self.size += size
+
+        while self.size > self.budget:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, entry_key):
+        entry = self.entries.pop(entry_key, None)
+
+        if entry is not None:
+            self.size -= entry[2]
+
+    def invalidate(self, path=None):
+        # Drops the entries of path, or of every database
+        for entry_key in [x for x in self.entries if path is None or x[0] == path]:
+            self.remove(entry_key)
+
+    ################################################
+    #                CACHED LOOKUPS                #
+    ################################################
+
+    def tables(self, path):
+        tables = self.get(path, "tables")
+
+        if tables is None:
+            connection = connect_read_only(path)
+
+            try:
+                tables = list_tables(connection)
+            finally:
+                connection.close()
+
+            self.put(path, "tables", tables)
+
+        return tables
+
+    def query_result(self, path, statement):
+        # Returns (columns, rows) of an earlier run of statement, None if the database
+        # has changed since or the result was evicted
+        return self.get(path, ("query", statement))
+
+    def add_query_result(self, path, statement, columns, rows):
+        self.put(path, ("query", statement), (columns, rows), result_size(columns, rows))
@@ -0,0 +1,247 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Runs SQL queries on a worker thread with    #
+# its own SQLite connection. A progress handler lets a     #
+# query be cancelled or stopped after a timeout, and rows  #
+# are streamed to a result model in batches as the table   #
+# view asks for them. A query may first prepare its        #
+# database (load an opened .csv table) on the same thread. #
+#                                                          #
+############################################################
+
+import time
+import sqlite3
+import threading
+from PyQt5 import QtCore
+from WorkerSignals import WorkerSignals
+import Tracing
+
+# Rows fetched per batch and how many rows are fetched ahead of the table view
+FIRST_BATCH_ROWS = 256
+BATCH_ROWS = 4096
+PREFETCH_ROWS = 16384
+
+# Number of SQLite virtual machine instructions between cancel and timeout checks
+PROGRESS_INSTRUCTIONS = 1000
+
+# Length of statements in traces
+TRACED_STATEMENT_LENGTH = 200
+
+
+class QuerySignals(WorkerSignals):
+    preparing = QtCore.pyqtSignal("qint64")
+    prepared = QtCore.pyqtSignal()
+    columns = QtCore.pyqtSignal(list)
+    batch = QtCore.pyqtSignal(object)
+    finished = QtCore.pyqtSignal("qint64", bool)
+    failed = QtCore.pyqtSignal(str)
+
+
+class QueryWorker(QtCore.QRunnable):
+    def __init__(self, path, statement, timeout=None, prepare=None):
+        super().__init__()
+        self.path = path
+        self.statement = statement
+        self.timeout = timeout
+
+        # Called as prepare(progress, interrupt) before the statement runs, progress takes the
+        # number of rows prepared so far and interrupt is an SQLite progress handler
+        self.prepare = prepare
+        self.preparing = prepare is not None
+        self.signals = QuerySignals()
+        self.cancelled = False
+        self.timed_out = False
+        self.started = time.perf_counter()
+
+        # Time spent inside SQLite, the timeout does not count time spent waiting for
+        # the user to scroll further down the results
+        self.busy = 0.0
+        self.step_started = None
+
+        self.condition = threading.Condition()
+        self.wanted = PREFETCH_ROWS
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify()
+
+    def request(self, row_count):
+        # Called by the result model when the table view needs rows up to row_count
+        with self.condition:
+            if row_count + PREFETCH_ROWS > self.wanted:
+                self.wanted = row_count + PREFETCH_ROWS
+                self.condition.notify()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def interrupt(self):
+        # SQLite progress handler, a non-zero return value aborts the running statement
+        if self.cancelled:
+            return 1
+
+        if self.timeout and self.busy + time.perf_counter() - self.step_started > self.timeout:
+            self.timed_out = True
+            return 1
+
+        return 0
+
+    def interrupt_preparing(self):
+        # Preparing is stopped by cancelling only, the timeout is for the statement itself
+        return 1 if self.cancelled else 0
+
+    def step(self, function, *args):
+        self.step_started = time.perf_counter()
+
+        try:
+            return function(*args)
+        finally:
+            self.busy += time.perf_counter() - self.step_started
+
+    def run(self):
+        with Tracing.span("query", statement=self.statement[:TRACED_STATEMENT_LENGTH]) as traced:
+            self.execute(traced)
+
+            # Time spent inside SQLite, the rest was spent waiting for the table view
+            traced.fields["sqlite_seconds"] = self.busy
+
+    def execute(self, traced):
+        connection = None
+
+        try:
+            if self.prepare is not None:
+                try:
+                    self.prepare(self.signals.preparing.emit, self.interrupt_preparing)
+                finally:
+                    # The result model keeps the worker, not what it prepared
+                    self.prepare = None
+                    self.preparing = False
+
+                self.signals.prepared.emit()
+
+            connection = sqlite3.connect(self.path)
+            connection.set_progress_handler(self.interrupt, PROGRESS_INSTRUCTIONS)
+
+            cursor = self.step(connection.execute, self.statement)
+
+            # Statements without results (INSERT, UPDATE, CREATE, ...) are committed right away
+            if cursor.description is None:
+                connection.commit()
+                traced.add(max(cursor.rowcount, 0))
+                self.signals.finished.emit(max(cursor.rowcount, 0), False)
+                return
+
+            self.signals.columns.emit([column[0] for column in cursor.description])
+
+            delivered = 0
+            batch_rows = FIRST_BATCH_ROWS
+
+            while True:
+                with self.condition:
+                    while delivered >= self.wanted and not self.cancelled:
+                        self.condition.wait()
+
+                if self.cancelled:
+                    break
+
+                rows = self.step(cursor.fetchmany, min(batch_rows, self.wanted - delivered))
+                if not rows:
+                    break
+
+                delivered += len(rows)
+                traced.add(len(rows))
+                self.signals.batch.emit(rows)
+                batch_rows = BATCH_ROWS
+
+            if self.cancelled:
+                self.signals.failed.emit("Query cancelled.")
+            else:
+                self.signals.finished.emit(delivered, True)
+
+        except sqlite3.Error as e:
+            traced.fields["error"] = str(e)
+
+            if self.cancelled:
+                self.signals.failed.emit("Query cancelled.")
+            elif self.timed_out:
+                self.signals.failed.emit("Query timed out after %d s." % self.timeout)
+            else:
+                self.signals.failed.emit(str(e))
+
+        except Exception as e:
+            # Anything else (e.g. from preparing the database) must not escape the thread
+            traced.fields["error"] = str(e)
+            self.signals.failed.emit("Query cancelled." if self.cancelled else str(e))
+
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+class QueryResultModel(QtCore.QAbstractTableModel):
+    # Read-only model the results of a QueryWorker are appended to
+    def __init__(self, worker, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self.columns = []
+        self.rows = []
+        self.complete = False
+
+    def add_columns(self, columns):
+        self.beginResetModel()
+        self.columns = columns
+        self.endResetModel()
+
+    def add_rows(self, rows):
+        if not rows:
+            return
+
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def finish(self):
+        self.complete = True
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.columns)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return None
+
+        value = self.rows[index.row()][index.column()]
+
+        if isinstance(value, bytes):
+            return "<" + str(len(value)) + " bytes>"
+
+        return value
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if orientation == QtCore.Qt.Horizontal:
+            return self.columns[section] if section < len(self.columns) else None
+
+        return section + 1
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and not self.complete
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if self.worker is not None:
+            self.worker.request(len(self.rows))
@@ -0,0 +1,112 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Type-aware sorting for .csv tables. Every   #
+# sorted column gets a cached array of sort ranks (numbers #
+# compare as numbers, so 9 comes before 10) and sorts on   #
+# one or more columns are a single stable NumPy lexsort of #
+# those ranks. The result is a permutation of the rows,    #
+# the data itself is never copied or moved. This module    #
+# does not depend on Qt.                                   #
+#                                                          #
+############################################################
+
+import numpy as np
+from collections import OrderedDict
+from ColumnStore import INT, FLOAT, DICT
+
+# Number of sort orders kept for sorts that are repeated
+CACHED_ORDERS = 8
+
+
+def text_sort_key(text):
+    # Empty cells come first, then numbers in numeric order, then everything else as text
+    if text == "":
+        return (0, 0.0, "")
+
+    try:
+        number = float(text)
+    except ValueError:
+        return (2, 0.0, text)
+
+    if number != number:
+        return (2, 0.0, text)
+
+    return (1, number, text)
+
+
+def _ranks_of_texts(texts, row_count):
+    # Equal values share a rank, ranks follow the sort order of the distinct values
+    distinct = sorted(set(texts), key=text_sort_key)
+    rank = dict((value, x) for x, value in enumerate(distinct))
+    return np.fromiter((rank[x] for x in texts), dtype=np.int64, count=row_count)
+
+
+class SortEngine(object):
+    def __init__(self, store):
+        self.store = store
+        self.ranks = {}
+        self.orders = OrderedDict()
+
+    def invalidate(self, column=None):
+        # Called when cells change, None drops everything (rows added or removed)
+        if column is None:
+            self.ranks.clear()
+            self.orders.clear()
+        else:
+            self.ranks.pop(column, None)
+            for key in [x for x in self.orders if column in [y[0] for y in x]]:
+                del self.orders[key]
+
+    def order(self, keys):
+        # keys is a list of (column, descending) pairs, the first one sorts first. Returns
+        # the source rows in sorted order, rows that compare equal keep their order.
+        key = tuple(keys)
+        order = self.orders.get(key)
+
+        if order is not None:
+            self.orders.move_to_end(key)
+            return order
+
+        # lexsort sorts by its last key first, a descending key is sorted on negated ranks
+        order = np.lexsort([-self.column_ranks(x) if descending else self.column_ranks(x)
+                            for x, descending in reversed(keys)])
+
+        self.orders[key] = order
+        if len(self.orders) > CACHED_ORDERS:
+            self.orders.popitem(last=False)
+
+        return order
+
+    def column_ranks(self, column):
+        ranks = self.ranks.get(column)
+
+        if ranks is None:
+            ranks = self.ranks[column] = self._ranks(column)
+
+        return ranks
+
+    def _ranks(self, column):
+        row_count = self.store.row_count()
+        columns = getattr(self.store, "columns", None)
+        stored = columns[column] if columns is not None else None
+
+        if stored is not None and stored.kind in (INT, FLOAT):
+            # Typed columns are ranked in place, empty cells rank before every number
+            dtype = np.int64 if stored.kind == INT else np.float64
+            values = np.frombuffer(stored.values, dtype=dtype)[:row_count]
+            ranks = np.unique(values, return_inverse=True)[1].astype(np.int64).reshape(-1) + 1
+
+            if stored.nulls is not None:
+                ranks[np.frombuffer(stored.nulls, dtype=np.uint8)[:row_count].astype(bool)] = 0
+
+            return ranks
+
+        if stored is not None and stored.kind == DICT:
+            # Only the distinct values are sorted, the rows take the rank of their code
+            dictionary_ranks = _ranks_of_texts(stored.dictionary, len(stored.dictionary))
+            return dictionary_ranks[np.frombuffer(stored.values, dtype=np.uint16)[:row_count]]
+
+        return _ranks_of_texts(self.store.column_values(column), row_count)
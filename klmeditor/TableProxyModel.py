@@ -0,0 +1,315 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Proxy model for .csv tables. Unlike         #
+# QSortFilterProxyModel it does not test or compare every  #
+# row itself, it shows the rows a FilterEngine found       #
+# through its column indexes in the order a SortEngine     #
+# worked out. Without a filter or sort it maps rows one to #
+# one and keeps no per-row state at all. NumPy and the     #
+# SortEngine are only imported once a table is sorted, so  #
+# they do not slow down starting the editor.               #
+#                                                          #
+############################################################
+
+import array
+import bisect
+from PyQt5 import QtCore
+from FilterEngine import FilterEngine
+
+
+def _moved_rows(rows, first, last, delta):
+    # Source rows after rows first..last were inserted (delta > 0) or removed (delta < 0),
+    # removed rows are dropped and the rows after them move by delta. Keeps the order of rows.
+    import numpy as np
+
+    values = np.frombuffer(rows, dtype=np.int64)
+
+    if delta < 0:
+        values = values[(values < first) | (values > last)]
+
+    return np.where(values >= first, values + delta, values)
+
+
+class TableProxyModel(QtCore.QAbstractProxyModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.engine = None
+
+        # Created by the first sort of the source model
+        self.sorter = None
+
+        # Ascending source rows that passed the filter, None if there is no filter
+        self.filtered = None
+
+        # (column, descending) pairs the rows are sorted by, the first one sorts first
+        self.sort_keys = []
+
+        # Source rows that are shown in the order they are shown, None shows every source row.
+        # Sorted rows also have positions, the proxy row of every source row (-1 if hidden).
+        self.rows = None
+        self.positions = None
+
+    ################################################
+    #                  FILTERING                   #
+    ################################################
+
+    def filter_rows(self, column, op, value):
+        return self.show_rows(self.engine.filter(column, op, value))
+
+    def show_rows(self, rows):
+        # rows are ascending source rows, e.g. the result of a filter expression
+        self.beginResetModel()
+        self.filtered = rows
+        self.update_rows()
+        self.endResetModel()
+
+        return len(rows)
+
+    def clear_filter(self):
+        if self.filtered is not None:
+            self.beginResetModel()
+            self.filtered = None
+            self.update_rows()
+            self.endResetModel()
+
+    ################################################
+    #                   SORTING                    #
+    ################################################
+
+    def sort_by(self, keys):
+        # keys is a list of (column, descending) pairs, an empty list restores the file's order
+        self.beginResetModel()
+        self.sort_keys = list(keys)
+        self.update_rows()
+        self.endResetModel()
+
+    def update_rows(self):
+        if not self.sort_keys:
+            self.rows = self.filtered
+            self.positions = None
+            return
+
+        import numpy as np
+
+        if self.sorter is None:
+            from SortEngine import SortEngine
+            self.sorter = SortEngine(self.sourceModel().store)
+
+        order = self.sorter.order(self.sort_keys)
+
+        # The filter keeps its rows in sorted order
+        if self.filtered is not None:
+            shown = np.zeros(len(order), dtype=bool)
+            shown[np.frombuffer(self.filtered, dtype=np.int64)] = True
+            order = order[shown[order]]
+
+        self.rows = order
+        self.update_positions()
+
+    def update_positions(self):
+        import numpy as np
+
+        self.positions = np.full(self.sourceModel().rowCount(), -1, dtype=np.int64)
+        self.positions[self.rows] = np.arange(len(self.rows), dtype=np.int64)
+
+    ################################################
+    #              QT MODEL INTERFACE              #
+    ################################################
+
+    def setSourceModel(self, model):
+        old = self.sourceModel()
+
+        if old is not None:
+            old.dataChanged.disconnect(self.source_data_changed)
+            old.headerDataChanged.disconnect(self.headerDataChanged)
+            old.rowsAboutToBeInserted.disconnect(self.source_rows_about_to_be_inserted)
+            old.rowsInserted.disconnect(self.source_rows_inserted)
+            old.rowsAboutToBeRemoved.disconnect(self.source_rows_about_to_be_removed)
+            old.rowsRemoved.disconnect(self.source_rows_removed)
+            old.columnsAboutToBeInserted.disconnect(self.source_columns_about_to_be_inserted)
+            old.columnsInserted.disconnect(self.source_columns_inserted)
+            old.modelReset.disconnect(self.source_reset)
+
+        self.beginResetModel()
+        super().setSourceModel(model)
+        self.engine = FilterEngine(model.store) if model is not None else None
+        self.sorter = None
+        self.filtered = None
+        self.sort_keys = []
+        self.rows = None
+        self.positions = None
+        self.endResetModel()
+
+        if model is not None:
+            model.dataChanged.connect(self.source_data_changed)
+            model.headerDataChanged.connect(self.headerDataChanged)
+            model.rowsAboutToBeInserted.connect(self.source_rows_about_to_be_inserted)
+            model.rowsInserted.connect(self.source_rows_inserted)
+            model.rowsAboutToBeRemoved.connect(self.source_rows_about_to_be_removed)
+            model.rowsRemoved.connect(self.source_rows_removed)
+            model.columnsAboutToBeInserted.connect(self.source_columns_about_to_be_inserted)
+            model.columnsInserted.connect(self.source_columns_inserted)
+            model.modelReset.connect(self.source_reset)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+
+        if self.rows is None:
+            return self.sourceModel().rowCount()
+
+        return len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+
+        return self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QtCore.QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QtCore.QModelIndex()
+
+        row = proxy_index.row() if self.rows is None else int(self.rows[proxy_index.row()])
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QtCore.QModelIndex()
+
+        row = self.proxy_row(source_index.row())
+
+        if row is None:
+            return QtCore.QModelIndex()
+
+        return self.createIndex(row, source_index.column())
+
+    def proxy_row(self, source_row):
+        if self.rows is None:
+            return source_row
+
+        if self.positions is not None:
+            row = int(self.positions[source_row]) if source_row < len(self.positions) else -1
+            return row if row >= 0 else None
+
+        # Filtered rows that are not sorted are kept in ascending order
+        row = bisect.bisect_left(self.rows, source_row)
+
+        if row < len(self.rows) and self.rows[row] == source_row:
+            return row
+
+        return None
+
+    ################################################
+    #            SOURCE MODEL SIGNALS              #
+    ################################################
+
+    def source_data_changed(self, top_left, bottom_right, roles=[]):
+        # Indexes and sort ranks of edited columns are out of date, rows stay where they are
+        # until the next filter or sort
+        for column in range(top_left.column(), bottom_right.column() + 1):
+            self.engine.invalidate(column)
+            if self.sorter is not None:
+                self.sorter.invalidate(column)
+
+        if self.rows is None:
+            self.dataChanged.emit(self.index(top_left.row(), top_left.column()),
+                                  self.index(bottom_right.row(), bottom_right.column()), roles)
+        else:
+            for row in range(top_left.row(), bottom_right.row() + 1):
+                proxy_row = self.proxy_row(row)
+                if proxy_row is not None:
+                    self.dataChanged.emit(self.index(proxy_row, top_left.column()),
+                                          self.index(proxy_row, bottom_right.column()), roles)
+
+    def source_rows_about_to_be_inserted(self, parent, first, last):
+        # Rows added while a filter is active stay hidden until the next filter, rows added
+        # to a sorted table are shown at its end until the next sort
+        if self.filtered is None:
+            if self.rows is None:
+                self.beginInsertRows(QtCore.QModelIndex(), first, last)
+            else:
+                self.beginInsertRows(QtCore.QModelIndex(), len(self.rows), len(self.rows) + last - first)
+
+    def source_rows_inserted(self, parent, first, last):
+        self.engine.invalidate()
+        if self.sorter is not None:
+            self.sorter.invalidate()
+
+        # Rows below the inserted ones have moved down
+        if self.filtered is not None:
+            self.filtered = array.array('q', _moved_rows(self.filtered, first, last, last - first + 1).tobytes())
+
+        if self.rows is not None and self.sort_keys:
+            import numpy as np
+            added = np.arange(first, last + 1, dtype=np.int64)
+
+            if self.filtered is not None:
+                self.rows = _moved_rows(self.rows, first, last, last - first + 1)
+            else:
+                self.rows = np.concatenate((_moved_rows(self.rows, first, last, last - first + 1), added))
+
+            self.update_positions()
+
+        elif self.rows is not None:
+            self.rows = self.filtered
+
+        if self.filtered is None:
+            self.endInsertRows()
+
+    def source_rows_about_to_be_removed(self, parent, first, last):
+        # Removed rows of a filtered or sorted table are taken out of its rows, the rows
+        # that are left keep their order
+        if self.rows is None:
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+        else:
+            self.beginResetModel()
+
+    def source_rows_removed(self, parent, first, last):
+        self.engine.invalidate()
+        if self.sorter is not None:
+            self.sorter.invalidate()
+
+        if self.rows is None:
+            self.endRemoveRows()
+            return
+
+        if self.filtered is not None:
+            self.filtered = array.array('q', _moved_rows(self.filtered, first, last, first - last - 1).tobytes())
+
+        if self.sort_keys:
+            self.rows = _moved_rows(self.rows, first, last, first - last - 1)
+            self.update_positions()
+        else:
+            self.rows = self.filtered
+
+        self.endResetModel()
+
+    def source_columns_about_to_be_inserted(self, parent, first, last):
+        self.beginInsertColumns(QtCore.QModelIndex(), first, last)
+
+    def source_columns_inserted(self, parent, first, last):
+        self.endInsertColumns()
+
+    def source_reset(self):
+        self.beginResetModel()
+        self.engine.invalidate()
+        if self.sorter is not None:
+            self.sorter.invalidate()
+        self.filtered = None
+        self.sort_keys = []
+        self.rows = None
+        self.positions = None
+        self.endResetModel()
@@ -0,0 +1,143 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Lightweight tracing of slow operations.     #
+# Parsing, filtering, queries and saves run inside timing  #
+# spans that measure their duration, the rows they handled #
+# and how much resident memory changed, and counters keep  #
+# totals of cheaper events such as pages read. Finished    #
+# spans are passed to listeners (the status bar) and, if   #
+# tracing was started, appended to a JSON lines file. This #
+# module does not depend on Qt.                            #
+#                                                          #
+############################################################
+
+import os
+import json
+import time
+import threading
+
+# Size of a memory page, resident memory is read from /proc in pages
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    # Resident memory of this process in bytes, None where it cannot be read cheaply
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Span(object):
+    # Measures one operation, used as a context manager. Rows handled are added with add(),
+    # fields are written to the trace with the span.
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+        self.rows = 0
+
+    def add(self, rows):
+        self.rows += rows
+
+    def __enter__(self):
+        self.started_at = time.time()
+        self.memory = current_rss()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        seconds = time.perf_counter() - self.started
+        memory = current_rss()
+        memory_delta = memory - self.memory if memory is not None and self.memory is not None else None
+
+        if error is not None:
+            self.fields["error"] = str(error) or error_type.__name__
+
+        self.tracer.finish(self.name, self.started_at, seconds, self.rows, memory_delta, self.fields)
+        return False
+
+
+class Tracer(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.counters = {}
+
+        # Open trace file, None while tracing is off
+        self.file = None
+        self.path = None
+
+    ################################################
+    #                 MEASUREMENTS                 #
+    ################################################
+
+    def span(self, name, **fields):
+        return Span(self, name, fields)
+
+    def record(self, name, seconds, rows=0, **fields):
+        # Adds a span that was measured elsewhere, e.g. in a worker process
+        self.finish(name, time.time() - seconds, seconds, rows, None, fields)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self, name, started_at, seconds, rows, memory_delta, fields):
+        event = {"name": name, "time": started_at, "seconds": seconds, "rows": rows,
+                 "rows_per_second": rows / seconds if rows and seconds > 0 else None,
+                 "memory_delta": memory_delta, "thread": threading.current_thread().name}
+        event.update(fields)
+
+        for listener in list(self.listeners):
+            listener(event)
+
+        if self.file is not None:
+            with self.lock:
+                if self.file is not None:
+                    event["counters"] = dict(self.counters)
+                    self.file.write(json.dumps(event, default=str) + "\n")
+                    self.file.flush()
+
+    def add_listener(self, listener):
+        # listener is called with every finished span on the thread that finished it
+        self.listeners.append(listener)
+
+    ################################################
+    #                  TRACE FILE                  #
+    ################################################
+
+    def start(self, path):
+        # Appends finished spans to path as JSON lines until stop() is called
+        self.stop()
+
+        trace = open(path, "a")
+
+        with self.lock:
+            self.file = trace
+            self.path = path
+
+    def stop(self):
+        with self.lock:
+            trace = self.file
+            self.file = None
+            self.path = None
+
+        if trace is not None:
+            trace.close()
+
+
+# Shared by the whole editor, workers on other threads trace into the same file
+tracer = Tracer()
+
+
+def span(name, **fields):
+    return tracer.span(name, **fields)
+
+
+def count(name, value=1):
+    tracer.count(name, value)
@@ -0,0 +1,25 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Base class for the signals of QRunnable     #
+# workers. Signals are emitted from the worker thread and  #
+# delivered to the GUI thread.                             #
+#                                                          #
+############################################################
+
+from PyQt5 import QtCore
+
+
+class WorkerSignals(QtCore.QObject):
+    # Names of the signals a worker emits last, one of them ends every run
+    LAST_SIGNALS = ("finished", "failed")
+
+    def __init__(self):
+        # Owned by the application and deleted on the GUI thread after the last signal,
+        # a cancelled or replaced worker may be garbage collected on its own thread
+        super().__init__(QtCore.QCoreApplication.instance())
+
+        for name in self.LAST_SIGNALS:
+            getattr(self, name).connect(self.deleteLater)
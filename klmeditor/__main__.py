@@ -0,0 +1,20 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Entry point for running KLM Editor's        #
+# command line interface with python -m klmeditor          #
+#                                                          #
+############################################################
+
+import os
+import sys
+
+# Modules of KLM Editor import each other by file name, as when main.py is run from this folder
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import Cli
+
+if __name__ == "__main__":
+    sys.exit(Cli.main())
@@ -3,20 +3,71 @@
 ############################################################
 # Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
 ############################################################
-# Description: Entry point main function for KLM Editor    #
+# Description: Entry point main function for KLM Editor.   #
+# The window is shown before modules that are only needed  #
+# later are imported in the background. Running            #
+#   python main.py --startup-check [SECONDS]               #
+# measures the time until the window is first painted and  #
+# exits with status 1 if it takes longer than the budget.  #
 #                                                          #
 ############################################################
 
+import time
+
+# Startup is timed from here, before anything else is imported
+STARTED = time.perf_counter()
+
 import sys
-from MainWindow import Ui_MainWindow
-from PyQt5 import QtWidgets
-from PyQt5.QtWidgets import *
+import threading
+from PyQt5 import QtCore, QtWidgets
+
+# Seconds the window may take to appear before --startup-check fails
+STARTUP_BUDGET = 1.5
+
+
+class FirstPaint(QtCore.QObject):
+    # Event filter that records when the window is painted for the first time, then quits
+    def __init__(self, app, window, budget):
+        super().__init__()
+        self.app = app
+        self.budget = budget
+        self.elapsed = None
+        window.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QtCore.QEvent.Paint and self.elapsed is None:
+            self.elapsed = time.perf_counter() - STARTED
+            QtCore.QTimer.singleShot(0, self.app.quit)
+
+        return False
+
+    def report(self):
+        if self.elapsed is None:
+            print("The window was never painted.", file=sys.stderr)
+            return 1
+
+        print("Window painted after %.3f s (budget %.3f s)." % (self.elapsed, self.budget))
+        return 0 if self.elapsed <= self.budget else 1
+
 
 if __name__ == "__main__":
-    import sys
+    # Worker processes import this file too, so the editor is only imported here
+    from MainWindow import Ui_MainWindow, preload_modules
+
     app = QtWidgets.QApplication(sys.argv)
     MainWindow = QtWidgets.QMainWindow()
     ui = Ui_MainWindow()
     ui.setupUi(MainWindow)
+    app.aboutToQuit.connect(ui.close_csv_database)
+
+    check = None
+    if "--startup-check" in sys.argv:
+        position = sys.argv.index("--startup-check")
+        arguments = sys.argv[position + 1:position + 2]
+        check = FirstPaint(app, MainWindow, float(arguments[0]) if arguments else STARTUP_BUDGET)
+
     MainWindow.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    threading.Thread(target=preload_modules, daemon=True).start()
+
+    status = app.exec_()
+    sys.exit(check.report() if check is not None else status)
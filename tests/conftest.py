@@ -0,0 +1,23 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: pytest configuration. The editor's modules  #
+# import each other by their file names, so the klmeditor  #
+# folder is put on the import path like main.py does. Qt   #
+# models and workers get an application without a screen.  #
+#                                                          #
+############################################################
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "klmeditor"))
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt5 import QtCore
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
@@ -0,0 +1,117 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for undo, redo and the changes the    #
+# change journal hands out for saving to a file again.     #
+#                                                          #
+############################################################
+
+import ChangeJournal as journal_module
+from ChangeJournal import ChangeJournal, SET, INSERT, DELETE, first_changed_row
+
+
+def changes(items):
+    return [(x.kind, x.row, x.column, x.old, x.new) for x in items]
+
+
+def test_undo_and_redo():
+    journal = ChangeJournal()
+    journal.record(SET, 2, 1, "a", "b")
+    journal.record(INSERT, 4, new=["x", "y"])
+
+    assert changes([journal.undo()]) == [(DELETE, 4, None, ["x", "y"], None)]
+    assert changes([journal.undo()]) == [(SET, 2, 1, "b", "a")]
+    assert not journal.can_undo() and journal.can_redo()
+
+    assert changes([journal.redo()]) == [(SET, 2, 1, "a", "b")]
+    assert journal.can_undo() and journal.can_redo()
+
+
+def test_new_change_clears_redo():
+    journal = ChangeJournal()
+    journal.record(SET, 0, 0, "a", "b")
+    journal.undo()
+    journal.record(SET, 1, 0, "c", "d")
+
+    assert not journal.can_redo()
+
+
+def test_changes_since_save():
+    journal = ChangeJournal()
+    journal.record(SET, 0, 0, "a", "b")
+    journal.mark_saved("f.csv", 1)
+    journal.record(DELETE, 3, old=["x"])
+    journal.record(SET, 5, 0, "c", "d")
+
+    assert changes(journal.changes_since_save("f.csv", 1)) == [(DELETE, 3, None, ["x"], None), (SET, 5, 0, "c", "d")]
+    assert journal.is_modified("f.csv")
+
+    # Never saved there, no stamp, or changed by someone else since
+    assert journal.changes_since_save("g.csv", 1) is None
+    assert journal.changes_since_save("f.csv", None) is None
+    assert journal.changes_since_save("f.csv", 2) is None
+
+
+def test_changes_since_save_from_the_start():
+    journal = ChangeJournal()
+    journal.mark_saved("f.csv", 1)
+    journal.record(INSERT, 0, new=["x"])
+
+    assert changes(journal.changes_since_save("f.csv", 1)) == [(INSERT, 0, None, None, ["x"])]
+
+
+def test_undone_changes_are_reverted_in_the_file():
+    journal = ChangeJournal()
+    journal.record(SET, 0, 0, "a", "b")
+    journal.record(SET, 1, 0, "c", "d")
+    journal.record(DELETE, 2, old=["e"])
+    journal.mark_saved("f.csv", 1)
+
+    journal.undo()
+    journal.undo()
+
+    # The last change the file has is reverted first
+    assert changes(journal.changes_since_save("f.csv", 1)) == [(INSERT, 2, None, None, ["e"]), (SET, 1, 0, "d", "c")]
+
+    journal.redo()
+    journal.redo()
+    assert journal.changes_since_save("f.csv", 1) == []
+    assert not journal.is_modified("f.csv")
+
+
+def test_undone_and_replaced_changes_need_a_full_save():
+    journal = ChangeJournal()
+    journal.record(SET, 0, 0, "a", "b")
+    journal.mark_saved("f.csv", 1)
+    journal.undo()
+    journal.record(SET, 0, 0, "a", "c")
+
+    assert journal.changes_since_save("f.csv", 1) is None
+
+
+def test_saves_older_than_the_undo_limit_are_forgotten(monkeypatch):
+    monkeypatch.setattr(journal_module, "UNDO_LIMIT", 3)
+    journal = ChangeJournal()
+    journal.record(SET, 0, 0, "a", "b")
+    journal.mark_saved("f.csv", 1)
+
+    # The saved change is the base of the changes that are kept, the file can catch up
+    for x in range(0, 3):
+        journal.record(SET, x, 0, "c", "d")
+
+    assert len(journal.changes_since_save("f.csv", 1)) == 3
+
+    # Now a change the file does not have has been dropped
+    journal.record(SET, 4, 0, "e", "f")
+    assert journal.changes_since_save("f.csv", 1) is None
+
+
+def test_first_changed_row():
+    journal = ChangeJournal()
+    journal.record(SET, 7, 0, "a", "b")
+    journal.record(DELETE, 3, old=["x"])
+
+    assert first_changed_row(journal.done) == 3
+    assert first_changed_row([]) is None
@@ -0,0 +1,122 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Round trip tests for converting .csv files  #
+# to databases and back, from Python and from the command  #
+# line, for single files, wildcards and databases whose    #
+# tables are written by a pool of worker processes.        #
+#                                                          #
+############################################################
+
+import os
+import csv
+import sqlite3
+import pytest
+import Cli
+import Convert
+
+ROWS = [
+    ["id", "name", "note"],
+    ["1", "plain", ""],
+    ["2", "with, comma", 'with "quotes"'],
+    ["3", "two\nlines", "ünïcödé ✓"],
+    ["4", " spaces ", "\r\n"],
+]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def table_rows(path, table):
+    # Columns are typed when a .csv file is loaded, the values are compared as text
+    connection = sqlite3.connect(path)
+    rows = connection.execute('SELECT * FROM "' + table + '" ORDER BY rowid').fetchall()
+    connection.close()
+    return [["" if x is None else str(x) for x in row] for row in rows]
+
+
+def test_csv_to_db_and_back(tmp_path):
+    source = write_csv(tmp_path / "people.csv", ROWS)
+
+    assert Convert.convert(source, str(tmp_path / "people.db"), indexes=("name",)) == len(ROWS) - 1
+    assert table_rows(str(tmp_path / "people.db"), "people") == ROWS[1:]
+
+    assert Convert.convert(str(tmp_path / "people.db"), str(tmp_path / "out.csv")) == len(ROWS) - 1
+    assert read_csv(str(tmp_path / "out_people.csv")) == ROWS
+
+
+def test_tables_are_exported_by_worker_processes(tmp_path):
+    source = str(tmp_path / "many.db")
+    connection = sqlite3.connect(source)
+    for x in range(0, 3):
+        connection.execute("CREATE TABLE t%d (a, b)" % x)
+        connection.executemany("INSERT INTO t%d VALUES (?, ?)" % x, [(y, "t%d row %d" % (x, y)) for y in range(0, 500 * (x + 1))])
+    connection.commit()
+    connection.close()
+
+    written = []
+    rows = Convert.db_to_csv(source, str(tmp_path / "many.csv"), jobs=2, progress=lambda done, total: written.append((done, total)))
+
+    assert rows == 500 + 1000 + 1500
+    assert written == [(1, 3), (2, 3), (3, 3)]
+
+    for x in range(0, 3):
+        assert read_csv(str(tmp_path / ("many_t%d.csv" % x))) == [["a", "b"]] + [[str(y), "t%d row %d" % (x, y)] for y in range(0, 500 * (x + 1))]
+
+
+def test_unsupported_conversion(tmp_path):
+    with pytest.raises(ValueError):
+        Convert.convert(write_csv(tmp_path / "a.csv", ROWS), str(tmp_path / "b.csv"))
+
+
+def test_cli_single_file(tmp_path, capsys):
+    source = write_csv(tmp_path / "people.csv", ROWS)
+
+    assert Cli.main(["convert", source, str(tmp_path / "people.db"), "-i", "name"]) == 0
+    assert table_rows(str(tmp_path / "people.db"), "people") == ROWS[1:]
+
+    connection = sqlite3.connect(str(tmp_path / "people.db"))
+    indexed = [x[0] for x in connection.execute("SELECT sql FROM sqlite_master WHERE type = 'index'")]
+    connection.close()
+    assert len(indexed) == 1 and '"name"' in indexed[0]
+
+    assert "Converted 1 of 1 files (4 rows)" in capsys.readouterr().out
+
+
+def test_cli_wildcards_both_ways(tmp_path, capsys):
+    os.mkdir(str(tmp_path / "in"))
+    for name in ("a", "b", "c"):
+        write_csv(tmp_path / "in" / (name + ".csv"), [["name"], [name], [name * 2]])
+
+    assert Cli.main(["convert", str(tmp_path / "in" / "*.csv"), str(tmp_path / "db"), "-j", "2"]) == 0
+    assert sorted(os.listdir(str(tmp_path / "db"))) == ["a.db", "b.db", "c.db"]
+
+    assert Cli.main(["convert", str(tmp_path / "db" / "*.db"), str(tmp_path / "out"), "--to", "csv", "-j", "1"]) == 0
+
+    for name in ("a", "b", "c"):
+        assert read_csv(str(tmp_path / "out" / (name + "_" + name + ".csv"))) == [["name"], [name], [name * 2]]
+
+    assert "Converted 3 of 3 files (6 rows)" in capsys.readouterr().out
+
+
+def test_cli_reports_bad_sources(tmp_path, capsys):
+    assert Cli.main(["convert", str(tmp_path / "*.csv"), str(tmp_path / "out")]) == 2
+    assert "No files match" in capsys.readouterr().err
+
+    # Two files with the same name would be written to the same target
+    for folder in ("x", "y"):
+        os.mkdir(str(tmp_path / folder))
+        write_csv(tmp_path / folder / "same.csv", ROWS)
+
+    assert Cli.main(["convert", str(tmp_path / "x" / "same.csv"), str(tmp_path / "y" / "same.csv"), str(tmp_path / "out")]) == 2
+    assert "More than one file" in capsys.readouterr().err
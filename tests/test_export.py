@@ -0,0 +1,63 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for writing .csv files and patching   #
+# them from their first changed row, which keeps the line  #
+# breaks and encoding of the rows before it.               #
+#                                                          #
+############################################################
+
+import pytest
+import Export
+from MappedCsv import record_offset
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("data,terminator", [
+    (b"a,b\n1,2\n", "\n"),
+    (b"a,b\r\n1,2\r\n", "\r\n"),
+    (b"a,b", Export.LINE_TERMINATOR),
+    (b"", Export.LINE_TERMINATOR),
+])
+def test_line_terminator(tmp_path, data, terminator):
+    assert Export.line_terminator(write(tmp_path / "t.csv", data)) == terminator
+
+
+def test_write_csv(tmp_path):
+    path = str(tmp_path / "t.csv")
+
+    assert Export.write_csv(path, ["a", "b"], [[["1", "x,y"]], [["é", ""]]], terminator="\n") == 2
+    assert open(path, "rb").read() == 'a,b\n1,"x,y"\né,\n'.encode(Export.ENCODING)
+
+
+@pytest.mark.parametrize("terminator", ["\n", "\r\n"])
+def test_patch_keeps_line_breaks(tmp_path, terminator):
+    lines = ["a,b", "1,é", "2,y", "3,z"]
+    path = write(tmp_path / "t.csv", (terminator.join(lines) + terminator).encode(Export.ENCODING))
+
+    assert Export.patch_csv(path, record_offset(path, 2), [[["2", "changed"]]]) == 1
+    assert open(path, "rb").read() == (terminator.join(lines[:2] + ["2,changed"]) + terminator).encode(Export.ENCODING)
+
+
+def test_patch_appends_after_a_last_line_without_break(tmp_path):
+    path = write(tmp_path / "t.csv", b"a,b\n1,2")
+
+    Export.patch_csv(path, record_offset(path, 2), [[["3", "4"]]])
+
+    assert open(path, "rb").read() == b"a,b\n1,2\n3,4\n"
+
+
+def test_splice_file(tmp_path):
+    path = write(tmp_path / "t.csv", b"a,b\r\n1,2\r\n3,4\r\n")
+    part = write(tmp_path / "t.csv.part", b"5,6\r\n")
+
+    Export.splice_file(path, record_offset(path, 2), part)
+
+    assert open(path, "rb").read() == b"a,b\r\n1,2\r\n5,6\r\n"
+    assert not (tmp_path / "t.csv.part").exists()
@@ -0,0 +1,120 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests that a single comparison answered     #
+# from a column index and the same comparison inside a     #
+# filter expression select the same rows, and that the     #
+# sorted text index finds the same rows as a scan.         #
+#                                                          #
+############################################################
+
+import pytest
+import FilterExpression
+from FilterEngine import FilterEngine, ColumnIndex
+from ColumnStore import ColumnStore, INT, FLOAT, DICT
+
+HEADERS = ["int", "float", "mixed", "name"]
+ROWS = [
+    ["10", "10.5", "10", "apple"],
+    ["", "", "10.0", ""],
+    ["7", "2.25", "", "banana"],
+    ["10", "", "010", "10"],
+    ["-3", "-1.5", "-3", "cherry"],
+]
+
+PREDICATES = [
+    (column, op, value)
+    for column in range(0, len(HEADERS))
+    for op in ["=", "!=", "<", "<=", ">", ">=", "^="]
+    for value in ["10", "7", "2.25", "-1.5", "abc", "", "b"]
+]
+
+
+@pytest.fixture(scope="module")
+def store():
+    store = ColumnStore(HEADERS)
+    store.append_rows(ROWS)
+    return store
+
+
+def expression_rows(store, text):
+    return expression_rows_of(store, text, HEADERS)
+
+
+def expression_rows_of(store, text, headers=None):
+    headers = store.headers if headers is None else headers
+    return list(FilterExpression.evaluate(FilterExpression.parse(text, headers), store))
+
+
+def test_column_kinds(store):
+    assert [column.kind for column in store.columns] == [INT, FLOAT, DICT, DICT]
+
+
+@pytest.mark.parametrize("column,op,value", PREDICATES)
+def test_single_and_compound_comparisons_agree(store, column, op, value):
+    single = "%s %s '%s'" % (HEADERS[column], op, value)
+
+    indexed = list(FilterEngine(store).filter(column, op, value))
+
+    assert indexed == expression_rows(store, single)
+    assert indexed == expression_rows(store, single + " OR " + single)
+    assert indexed == expression_rows(store, single + " AND " + single)
+
+
+def test_numeric_equality(store):
+    # "10.0" is the number 10, empty cells match neither = nor !=
+    assert list(FilterEngine(store).filter(2, "=", "10")) == [0, 1, 3]
+    assert expression_rows(store, "mixed = 10 OR mixed = 10") == [0, 1, 3]
+    assert list(FilterEngine(store).filter(0, "!=", "10")) == [2, 4]
+    assert expression_rows(store, "int != 10 AND int != 10") == [2, 4]
+
+
+@pytest.mark.parametrize("value", ["", "a", "ab", "abc", "b", "ba", "c", "zz"])
+def test_text_index_matches_scan(value):
+    # Repeated texts share one group of the sorted index
+    values = ["b", "ab", "", "a", "ab", "b", "abc", "b", "", "ba"]
+    index = ColumnIndex(values)
+    rows = range(0, len(values))
+
+    assert list(index.equal(value)) == [x for x in rows if values[x] == value]
+    assert list(index.not_equal(value)) == [x for x in rows if values[x] != value]
+    assert list(index.range("<", value)) == [x for x in rows if values[x] < value]
+    assert list(index.range("<=", value)) == [x for x in rows if values[x] <= value]
+    assert list(index.range(">", value)) == [x for x in rows if values[x] > value]
+    assert list(index.range(">=", value)) == [x for x in rows if values[x] >= value]
+    assert list(index.prefix(value)) == [x for x in rows if values[x].startswith(value)]
+
+
+@pytest.mark.parametrize("value", ["\U0010ffff", "a\U0010ffff", "a\U0010ffff\U0010ffff", "\U0010ffffa"])
+def test_prefix_ending_in_the_last_code_point(value):
+    values = ["a", "a\U0010ffff", "a\U0010ffffb", "a\U0010ffff\U0010ffff", "b", "\U0010ffff", "\U0010ffffab", "\U0010ffff\U0010ffff"]
+    index = ColumnIndex(values)
+
+    assert list(index.prefix(value)) == [x for x in range(0, len(values)) if values[x].startswith(value)]
+
+
+def test_nan_makes_a_float_column_text():
+    # "nan" is not a number, the column is compared as text in both paths
+    store = ColumnStore(["p"])
+    store.append_rows([["1.5"], ["10.5"], ["nan"]])
+
+    assert store.columns[0].kind == FLOAT
+    for predicate in ["p > 5", "p = 10.5", "p != 1.5", "p <= 2"]:
+        column, op, value = predicate.split()
+        indexed = list(FilterEngine(store).filter(0, op, value))
+        assert indexed == expression_rows_of(store, predicate)
+        assert indexed == expression_rows_of(store, predicate + " OR " + predicate)
+
+
+def test_unused_dictionary_entries_do_not_count():
+    # The only text cell is edited to a number, the column is numeric from then on
+    store = ColumnStore(["x"])
+    store.append_rows([["abc"], ["9"], ["10"]])
+    store.set_value(0, 0, "7")
+
+    assert store.columns[0].kind == DICT
+    assert list(FilterEngine(store).filter(0, ">", "8")) == [1, 2]
+    assert expression_rows_of(store, "x > 8") == [1, 2]
+    assert expression_rows_of(store, "x > 8 OR x > 8") == [1, 2]
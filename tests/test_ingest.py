@@ -0,0 +1,152 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for loading rows into SQLite and      #
+# applying journal changes to a saved table, and that      #
+# loading leaves the connection's settings as they were.   #
+#                                                          #
+############################################################
+
+import random
+import sqlite3
+import pytest
+import Ingest
+from ChangeJournal import ChangeJournal, Change, SET, INSERT, DELETE
+
+
+def load_table(rows):
+    connection = sqlite3.connect(":memory:")
+    Ingest.ingest(connection, "t", ["id", "name"], [rows])
+    return connection
+
+
+def table_rows(connection):
+    return connection.execute("SELECT rowid, id, name FROM t ORDER BY rowid").fetchall()
+
+
+def test_deleted_rows_keep_other_rowids():
+    connection = load_table([[str(x), "n" + str(x)] for x in range(10)])
+
+    applied = Ingest.apply_changes(connection, "t", [Change(1, DELETE, 3), Change(2, DELETE, 3), Change(3, SET, 3, 1, None, "edited")])
+
+    assert applied == 3
+    assert [row[0] for row in table_rows(connection)] == [1, 2, 3, 6, 7, 8, 9, 10]
+    assert table_rows(connection)[3] == (6, 5, "edited")
+
+
+def test_inserted_rows_use_free_rowids():
+    connection = load_table([[str(x), "n" + str(x)] for x in range(5)])
+
+    changes = [Change(1, DELETE, 1), Change(2, DELETE, 1), Change(3, INSERT, 1, new=["", "new"]),
+               Change(4, INSERT, 4, new=["9", "last"])]
+
+    assert Ingest.apply_changes(connection, "t", changes) == 4
+    assert table_rows(connection) == [(1, 0, "n0"), (2, None, "new"), (4, 3, "n3"), (5, 4, "n4"), (6, 9, "last")]
+
+
+def test_insert_without_free_rowid_changes_nothing():
+    connection = load_table([[str(x), "n" + str(x)] for x in range(5)])
+    before = table_rows(connection)
+
+    assert Ingest.apply_changes(connection, "t", [Change(1, SET, 0, 1, None, "x"), Change(2, INSERT, 2, new=["", ""])]) is None
+    assert table_rows(connection) == before
+
+
+def test_empty_cells_of_typed_columns_become_null():
+    connection = load_table([[str(x), "n" + str(x)] for x in range(3)])
+
+    Ingest.apply_changes(connection, "t", [Change(1, SET, 1, 0, "1", ""), Change(2, SET, 2, 1, "n2", "")])
+
+    assert table_rows(connection) == [(1, 0, "n0"), (2, None, "n1"), (3, 2, "")]
+
+
+def test_rowid_changes_only_set_cells():
+    connection = load_table([[str(x), "n" + str(x)] for x in range(3)])
+    connection.execute("DELETE FROM t WHERE rowid = 2")
+
+    assert Ingest.apply_changes(connection, "t", [Change(1, SET, 3, 1, "n2", "by rowid")], positional=False) == 1
+    assert table_rows(connection) == [(1, 0, "n0"), (3, 2, "by rowid")]
+
+
+@pytest.mark.parametrize("seed", range(0, 20))
+def test_journal_changes_match_the_table(seed):
+    # Random edits, some undone, are applied to the saved table and compared with the rows
+    # they were made to. Inserts without a free rowid leave the table as it was. The rowids
+    # are spread out up front, so most inserts find a free rowid.
+    rows = [[str(x), "n" + str(x)] for x in range(20)]
+    connection = load_table([list(x) for x in rows])
+    connection.execute("UPDATE t SET rowid = -rowid")
+    connection.execute("UPDATE t SET rowid = -rowid * 10")
+    connection.commit()
+    journal = ChangeJournal()
+    journal.mark_saved("t", 0)
+    generator = random.Random(seed)
+
+    for x in range(0, 30):
+        kind = generator.choice([SET, SET, INSERT, DELETE, DELETE, "undo"])
+
+        if kind == "undo" and journal.can_undo():
+            change = journal.undo()
+        elif kind == SET and rows:
+            row = generator.randrange(0, len(rows))
+            change = journal.record(SET, row, 1, rows[row][1], "s" + str(x))
+        elif kind == INSERT:
+            change = journal.record(INSERT, generator.randrange(0, len(rows) + 1), new=[str(100 + x), "i" + str(x)])
+        elif kind == DELETE and rows:
+            row = generator.randrange(0, len(rows))
+            change = journal.record(DELETE, row, old=rows[row])
+        else:
+            continue
+
+        if change.kind == SET:
+            rows[change.row][change.column] = change.new
+        elif change.kind == INSERT:
+            rows.insert(change.row, list(change.new))
+        else:
+            del rows[change.row]
+
+    before = table_rows(connection)
+    applied = Ingest.apply_changes(connection, "t", journal.changes_since_save("t", 0))
+
+    if applied is None:
+        assert table_rows(connection) == before
+    else:
+        assert [[str(row[1]), row[2]] for row in table_rows(connection)] == rows
+
+
+def test_integers_outside_64_bits_stay_text():
+    assert Ingest.infer_types(["a", "b"], [["12345678901234567890123", "9223372036854775807"]]) == [Ingest.TEXT, Ingest.INTEGER]
+    assert Ingest.infer_types(["a"], [["-9223372036854775808"], ["9223372036854775808"]]) == [Ingest.TEXT]
+
+    connection = sqlite3.connect(":memory:")
+    Ingest.ingest(connection, "big", ["value"], [[["12345678901234567890123"], ["1"]]])
+
+    assert connection.execute("SELECT value, typeof(value) FROM big").fetchall() == [("12345678901234567890123", "text"), ("1", "text")]
+
+
+def test_journal_settings_are_restored(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / "wal.db"))
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+
+    Ingest.ingest(connection, "t", ["id"], [[["1"], ["2"]]])
+
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert connection.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+@pytest.mark.parametrize("other_table,relaxed", [(False, True), (True, False)])
+def test_journal_is_kept_next_to_other_tables(tmp_path, other_table, relaxed):
+    connection = sqlite3.connect(str(tmp_path / "other.db"))
+    if other_table:
+        connection.execute("CREATE TABLE kept (x)")
+        connection.commit()
+
+    modes = []
+    Ingest.ingest(connection, "t", ["id"], [[["1"]], [["2"]]],
+                  progress=lambda rows: modes.append(connection.execute("PRAGMA journal_mode").fetchone()[0]))
+
+    assert (modes[0] == "memory") == relaxed
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
@@ -0,0 +1,118 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for the row offset index of memory    #
+# mapped .csv files, its sidecar file and indexing a file  #
+# again after its tail was rewritten.                      #
+#                                                          #
+############################################################
+
+import os
+import csv
+import io
+import pytest
+import Export
+import MappedCsv as mapped_module
+from MappedCsv import MappedCsv, iter_index, build_index, load_index, save_index, index_path
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def rows_of(store):
+    return [[store.value(row, column) for column in range(0, store.column_count())] for row in range(0, store.row_count())]
+
+
+def test_quoted_newlines_stay_in_their_record():
+    records = [b"a,b\r\n", b'1,"two\r\nlines"\r\n', b'2,"x ""quoted""\nand more"\n', b"3,y\n"]
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    assert list(build_index(b"".join(records))) == offsets
+
+
+def test_index_does_not_depend_on_chunks(monkeypatch):
+    data = b"".join(b'%d,"a\nb",c\n\n' % x for x in range(0, 200))
+    expected = list(build_index(data))
+
+    monkeypatch.setattr(mapped_module, "INDEX_CHUNK_SIZE", 7)
+    offsets = []
+    for batch in iter_index(data, batch_size=3):
+        offsets.extend(batch)
+
+    assert offsets == expected
+
+
+def test_rows_match_the_csv_module(tmp_path):
+    # Blank lines are rows without cells, like csv.reader reads them
+    data = b'h1,h2\n1,"a\nb"\n\n2,"c,d"\n'
+    store = MappedCsv(write(tmp_path / "t.csv", data))
+
+    expected = list(csv.reader(io.StringIO(data.decode(), newline="")))
+    assert store.headers == expected[0]
+    assert rows_of(store) == [row + [""] * (2 - len(row)) for row in expected[1:]]
+    store.close()
+
+
+def test_unterminated_quote_runs_to_the_end(tmp_path):
+    store = MappedCsv(write(tmp_path / "t.csv", b'a,b\n1,"open\n2,x\n'))
+
+    assert store.row_count() == 1
+    assert store.value(0, 1) == "open\n2,x\n"
+    store.close()
+
+
+def test_index_is_saved_and_reused(tmp_path):
+    path = write(tmp_path / "t.csv", b"a\n1\n2\n")
+    MappedCsv(path).close()
+
+    assert list(load_index(path)) == [0, 2, 4, 6]
+
+
+@pytest.mark.parametrize("change", ["size", "mtime", "magic"])
+def test_stale_index_is_not_used(tmp_path, change):
+    path = write(tmp_path / "t.csv", b"a\n1\n2\n")
+    save_index(path, build_index(open(path, "rb").read()))
+
+    if change == "size":
+        write(tmp_path / "t.csv", b"a\n1\n2\n3\n")
+    elif change == "mtime":
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    else:
+        with open(index_path(path), "r+b") as f:
+            f.write(b"BROKEN!!")
+
+    assert load_index(path) is None
+
+    store = MappedCsv(path)
+    assert rows_of(store) == [["1"], ["2"]] + ([["3"]] if change == "size" else [])
+    store.close()
+
+
+def test_reopen_after_the_tail_was_rewritten(tmp_path):
+    path = write(tmp_path / "t.csv", b"a,b\n" + b"".join(b"%d,r%d\n" % (x, x) for x in range(0, 600)))
+    store = MappedCsv(path)
+    store.value(599, 1)
+    store.set_value(300, 1, "edited\nover two lines")
+
+    # Rows from 300 on are written again, as a save of the edited table does it
+    rows = [store.row(x) for x in range(300, 600)] + [["600", "new"]]
+    offset = store.offsets[301]
+    store.close()
+    Export.patch_csv(path, offset, [rows])
+    store.reopen(300)
+
+    assert store.row_count() == 601
+    assert store.edits == {}
+    assert store.row(299) == ["299", "r299"]
+    assert store.row(300) == ["300", "edited\nover two lines"]
+    assert store.row(600) == ["600", "new"]
+    assert list(store.offsets) == list(build_index(open(path, "rb").read()))
+    assert list(load_index(path)) == list(store.offsets)
+    store.close()
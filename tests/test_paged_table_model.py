@@ -0,0 +1,149 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for the paged model of database       #
+# tables and the edits it keeps on top of the pages.       #
+#                                                          #
+############################################################
+
+import sqlite3
+import pytest
+from PyQt5 import QtCore
+from ChangeJournal import Change, SET
+import Ingest
+from PagedTableModel import PagedTableModel, PAGE_ROWS
+
+# Rowids with gaps of different sizes, so neither the dense shortcut nor OFFSET gives the right rows
+GAPPY_ROWIDS = [x for x in range(1, 1500) if x % 7 != 0] + list(range(5000, 5300)) + [10 ** 9]
+
+
+def create_table(path, rowids):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE t (name TEXT)")
+    connection.executemany("INSERT INTO t (rowid, name) VALUES (?, ?)", [(x, "r" + str(x)) for x in rowids])
+    connection.commit()
+    connection.close()
+    return path
+
+
+def execute(path, statement):
+    connection = sqlite3.connect(path)
+    connection.execute(statement)
+    connection.commit()
+    connection.close()
+
+
+def wait_for_index(qapp):
+    # The worker's results are queued to the model until events are processed
+    QtCore.QThreadPool.globalInstance().waitForDone()
+    qapp.processEvents()
+
+
+def read_rows(model, order):
+    # Reads rows a page at a time in the given order of row numbers
+    return {x: model.page(x // PAGE_ROWS)[x % PAGE_ROWS][1:] for x in order}
+
+
+def expected_rows(path, order_by):
+    connection = sqlite3.connect(path)
+    rows = connection.execute("SELECT * FROM t ORDER BY " + order_by).fetchall()
+    connection.close()
+    return dict(enumerate(rows))
+
+
+@pytest.fixture
+def model(qapp, tmp_path):
+    model = PagedTableModel(create_table(str(tmp_path / "t.db"), range(1, 11)), "t")
+    yield model
+    model.close()
+
+
+def test_saved_edits_do_not_hide_later_writes(model):
+    model.setData(model.index(2, 0), "EDIT")
+
+    connection = sqlite3.connect(model.path)
+    Ingest.apply_changes(connection, "t", [Change(0, SET, 3, 0, None, "EDIT")], positional=False)
+    connection.close()
+    model.saved(model.path)
+
+    assert model.data(model.index(2, 0)) == "EDIT"
+
+    execute(model.path, "UPDATE t SET name = 'FROMSQL' WHERE rowid = 3")
+    model.refresh()
+
+    assert model.data(model.index(2, 0)) == "FROMSQL"
+
+
+def test_refresh_reads_altered_columns(model):
+    resets = []
+    model.modelReset.connect(lambda: resets.append(model.columnCount()))
+    model.sort_by([(0, True)])
+
+    execute(model.path, "ALTER TABLE t ADD COLUMN added INTEGER DEFAULT 7")
+    model.refresh_if_changed()
+
+    assert resets[-1] == 2
+    assert model.header_labels() == ["name", "added"]
+    assert model.sort_keys == [(0, True)]
+    assert [model.data(model.index(0, x)) for x in range(0, 2)] == ["r9", 7]
+
+    # Sort keys are dropped once the leading columns are not the ones they were
+    execute(model.path, "ALTER TABLE t RENAME COLUMN name TO renamed")
+    model.refresh()
+
+    assert model.header_labels() == ["renamed", "added"]
+    assert model.sort_keys == []
+    assert model.data(model.index(0, 0)) == "r1"
+
+
+@pytest.fixture
+def gappy(qapp, tmp_path):
+    path = create_table(str(tmp_path / "gappy.db"), GAPPY_ROWIDS)
+    execute(path, "ALTER TABLE t ADD COLUMN grp INTEGER")
+    execute(path, "UPDATE t SET grp = CASE WHEN rowid % 11 = 0 THEN NULL ELSE rowid % 5 END")
+    model = PagedTableModel(path, "t")
+    yield model
+    model.close()
+    wait_for_index(qapp)
+
+
+@pytest.mark.parametrize("sort_keys, order_by", [
+    ([], "rowid"),
+    ([(1, False)], "grp, rowid"),
+    ([(1, True)], "grp DESC, rowid DESC"),
+    ([(1, True), (0, False)], "grp DESC, name, rowid DESC"),
+])
+def test_pages_of_a_table_with_gaps(qapp, gappy, sort_keys, order_by):
+    gappy.sort_by(sort_keys)
+    expected = expected_rows(gappy.path, order_by)
+    count = len(GAPPY_ROWIDS)
+
+    # Before the row count and directory arrive pages are found with OFFSET or from the page before
+    QtCore.QThreadPool.globalInstance().waitForDone()
+    assert not gappy.directory
+    assert read_rows(gappy, range(count - 1, -1, -1)) == expected
+    gappy.pages.clear()
+    assert read_rows(gappy, range(0, count)) == expected
+
+    wait_for_index(qapp)
+    assert gappy.rowCount() == count
+    assert not gappy.dense
+    assert len(gappy.directory) == (count + PAGE_ROWS - 1) // PAGE_ROWS
+
+    # With the directory every page is a seek on its start key
+    for order in (range(count - 1, -1, -1), range(0, count)):
+        gappy.pages.clear()
+        assert read_rows(gappy, order) == expected
+
+    assert [gappy.data(gappy.index(x, 0)) for x in range(0, count)] == [expected[x][0] for x in range(0, count)]
+
+
+def test_dense_table_pages_by_key(qapp, tmp_path):
+    model = PagedTableModel(create_table(str(tmp_path / "dense.db"), range(100, 100 + 3 * PAGE_ROWS + 5)), "t")
+    wait_for_index(qapp)
+
+    assert model.dense and model.first_key == 100
+    assert read_rows(model, range(model.rowCount() - 1, -1, -1)) == expected_rows(model.path, "rowid")
+    model.close()
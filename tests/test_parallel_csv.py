@@ -0,0 +1,73 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for parsing .csv files in parts.      #
+#                                                          #
+############################################################
+
+import csv
+from concurrent.futures import ThreadPoolExecutor
+import ParallelCsv
+from ColumnStore import ColumnStore, INT, FLOAT, DICT
+
+
+def write_file(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+def parse_in_parts(path, monkeypatch):
+    # Small ranges so the file is split into many parts
+    monkeypatch.setattr(ParallelCsv, "FIRST_RANGE_SIZE", 1024)
+    monkeypatch.setattr(ParallelCsv, "RANGE_SIZE", 4096)
+
+    with ThreadPoolExecutor(2) as pool:
+        header_end, ranges = ParallelCsv.split_file(path, pool)
+
+    store = ColumnStore(ParallelCsv.parse_header(path, header_end, "utf-8"))
+
+    for start, end in ranges:
+        store.extend_store(ParallelCsv.parse_range(path, start, end, "utf-8"))
+
+    return store, len(ranges)
+
+
+def parse_sequentially(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        store = ColumnStore(next(reader))
+        store.append_rows(list(reader))
+
+    return store
+
+
+def test_parts_keep_column_kinds(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.csv")
+    rows = [["id", "price", "name", "note", "late"]]
+    rows += [[str(x), repr(x / 4) if x % 5 else "", "abc"[x % 3], "note " + str(x),
+              "text" if x == 1500 else str(x)] for x in range(2000)]
+    write_file(path, rows)
+
+    parts, part_count = parse_in_parts(path, monkeypatch)
+    whole = parse_sequentially(path)
+
+    assert part_count > 2
+    assert [column.kind for column in parts.columns] == [column.kind for column in whole.columns]
+    assert [column.kind for column in parts.columns] == [INT, FLOAT, DICT, DICT, DICT]
+    assert list(parts.iter_batches()) == list(whole.iter_batches())
+
+
+def test_parts_wider_than_header(tmp_path, monkeypatch):
+    path = str(tmp_path / "wide.csv")
+    rows = [["a"]] + [[str(x), str(x * 2)] for x in range(1000)] + [["x", "y", "long text " * 10]]
+    write_file(path, rows)
+
+    parts, part_count = parse_in_parts(path, monkeypatch)
+    whole = parse_sequentially(path)
+
+    assert part_count > 2
+    assert [column.kind for column in parts.columns] == [column.kind for column in whole.columns]
+    assert [column.kind for column in parts.columns] == [DICT, DICT, DICT]
+    assert list(parts.iter_batches()) == list(whole.iter_batches())
@@ -0,0 +1,96 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for the cache of table lists and      #
+# query results, which must drop its entries once the      #
+# database file has been written to.                       #
+#                                                          #
+############################################################
+
+import sqlite3
+import pytest
+from QueryCache import QueryCache, database_version
+
+
+def create_database(path, journal_mode):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = " + journal_mode)
+    connection.execute("CREATE TABLE t (x INTEGER)")
+    connection.commit()
+    return connection
+
+
+@pytest.mark.parametrize("journal_mode", ["delete", "wal"])
+def test_writes_change_the_version(tmp_path, journal_mode):
+    path = str(tmp_path / "c.db")
+    connection = create_database(path, journal_mode)
+    versions = [database_version(path)]
+
+    for x in range(0, 3):
+        connection.execute("INSERT INTO t VALUES (?)", (x,))
+        connection.commit()
+        versions.append(database_version(path))
+
+    assert len(set(versions)) == len(versions)
+
+    # Reading does not change it
+    connection.execute("SELECT * FROM t").fetchall()
+    assert database_version(path) == versions[-1]
+    connection.close()
+
+
+def test_missing_file_has_no_version(tmp_path):
+    assert database_version(str(tmp_path / "missing.db")) is None
+
+
+@pytest.mark.parametrize("journal_mode", ["delete", "wal"])
+def test_results_are_dropped_after_a_write(tmp_path, journal_mode):
+    path = str(tmp_path / "c.db")
+    connection = create_database(path, journal_mode)
+    cache = QueryCache()
+
+    assert cache.tables(path) == ["t"]
+    cache.add_query_result(path, "SELECT * FROM t", ["x"], [])
+    assert cache.query_result(path, "SELECT * FROM t") == (["x"], [])
+
+    connection.execute("CREATE TABLE u (y INTEGER)")
+    connection.commit()
+
+    assert cache.query_result(path, "SELECT * FROM t") is None
+    assert sorted(cache.tables(path)) == ["t", "u"]
+    assert cache.size == 0
+    connection.close()
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    path = str(tmp_path / "c.db")
+    create_database(path, "delete").close()
+    cache = QueryCache(budget=1000)
+
+    for x in range(0, 4):
+        cache.put(path, x, x, size=240)
+    cache.get(path, 0)
+    cache.put(path, 4, 4, size=240)
+
+    assert [key for (entry_path, key) in cache.entries] == [2, 3, 0, 4]
+    assert cache.size == 960
+
+    # A single result may use a quarter of the budget
+    cache.put(path, 5, 5, size=251)
+    assert cache.get(path, 5) is None
+
+
+def test_invalidate_drops_only_that_database(tmp_path):
+    paths = [str(tmp_path / "a.db"), str(tmp_path / "b.db")]
+    for path in paths:
+        create_database(path, "delete").close()
+
+    cache = QueryCache()
+    for path in paths:
+        cache.add_query_result(path, "SELECT 1", ["1"], [(1,)])
+
+    cache.invalidate(paths[0])
+    assert cache.query_result(paths[0], "SELECT 1") is None
+    assert cache.query_result(paths[1], "SELECT 1") == (["1"], [(1,)])
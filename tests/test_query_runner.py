@@ -0,0 +1,102 @@
+############################################################
+# Copyright (c) 2022 KLM Editor                            #
+############################################################
+# Authors: Kelly Vu, Guanlin Wang, Joel Allan Gelotin      #
+############################################################
+# Description: Tests for running queries on a worker:      #
+# streaming results in batches, cancelling a query and     #
+# stopping it after its timeout.                           #
+#                                                          #
+############################################################
+
+import sqlite3
+import threading
+import time
+import pytest
+import QueryRunner
+from QueryRunner import QueryWorker
+
+# A query that runs until it is interrupted
+ENDLESS_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "q.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE t (x INTEGER)")
+    connection.executemany("INSERT INTO t VALUES (?)", [(x,) for x in range(0, 1000)])
+    connection.commit()
+    connection.close()
+    return path
+
+
+def run(worker, cancel_after=None):
+    # The worker runs on this thread so its signals are delivered right away
+    results = {"columns": None, "rows": [], "finished": None, "failed": None}
+    worker.signals.columns.connect(lambda columns: results.update(columns=columns))
+    worker.signals.batch.connect(results["rows"].extend)
+    worker.signals.finished.connect(lambda count, has_rows: results.update(finished=(count, has_rows)))
+    worker.signals.failed.connect(lambda message: results.update(failed=message))
+
+    if cancel_after is not None:
+        threading.Timer(cancel_after, worker.cancel).start()
+
+    started = time.perf_counter()
+    worker.run()
+    results["seconds"] = time.perf_counter() - started
+    return results
+
+
+def test_rows_are_streamed_in_batches(qapp, path):
+    results = run(QueryWorker(path, "SELECT x FROM t ORDER BY x"))
+
+    assert results["columns"] == ["x"]
+    assert results["rows"] == [(x,) for x in range(0, 1000)]
+    assert results["finished"] == (1000, True)
+    assert results["failed"] is None
+
+
+def test_writes_are_committed(qapp, path):
+    results = run(QueryWorker(path, "DELETE FROM t WHERE x < 10"))
+
+    assert results["finished"] == (10, False)
+    connection = sqlite3.connect(path)
+    assert connection.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 990
+    connection.close()
+
+
+def test_cancel_a_running_statement(qapp, path):
+    results = run(QueryWorker(path, ENDLESS_QUERY + "SELECT COUNT(*) FROM c"), cancel_after=0.2)
+
+    assert results["failed"] == "Query cancelled."
+    assert results["finished"] is None
+    assert results["seconds"] < 5
+
+
+def test_cancel_while_waiting_for_the_view(qapp, path, monkeypatch):
+    monkeypatch.setattr(QueryRunner, "PREFETCH_ROWS", 1000)
+    results = run(QueryWorker(path, ENDLESS_QUERY + "SELECT x FROM c"), cancel_after=0.2)
+
+    # Only the rows the view asked for were read before the worker waited
+    assert len(results["rows"]) == 1000
+    assert results["failed"] == "Query cancelled."
+
+
+def test_timeout_stops_a_long_statement(qapp, path):
+    results = run(QueryWorker(path, ENDLESS_QUERY + "SELECT COUNT(*) FROM c", timeout=1))
+
+    assert results["failed"] == "Query timed out after 1 s."
+    assert 1 <= results["seconds"] < 5
+
+
+def test_interrupted_prepare_is_cancelled(qapp, path):
+    def prepare(progress, interrupt):
+        while not interrupt():
+            time.sleep(0.01)
+        raise sqlite3.OperationalError("interrupted")
+
+    results = run(QueryWorker(path, "SELECT x FROM t", prepare=prepare), cancel_after=0.2)
+
+    assert results["failed"] == "Query cancelled."
+    assert results["columns"] is None